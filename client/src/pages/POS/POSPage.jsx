@@ -230,29 +230,61 @@ const POSPage = () => {
     };
 
     const pollStatus = (checkoutId, saleId) => {
-        let attempts = 0;
-        const interval = setInterval(async () => {
-            attempts++;
-            if (attempts > 60) {
-                clearInterval(interval);
+        const handleStatus = (data) => {
+            if (data.status === 'COMPLETED') {
+                finishSale(saleId);
+                return true;
+            } else if (data.status === 'FAILED') {
                 setProcessing(false);
-                setMpesaStatus('timeout');
-                alert("Payment timed out. Check phone.");
-                return;
+                setMpesaStatus('failed');
+                alert(`M-Pesa Failed: ${data.reason}`);
+                return true;
             }
-            try {
-                const statusRes = await api.get(`/mpesa/status/${checkoutId}`);
-                if (statusRes.data.status === 'COMPLETED') {
-                    clearInterval(interval);
-                    finishSale(saleId);
-                } else if (statusRes.data.status === 'FAILED') {
+            return false;
+        };
+
+        const timeOut = () => {
+            setProcessing(false);
+            setMpesaStatus('timeout');
+            alert("Payment timed out. Check phone.");
+        };
+
+        const deadline = Date.now() + 120000;
+
+        const poll = () => {
+            const interval = setInterval(async () => {
+                if (Date.now() > deadline) {
                     clearInterval(interval);
-                    setProcessing(false);
-                    setMpesaStatus('failed');
-                    alert(`M-Pesa Failed: ${statusRes.data.reason}`);
+                    timeOut();
+                    return;
                 }
-            } catch (e) { console.log("Polling..."); }
-        }, 2000);
+                try {
+                    const statusRes = await api.get(`/mpesa/status/${checkoutId}`);
+                    if (handleStatus(statusRes.data)) clearInterval(interval);
+                } catch (e) { console.log("Polling..."); }
+            }, 2000);
+        };
+
+        // Server pushes exactly one event when the payment resolves
+        if (window.EventSource) {
+            const source = new EventSource(`${api.defaults.baseURL}/mpesa/status/${checkoutId}/stream`);
+            const timer = setTimeout(() => { source.close(); timeOut(); }, deadline - Date.now());
+            source.addEventListener('status', (e) => {
+                if (handleStatus(JSON.parse(e.data))) {
+                    source.close();
+                    clearTimeout(timer);
+                }
+            });
+            // Stream refused or dropped (proxy, auth, network): stop it reconnecting and poll instead
+            source.onerror = () => {
+                source.close();
+                clearTimeout(timer);
+                poll();
+            };
+            return;
+        }
+
+        poll();
     };
 
     const finishSale = (saleId) => {
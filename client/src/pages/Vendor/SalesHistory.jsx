@@ -61,7 +61,15 @@ const SalesHistory = () => {
 
     const handleDownloadPDF = async () => {
         try {
-            const response = await api.get('/vendor/reports/export-pdf', { responseType: 'blob' });
+            // Reports render in the background; poll the job, then fetch the file
+            let { data: job } = await api.post('/vendor/reports/jobs', { kind: 'sales_pdf' });
+            while (job.status === 'QUEUED' || job.status === 'RUNNING') {
+                await new Promise(resolve => setTimeout(resolve, 1500));
+                ({ data: job } = await api.get(`/vendor/reports/jobs/${job.id}`));
+            }
+            if (job.status !== 'DONE') throw new Error(job.error || 'Report failed');
+
+            const response = await api.get(`/vendor/reports/jobs/${job.id}/download`, { responseType: 'blob' });
             const url = window.URL.createObjectURL(new Blob([response.data]));
             const link = document.createElement('a');
             link.href = url;
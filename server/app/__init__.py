@@ -6,6 +6,9 @@ from flask_cors import CORS
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+
+    from app.utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
     
     CORS(app, resources={r"/*": {
         "origins": [
@@ -21,8 +24,16 @@ def create_app(config_class=Config):
     migrate.init_app(app, db)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    from app.utils.auth import register_user_loader
+    register_user_loader(jwt)
     mail.init_app(app)
 
+    from app.utils.instrumentation import instrumentation
+    instrumentation.init_app(app)
+
+    from app.utils.compression import compression
+    compression.init_app(app)
+
     from app.routes.auth_routes import auth_bp
     from app.routes.product_routes import product_bp
     from app.routes.transaction_routes import transaction_bp
@@ -46,4 +57,7 @@ def create_app(config_class=Config):
     app.register_blueprint(vendor_bp, url_prefix='/api/vendor')
     app.register_blueprint(notification_bp, url_prefix='/api/notifications')
 
+    from app.commands import register_commands
+    register_commands(app)
+
     return app
\ No newline at end of file
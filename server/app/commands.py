@@ -0,0 +1,97 @@
+import time
+import click
+from app.services.rollup_service import RollupService
+from app.services.vendor_analytics_service import VendorAnalyticsService
+from app.services.stk_dispatcher import get_stk_dispatcher
+from app.services.payout_dispatcher import get_payout_dispatcher
+from app.services.callback_service import MpesaCallbackService
+from app.services.report_jobs import get_report_runner
+from app.services.wallet_service import WalletService
+from app.extensions import db
+from app.utils.query_plans import check_query_plans
+
+
+def register_commands(app):
+    @app.cli.command('rebuild-sales-rollup')
+    def rebuild_sales_rollup():
+        """Backfills daily_sales_rollup and vendor_sales_summary from all COMPLETED sales."""
+        buckets = RollupService.rebuild()
+        click.echo(f"Rebuilt daily_sales_rollup: {buckets} buckets")
+
+    @app.cli.command('check-sales-rollup')
+    @click.option('--fix', is_flag=True, help='Rebuild both tables if they disagree with the sales.')
+    def check_sales_rollup(fix):
+        """Recomputes totals from COMPLETED sales; exits 1 if the materialised tables disagree."""
+        mismatches = VendorAnalyticsService.check()
+        for table, key, stored, expected in mismatches:
+            click.echo(f"MISMATCH  {table} {key}: stored {stored}, expected {expected}")
+        click.echo(f"{len(mismatches)} mismatched rows")
+        if mismatches and fix:
+            buckets = RollupService.rebuild()
+            click.echo(f"Rebuilt daily_sales_rollup: {buckets} buckets")
+        elif mismatches:
+            raise SystemExit(1)
+
+    @app.cli.command('run-stk-dispatcher')
+    def run_stk_dispatcher():
+        """Sends queued STK pushes; use with MPESA_DISPATCH_MODE=worker on the web tier."""
+        click.echo("STK dispatcher running. Ctrl+C to stop.")
+        get_stk_dispatcher(app).run_forever()
+
+    @app.cli.command('apply-stored-callbacks')
+    def apply_stored_callbacks():
+        """Applies STK callbacks that arrived before their payment was recorded."""
+        applied = MpesaCallbackService.apply_pending()
+        click.echo(f"Applied {applied} stored callbacks")
+
+    @app.cli.command('run-payout-dispatcher')
+    def run_payout_dispatcher():
+        """Sends approved B2C withdrawal payouts; use with MPESA_DISPATCH_MODE=worker on the web tier."""
+        click.echo("Payout dispatcher running. Ctrl+C to stop.")
+        get_payout_dispatcher(app).run_forever()
+
+    @app.cli.command('run-report-jobs')
+    @click.option('--poll', default=5.0, help='Seconds between sweeps.')
+    def run_report_jobs(poll):
+        """Renders QUEUED report jobs, including ones orphaned by a restarted web worker."""
+        runner = get_report_runner(app)
+        click.echo("Report runner running. Ctrl+C to stop.")
+        while True:
+            runner.run_pending()
+            runner.prune()
+            time.sleep(poll)
+
+    @app.cli.command('snapshot-wallets')
+    @click.option('--every', default=0.0, help='Repeat every N seconds instead of running once.')
+    def snapshot_wallets(every):
+        """Snapshots wallet balances from the ledger; exits 1 if a stored balance disagrees with it."""
+        while True:
+            written, drift = WalletService.snapshot_all()
+            db.session.commit()
+            for wallet_id, ledger, current in drift:
+                click.echo(f"DRIFT  wallet {wallet_id}: ledger {ledger:,.2f}, current_balance {current:,.2f}")
+            click.echo(f"{written} wallet snapshots written, {len(drift)} drifted")
+            if not every:
+                break
+            time.sleep(every)
+        if drift:
+            raise SystemExit(1)
+
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='Print every plan, not just regressions.')
+    def check_query_plans_command(verbose):
+        """EXPLAINs the hot dashboard queries; exits 1 if any falls back to a full table scan."""
+        results = check_query_plans()
+        failures = 0
+        for name, plan, scans in results:
+            if scans:
+                failures += 1
+                click.echo(f"FULL SCAN  {name}: {', '.join(scans)}")
+            elif verbose:
+                click.echo(f"ok         {name}")
+            if verbose or scans:
+                for line in plan:
+                    click.echo(f"             {line}")
+        click.echo(f"{len(results)} hot queries checked, {failures} with full scans")
+        if failures:
+            raise SystemExit(1)
@@ -5,4 +5,11 @@ from .wallet import Wallet, Settlement
 from .event import Event
 from .notification import Notification
 from .audit import AuditLog
-from .discount import DiscountCode
\ No newline at end of file
+from .discount import DiscountCode
+from .rollup import DailySalesRollup, VendorSalesSummary
+from .payment_request import PaymentRequest
+from .mpesa_callback import MpesaCallback
+from .catalog import CatalogVersion, ProductTombstone
+from .report_job import ReportJob
+from .wallet_ledger import WalletLedger, WalletSnapshot
+from .payout_request import PayoutRequest
@@ -3,6 +3,10 @@ from datetime import datetime
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_logs_vendor_created', 'vendor_id', 'created_at'),
+        db.Index('ix_audit_logs_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     action = db.Column(db.String(100), nullable=False)
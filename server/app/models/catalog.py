@@ -0,0 +1,27 @@
+from app.extensions import db
+from datetime import datetime
+
+
+class CatalogVersion(db.Model):
+    """
+    Per-vendor catalog counter. Every product insert, edit, delete and stock
+    change bumps it and stamps the new value on the product (or tombstone),
+    so tills can ask for "everything after version N".
+    """
+    __tablename__ = 'catalog_versions'
+
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ProductTombstone(db.Model):
+    """Deleted product ids, kept so delta syncs can tell tills to drop them."""
+    __tablename__ = 'product_tombstones'
+    __table_args__ = (
+        db.Index('ix_product_tombstones_vendor_version', 'vendor_id', 'version'),
+    )
+
+    product_id = db.Column(db.Integer, primary_key=True)
+    vendor_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,19 @@
+from app.extensions import db
+from datetime import datetime
+
+
+class MpesaCallback(db.Model):
+    """
+    Raw STK callbacks, one row per CheckoutRequestID. Safaricom retries
+    deliveries; the primary key makes every replay a cheap lookup that
+    short-circuits before any state change or wallet credit. `applied_at`
+    stays empty while no MpesaPayment matches yet (the callback beat the
+    dispatcher); the dispatcher applies the stored row once it records one.
+    """
+    __tablename__ = 'mpesa_callbacks'
+
+    checkout_request_id = db.Column(db.String(100), primary_key=True)
+    result_code = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    applied_at = db.Column(db.DateTime, nullable=True)
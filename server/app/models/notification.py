@@ -3,6 +3,11 @@ from datetime import datetime
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'dedup_key', name='uq_notifications_user_dedup'),
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at'),
+        db.Index('ix_notifications_user_read', 'user_id', 'is_read'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -12,6 +17,9 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Set for system alerts that must not repeat (e.g. low stock per product/level)
+    dedup_key = db.Column(db.String(100), nullable=True)
+
   
     user = db.relationship('User', backref='notifications')
 
@@ -0,0 +1,40 @@
+from app.extensions import db
+from datetime import datetime
+
+
+class PaymentRequest(db.Model):
+    """
+    Outbound STK push queued by /api/mpesa/pay and sent by the dispatcher.
+    `idempotency_key` is the checkout handle returned to the till; a retried
+    /pay with the same key returns the same row instead of prompting twice.
+    """
+    __tablename__ = 'payment_requests'
+    __table_args__ = (
+        db.Index('ix_payment_requests_status_due', 'status', 'next_attempt_at'),
+    )
+
+    QUEUED = 'QUEUED'
+    SENDING = 'SENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+    # May have reached Daraja but we never saw the reply; never re-sent, settled by its callback
+    UNKNOWN = 'UNKNOWN'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=True)
+
+    phone_number = db.Column(db.String(15), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+
+    status = db.Column(db.String(20), default=QUEUED, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    # Due time while QUEUED; lease expiry while SENDING (an expired lease makes the row UNKNOWN)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.String(255), nullable=True)
+
+    checkout_request_id = db.Column(db.String(100), nullable=True, index=True)
+    merchant_request_id = db.Column(db.String(100), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,60 @@
+from app.extensions import db
+from datetime import datetime
+
+
+class PayoutRequest(db.Model):
+    """
+    Outbound M-Pesa B2C disbursement for an approved withdrawal, sent by the
+    payout dispatcher. `originator_conversation_id` is generated here and
+    echoed by Daraja on the result callback, so a result is matched to its
+    payout even if the send response was lost. Daraja does not dedupe on it,
+    though, so a payout that may have been accepted is parked as UNKNOWN
+    rather than sent again.
+    """
+    __tablename__ = 'payout_requests'
+    __table_args__ = (
+        db.Index('ix_payout_requests_status_due', 'status', 'next_attempt_at'),
+    )
+
+    QUEUED = 'QUEUED'
+    SENDING = 'SENDING'
+    SENT = 'SENT'
+    UNKNOWN = 'UNKNOWN'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+    id = db.Column(db.Integer, primary_key=True)
+    settlement_id = db.Column(db.Integer, db.ForeignKey('settlements.id'), unique=True, nullable=False)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    phone_number = db.Column(db.String(15), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+
+    status = db.Column(db.String(20), default=QUEUED, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    # Due time while QUEUED; lease expiry while SENDING (an expired lease makes the row UNKNOWN)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.String(255), nullable=True)
+
+    originator_conversation_id = db.Column(db.String(64), unique=True, nullable=False)
+    conversation_id = db.Column(db.String(100), nullable=True, index=True)
+    transaction_id = db.Column(db.String(50), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "settlement_id": self.settlement_id,
+            "vendor_id": self.vendor_id,
+            "phone_number": self.phone_number,
+            "amount": self.amount,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "conversation_id": self.conversation_id,
+            "transaction_id": self.transaction_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -3,9 +3,18 @@ from app.extensions import db
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Vendor catalog and low stock lookups
+        db.Index('ix_products_vendor_stock', 'vendor_id', 'stock_quantity'),
+        # Natural key for bulk imports; NULL SKUs never collide
+        db.UniqueConstraint('vendor_id', 'sku', name='uq_products_vendor_sku'),
+        # Delta sync: products changed after a catalog version
+        db.Index('ix_products_vendor_catalog_version', 'vendor_id', 'catalog_version'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    sku = db.Column(db.String(64), nullable=True)
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     stock_quantity = db.Column(db.Integer, default=0)
@@ -17,11 +26,14 @@ class Product(db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Vendor catalog version at this product's last change (see CatalogService)
+    catalog_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def to_dict(self):
         return {
             "id": self.id,
             "name": self.name,
+            "sku": self.sku,
             "description": self.description,
             "price": self.price,
             "stock_quantity": self.stock_quantity,
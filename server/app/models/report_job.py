@@ -0,0 +1,51 @@
+from app.extensions import db
+from datetime import datetime
+import json
+
+
+class ReportJob(db.Model):
+    """
+    A report requested by a vendor and rendered off the request path by the
+    ReportRunner. The finished file lives on local disk at `file_path` until
+    REPORT_RETENTION_HOURS pass.
+    """
+    __tablename__ = 'report_jobs'
+    __table_args__ = (
+        db.Index('ix_report_jobs_vendor_created', 'vendor_id', 'created_at'),
+        db.Index('ix_report_jobs_status_created', 'status', 'created_at'),
+    )
+
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    id = db.Column(db.Integer, primary_key=True)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+
+    kind = db.Column(db.String(30), nullable=False)
+    params = db.Column(db.Text, nullable=True)
+
+    status = db.Column(db.String(20), default=QUEUED, nullable=False)
+    file_path = db.Column(db.String(255), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    row_count = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": json.loads(self.params) if self.params else {},
+            "status": self.status,
+            "row_count": self.row_count,
+            "file_size": self.file_size,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
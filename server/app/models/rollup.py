@@ -0,0 +1,38 @@
+from app.extensions import db
+
+
+class DailySalesRollup(db.Model):
+    """
+    Completed-sales totals per (day, vendor, event, payment method), kept up
+    to date by checkout and the M-Pesa callback. vendor_id / event_id use 0
+    for "none" so the unique key stays NULL-free for ON CONFLICT upserts.
+    """
+    __tablename__ = 'daily_sales_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'vendor_id', 'event_id', 'payment_method', name='uq_daily_sales_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    vendor_id = db.Column(db.Integer, nullable=False, default=0)
+    event_id = db.Column(db.Integer, nullable=False, default=0)
+    payment_method = db.Column(db.String(50), nullable=False)
+
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    amount_cash = db.Column(db.Float, nullable=False, default=0.0)
+    amount_mpesa = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class VendorSalesSummary(db.Model):
+    """
+    Lifetime completed-sales totals per vendor, maintained in the same
+    transaction as DailySalesRollup so vendor dashboards read one row.
+    """
+    __tablename__ = 'vendor_sales_summary'
+
+    vendor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    amount_cash = db.Column(db.Float, nullable=False, default=0.0)
+    amount_mpesa = db.Column(db.Float, nullable=False, default=0.0)
@@ -4,7 +4,19 @@ from datetime import datetime
 
 class Sale(db.Model):
     __tablename__ = 'transactions'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Per-cashier dashboards: cashier + COMPLETED + date range
+        db.Index('ix_transactions_cashier_status_created', 'cashier_id', 'status', 'created_at'),
+        db.Index('ix_transactions_status_created', 'status', 'created_at'),
+        # Keyset pagination order for the transaction list and exports
+        db.Index('ix_transactions_created_id', 'created_at', 'id'),
+        # Till-generated id that makes offline sync and retries idempotent
+        db.UniqueConstraint('client_uuid', name='uq_transactions_client_uuid'),
+        # Event and vendor revenue as range scans, no join through cashiers
+        db.Index('ix_transactions_event_status_created', 'event_id', 'status', 'created_at'),
+        db.Index('ix_transactions_vendor_status_created', 'vendor_id', 'status', 'created_at'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     total_amount = db.Column(db.Float, nullable=False)
@@ -22,15 +34,26 @@ class Sale(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     cashier_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    client_uuid = db.Column(db.String(64), nullable=True)
+
+    # Attribution fixed at checkout: the cashier's vendor and that vendor's event at the time
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=True)
     
-    cashier = db.relationship('User', backref='sales', lazy=True)
+    cashier = db.relationship('User', backref='sales', lazy=True, foreign_keys=[cashier_id])
     items = db.relationship('SaleItem', backref='parent_sale', cascade="all, delete-orphan", lazy=True)
     mpesa_details = db.relationship('MpesaPayment', backref='parent_sale', cascade="all, delete-orphan", uselist=False, lazy=True)
 
 
 class SaleItem(db.Model):
     __tablename__ = 'transaction_items'
-    __table_args__ = {'extend_existing': True} 
+    __table_args__ = (
+        db.Index('ix_transaction_items_sale_id', 'sale_id'),
+        db.Index('ix_transaction_items_product_sale', 'product_id', 'sale_id'),
+        db.Index('ix_transaction_items_event_vendor', 'event_id', 'vendor_id'),
+        db.Index('ix_transaction_items_vendor_event', 'vendor_id', 'event_id'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=False)
@@ -38,10 +61,16 @@ class SaleItem(db.Model):
     product_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
+    # The product's vendor and event when sold (a sale's lines normally share its vendor)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=True)
 
 class MpesaPayment(db.Model):
     __tablename__ = 'mpesa_payments'
-    __table_args__ = {'extend_existing': True} 
+    __table_args__ = (
+        db.Index('ix_mpesa_payments_sale_result', 'sale_id', 'result_code'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=True)
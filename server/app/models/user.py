@@ -4,6 +4,10 @@ from flask_login import UserMixin
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_vendor_role', 'vendor_id', 'role'),
+        db.Index('ix_users_role', 'role'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
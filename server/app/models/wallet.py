@@ -14,6 +14,11 @@ class Wallet(db.Model):
 
 class Settlement(db.Model):
     __tablename__ = 'settlements'
+    __table_args__ = (
+        db.Index('ix_settlements_vendor_status', 'vendor_id', 'status'),
+        # Admin withdrawal queue: sale_id IS NULL and status pending/processing
+        db.Index('ix_settlements_status_sale', 'status', 'sale_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
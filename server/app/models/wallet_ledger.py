@@ -1,14 +1,50 @@
-from app import db
+from app.extensions import db
 from datetime import datetime
 
 class WalletLedger(db.Model):
+    """
+    Append-only double-entry journal. Every balance movement writes two rows
+    sharing an entry_id whose amounts sum to zero: the vendor's wallet side
+    (account 'wallet', with the balance it left behind) and the platform
+    account on the other side. Rows are never updated or deleted.
+    """
     __tablename__ = "wallet_ledger"
+    __table_args__ = (
+        # Wallet history and snapshot replay: newest first per wallet
+        db.Index('ix_wallet_ledger_wallet_id', 'wallet_id', 'id'),
+        db.Index('ix_wallet_ledger_entry', 'entry_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    wallet_id = db.Column(db.Integer, db.ForeignKey('wallets.id'), nullable=False)
+    entry_id = db.Column(db.String(36), nullable=False)
+    account = db.Column(db.String(40), nullable=False)   # wallet, mpesa_collections, payouts, opening
+    wallet_id = db.Column(db.Integer, db.ForeignKey('wallets.id'), nullable=True)
+    settlement_id = db.Column(db.Integer, db.ForeignKey('settlements.id'), nullable=True)
 
-    amount = db.Column(db.Float, nullable=False)
-    type = db.Column(db.String(30))   # SALE, PAYOUT, ADJUSTMENT
+    amount = db.Column(db.Float, nullable=False)   # signed: credit > 0, debit < 0
+    balance_after = db.Column(db.Float, nullable=True)   # wallet rows only
+    type = db.Column(db.String(30))   # SALE, PAYOUT, WITHDRAWAL, REFUND, ADJUSTMENT
     category = db.Column(db.String(50))   # cashier, lunch, transport, etc
     description = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    settlement = db.relationship('Settlement', lazy=True)
+
+
+class WalletSnapshot(db.Model):
+    """
+    Wallet balance as of ledger row `ledger_id`, written periodically by
+    `flask snapshot-wallets`. Replaying only the rows after the latest
+    snapshot reproduces current_balance without reading the whole ledger.
+    """
+    __tablename__ = "wallet_snapshots"
+    __table_args__ = (
+        db.Index('ix_wallet_snapshots_wallet_ledger', 'wallet_id', 'ledger_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    wallet_id = db.Column(db.Integer, db.ForeignKey('wallets.id'), nullable=False)
+    ledger_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Float, nullable=False)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
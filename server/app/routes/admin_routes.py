@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, make_response, current_app
+from flask import Blueprint, jsonify, request, make_response, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.user import User
 from app.models.transaction import Sale
@@ -7,32 +7,38 @@ from app.models.event import Event
 from app.models.audit import AuditLog
 from app.models.notification import Notification
 from app.extensions import db, bcrypt
+from app.services.export_service import SalesExportService
+from app.services.rollup_service import RollupService
+from app.services.event_sales_service import EventSalesService
+from app.services.wallet_service import WalletService
+from app.services.withdrawal_service import WithdrawalService, WithdrawalError
+from app.services.payout_dispatcher import PayoutDispatcher, get_payout_dispatcher
+from app.models.payout_request import PayoutRequest
+from app.utils.auth import current_role
+from app.utils.audit import record_audit
 from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 import functools
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
 from threading import Thread
-import csv
-import io
 import string
 import secrets
 import requests
 
 admin_bp = Blueprint('admin_bp', __name__)
 
+BULK_MAX_WITHDRAWALS = 500
+
 def log_admin_action(user_id, action, details=""):
     try:
-        log = AuditLog(user_id=user_id, action=action, details=details, ip_address=request.remote_addr)
-        db.session.add(log)
-        db.session.commit()
+        record_audit(action, user_id, details=details)
     except Exception as e:
         print(f"Failed to create audit log: {e}")
 
 def admin_required(fn):
     @functools.wraps(fn)
     def wrapper(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user or user.role.upper() not in ['ADMIN', 'ADMINISTRATOR']:
+        if current_role() not in ['ADMIN', 'ADMINISTRATOR']:
             return jsonify({"msg": "Admin access required"}), 403
         return fn(*args, **kwargs)
     return wrapper
@@ -83,16 +89,11 @@ def send_credentials_email(user, password, role_name):
 @jwt_required()
 @admin_required
 def get_dashboard_graph():
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=7)
+    start_date = (datetime.utcnow() - timedelta(days=7)).date()
     
-    results = db.session.query(
-        func.date(Sale.created_at).label('date'),
-        func.sum(Sale.total_amount).label('total')
-    ).filter(Sale.created_at >= start_date, Sale.status == 'COMPLETED')\
-    .group_by(func.date(Sale.created_at)).all()
+    results = RollupService.daily_series(start_day=start_date)
     
-    data = [{"name": str(r.date), "sales": float(r.total)} for r in results]
+    data = [{"name": str(day), "sales": float(total)} for day, total in results]
     return jsonify(data), 200
 
 @admin_bp.route('/reports/daily', methods=['GET'])
@@ -100,12 +101,8 @@ def get_dashboard_graph():
 @admin_required
 def get_daily_report():
     today = datetime.utcnow().date()
-    start_of_day = datetime.combine(today, time.min)
-    end_of_day = datetime.combine(today, time.max)
 
-    today_sales = db.session.query(func.sum(Sale.total_amount))\
-        .filter(Sale.created_at >= start_of_day, Sale.created_at <= end_of_day)\
-        .filter_by(status='COMPLETED').scalar() or 0.0
+    today_sales = RollupService.total(start_day=today, end_day=today)
     
     return jsonify({
         "date": today.strftime("%Y-%m-%d"),
@@ -118,9 +115,9 @@ def get_daily_report():
 @jwt_required()
 @admin_required
 def get_admin_stats():
-    total_collections = db.session.query(func.sum(Sale.total_amount)).filter_by(status='COMPLETED').scalar() or 0.0
+    total_collections = RollupService.total()
     total_earnings = total_collections * 0.10
-    total_vendors = User.query.filter(func.upper(User.role) == 'VENDOR').count()
+    total_vendors = User.query.filter(User.role == 'VENDOR').count()
     pending_withdrawals_count = Settlement.query.filter(
         Settlement.sale_id.is_(None), Settlement.status.in_(['processing', 'pending'])
     ).count()
@@ -144,7 +141,7 @@ def get_admin_stats():
 @jwt_required()
 @admin_required
 def get_wallet_overview():
-    total_revenue = db.session.query(func.sum(Sale.total_amount)).filter_by(status='COMPLETED').scalar() or 0.0
+    total_revenue = RollupService.total()
     platform_earnings = total_revenue * 0.10
     
     pending_withdrawals = db.session.query(func.sum(Settlement.amount))\
@@ -191,11 +188,8 @@ def approve_withdrawal(id):
     try:
         withdrawal = Settlement.query.get_or_404(id)
         
-        if withdrawal.status != 'pending':
+        if not WalletService.transition(id, ['pending'], 'completed', processed_at=datetime.utcnow()):
             return jsonify({"msg": f"Withdrawal is already {withdrawal.status}"}), 400
-
-        withdrawal.status = 'completed'
-        withdrawal.processed_at = datetime.utcnow()
         
         notif = Notification(
             user_id=withdrawal.vendor_id, 
@@ -224,15 +218,13 @@ def reject_withdrawal(id):
     try:
         withdrawal = Settlement.query.get_or_404(id)
         
-        if withdrawal.status != 'pending':
+        # Guarded status change first, so a double click cannot refund twice
+        if not WalletService.transition(id, ['pending'], 'rejected',
+                                        notes=(withdrawal.notes or "") + " [Rejected by Admin]"):
             return jsonify({"msg": "Only pending withdrawals can be rejected"}), 400
 
-        vendor_wallet = Wallet.query.filter_by(vendor_id=withdrawal.vendor_id).first()
-        if vendor_wallet:
-            vendor_wallet.current_balance += withdrawal.amount
-        
-        withdrawal.status = 'rejected'
-        withdrawal.notes = (withdrawal.notes or "") + " [Rejected by Admin]"
+        WalletService.add_funds(withdrawal.vendor_id, withdrawal.amount, commit=False, entry_type='REFUND',
+                                settlement_id=withdrawal.id, description="Withdrawal rejected by admin")
         
         notif = Notification(
             user_id=withdrawal.vendor_id, 
@@ -254,6 +246,106 @@ def reject_withdrawal(id):
         db.session.rollback()
         return jsonify({"msg": "Rejection failed", "error": str(e)}), 500
 
+@admin_bp.route('/wallet/withdrawals/bulk', methods=['POST'])
+@jwt_required()
+@admin_required
+def review_withdrawals_bulk():
+    """
+    Body: {"ids": [...], "action": "approve" | "reject", "disburse": bool}.
+    The whole selection is reviewed in one transaction; with disburse=true
+    approved withdrawals are paid out over M-Pesa B2C in the background
+    (track them under /wallet/payouts).
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"msg": "Provide a non-empty 'ids' list"}), 400
+    if len(ids) > BULK_MAX_WITHDRAWALS:
+        return jsonify({"msg": f"At most {BULK_MAX_WITHDRAWALS} withdrawals per request"}), 413
+
+    action = data.get('action')
+    disburse = bool(data.get('disburse')) and action == 'approve'
+    try:
+        result = WithdrawalService.review(ids, action, disburse=disburse)
+        db.session.commit()
+    except WithdrawalError as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 409 if "changed" in str(e) else 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"Bulk Withdrawal Error: {e}")
+        return jsonify({"msg": "Bulk review failed", "error": str(e)}), 500
+
+    if result["updated"]:
+        log_admin_action(
+            get_jwt_identity(),
+            "Bulk Approved Withdrawals" if action == 'approve' else "Bulk Rejected Withdrawals",
+            f"{len(result['updated'])} withdrawals | KES {result['total']:,.2f}"
+        )
+
+    if result["queued"]:
+        dispatcher = get_payout_dispatcher()
+        if current_app.config.get('MPESA_DISPATCH_MODE', 'thread') == 'thread':
+            dispatcher.ensure_started()
+        dispatcher.wake()
+
+    return jsonify({
+        "msg": f"{len(result['updated'])} withdrawals {'approved' if action == 'approve' else 'rejected'}",
+        "action": action,
+        "updated": result["updated"],
+        "skipped": result["skipped"],
+        "total": result["total"],
+        "payouts_queued": result["queued"]
+    }), 200
+
+@admin_bp.route('/wallet/payouts', methods=['GET'])
+@jwt_required()
+@admin_required
+def list_payouts():
+    query = PayoutRequest.query
+    if request.args.get('status'):
+        query = query.filter(PayoutRequest.status == request.args['status'].upper())
+    payouts = query.order_by(PayoutRequest.id.desc()).limit(request.args.get('limit', 100, type=int)).all()
+    counts = dict(db.session.query(PayoutRequest.status, func.count(PayoutRequest.id))
+                  .group_by(PayoutRequest.status).all())
+    return jsonify({"payouts": [p.to_dict() for p in payouts], "counts": counts}), 200
+
+@admin_bp.route('/wallet/payouts/<int:payout_id>/resolve', methods=['POST'])
+@jwt_required()
+@admin_required
+def resolve_payout(payout_id):
+    """
+    Settles an UNKNOWN payout after checking the M-Pesa statement:
+    {"paid": true, "transaction_id": "..."} completes it, {"paid": false}
+    refunds the vendor's wallet.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('paid'), bool):
+        return jsonify({"msg": "'paid' must be true or false"}), 400
+    if data['paid'] and not data.get('transaction_id'):
+        return jsonify({"msg": "transaction_id (the M-Pesa receipt) is required for a paid payout"}), 400
+
+    payout = db.session.get(PayoutRequest, payout_id)
+    if not payout:
+        return jsonify({"msg": "Payout not found"}), 404
+
+    try:
+        if not PayoutDispatcher.resolve(payout, data['paid'], data.get('transaction_id')):
+            db.session.rollback()
+            return jsonify({"msg": f"Payout is {payout.status}, not UNKNOWN"}), 409
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Resolve Payout Error: {e}")
+        return jsonify({"msg": "Failed to resolve payout", "error": str(e)}), 500
+
+    log_admin_action(
+        get_jwt_identity(),
+        "Resolved Payout",
+        f"Payout {payout.id} | {'paid ' + payout.transaction_id if data['paid'] else 'not paid, refunded'}"
+    )
+    return jsonify({"msg": "Payout resolved", "payout": payout.to_dict()}), 200
+
 @admin_bp.route('/events', methods=['GET', 'POST'])
 @jwt_required()
 @admin_required
@@ -303,12 +395,33 @@ def manage_single_event(id):
         log_admin_action(get_jwt_identity(), "Edited Event", f"ID: {id}")
         return jsonify({"msg": "Event updated"}), 200
 
+@admin_bp.route('/events/summary', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_events_summary():
+    try:
+        start, end = EventSalesService.parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(EventSalesService.events(start, end)), 200
+
+@admin_bp.route('/events/<int:id>/summary', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_event_summary(id):
+    event = Event.query.get_or_404(id)
+    try:
+        start, end = EventSalesService.parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(EventSalesService.event_summary(event, start, end)), 200
+
 @admin_bp.route('/vendors', methods=['GET', 'POST'])
 @jwt_required()
 @admin_required
 def manage_vendors_root():
     if request.method == 'GET':
-        vendors = User.query.filter(func.upper(User.role) == 'VENDOR').all()
+        vendors = User.query.options(selectinload(User.assigned_events)).filter(User.role == 'VENDOR').all()
         vendor_list = []
         for v in vendors:
             active_event_name = v.assigned_events[-1].name if v.assigned_events else "None"
@@ -477,29 +590,29 @@ def get_audit_logs():
 @jwt_required()
 @admin_required
 def export_report():
-    sales = Sale.query.filter_by(status='COMPLETED').all()
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['Sale ID', 'Date', 'Amount (KES)', 'Method', 'Cashier', 'Status'])
-    total = 0
-    for s in sales:
-        total += s.total_amount
-        cw.writerow([s.id, s.created_at, s.total_amount, s.payment_method, s.cashier_id, s.status])
-    cw.writerow([])
-    cw.writerow(['TOTAL', '', total])
-    output = make_response(si.getvalue())
-    output.headers["Content-Disposition"] = "attachment; filename=sales_report.csv"
-    output.headers["Content-type"] = "text/csv"
-    return output
+    try:
+        query = SalesExportService.build_query(request.args, status='COMPLETED')
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    stream = SalesExportService.stream_csv(
+        ['Sale ID', 'Date', 'Amount (KES)', 'Method', 'Cashier', 'Status'],
+        query,
+        lambda s: [s.id, s.created_at, s.total_amount, s.payment_method, s.cashier_name or "Unknown", s.status],
+        footer_fn=lambda total: [[], ['TOTAL', '', total]]
+    )
+    return Response(
+        stream_with_context(stream),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=sales_report.csv"}
+    )
 
 @admin_bp.route('/reports/payment-methods', methods=['GET'])
 @jwt_required()
 @admin_required
 def get_payment_method_stats():
     today = datetime.utcnow().date()
-    results = db.session.query(Sale.payment_method, func.sum(Sale.total_amount).label('total'))\
-        .filter(func.date(Sale.created_at) == today, Sale.status == 'COMPLETED')\
-        .group_by(Sale.payment_method).all()
+    results = RollupService.by_payment_method(start_day=today, end_day=today)
     
     total_sum = sum(r.total for r in results) or 1 
     stats = [{"label": r.payment_method, "value": round((r.total / total_sum) * 100, 1), "color": "#22c55e" if "MPESA" in r.payment_method.upper() else "#6366f1"} for r in results]
@@ -513,7 +626,7 @@ def get_top_vendors():
         User.business_name, User.name, User.email,
         func.sum(Sale.total_amount).label('total_sales'),
         func.count(Sale.id).label('transaction_count')
-    ).join(Sale, Sale.cashier_id == User.id)\
+    ).join(Sale, Sale.vendor_id == User.id)\
      .filter(Sale.status == 'COMPLETED')\
      .group_by(User.id).order_by(func.sum(Sale.total_amount).desc()).limit(5).all()
 
@@ -1,11 +1,11 @@
 from flask import Blueprint, jsonify
 from app.models.transaction import Sale, SaleItem 
 from app.models.product import Product
-from app.models.user import User 
 from app.extensions import db
 from sqlalchemy import func
 from datetime import date, datetime, timedelta
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
+from app.utils.auth import current_tenant
 
 analytics_bp = Blueprint('analytics_bp', __name__)
 
@@ -14,7 +14,7 @@ analytics_bp = Blueprint('analytics_bp', __name__)
 def get_cashier_summary():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         today_start_utc = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(hours=3)
         
@@ -86,7 +86,7 @@ def get_cashier_summary():
 def generate_shift_report():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({"msg": "User not found"}), 404
@@ -95,7 +95,7 @@ def generate_shift_report():
 
         business_name = "RadaPOS Retail"
         if user.role == 'CASHIER' and user.vendor_id:
-            vendor = User.query.get(user.vendor_id)
+            vendor = current_tenant()
             business_name = vendor.business_name if vendor else "RadaPOS Retail"
         else:
             business_name = user.business_name or "RadaPOS Retail"
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.models.user import User
 from app.extensions import db, bcrypt, jwt, mail
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_current_user
 from flask_mail import Message
+from app.utils.auth import user_claims
 from datetime import datetime, timedelta
 import secrets
 
@@ -120,7 +121,7 @@ def login():
         if not user or not user.check_password(data.get("password")):
             return jsonify({"msg": "Invalid credentials"}), 401
         
-        access_token = create_access_token(identity=str(user.id), additional_claims={"role": user.role})
+        access_token = create_access_token(identity=str(user.id), additional_claims=user_claims(user))
         
         return jsonify({
             "access_token": access_token, 
@@ -136,8 +137,7 @@ def login():
 @jwt_required()
 def update_profile():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({"msg": "User not found"}), 404
@@ -181,8 +181,7 @@ def update_profile():
 @jwt_required()
 def change_password():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         data = request.get_json()
 
         current_password = data.get('current_password')
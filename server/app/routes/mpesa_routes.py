@@ -1,45 +1,39 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
 from flask_cors import CORS, cross_origin
 from flask_jwt_extended import jwt_required
 from app.models.transaction import Sale, MpesaPayment
-from app.models.product import Product
-from app.models.user import User
-from app.models.wallet import Wallet, Settlement
 from app.extensions import db
-from datetime import datetime, timedelta
-import requests
-import base64
+from app.models.payment_request import PaymentRequest
+from app.services.stk_dispatcher import StkDispatcher, get_stk_dispatcher
+from app.services.callback_service import MpesaCallbackService
+from app.services.payout_dispatcher import PayoutDispatcher, get_payout_dispatcher
+from app.services.receipt_service import ReceiptService
+from app.utils.pubsub import payment_events, ensure_payment_listener
 import io
-import qrcode
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+import json
+import time
 
 mpesa_bp = Blueprint('mpesa_bp', __name__)
 
 CORS(mpesa_bp)
 
-def get_mpesa_password():
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    shortcode = current_app.config.get('MPESA_SHORTCODE')
-    passkey = current_app.config.get('MPESA_PASSKEY')
-    password_str = f"{shortcode}{passkey}{timestamp}"
-    return base64.b64encode(password_str.encode()).decode('utf-8'), timestamp
+STATUS_MAX_WAIT = 25
+STATUS_HEARTBEAT = 10
 
-def get_access_token():
-    consumer_key = current_app.config.get('MPESA_CONSUMER_KEY')
-    consumer_secret = current_app.config.get('MPESA_CONSUMER_SECRET')
-    try:
-        r = requests.get("https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials", auth=(consumer_key, consumer_secret))
-        r.raise_for_status()
-        return r.json()['access_token']
-    except Exception as e:
-        print(f"Token Error: {str(e)}")
-        return None
+@mpesa_bp.before_request
+def start_dispatcher():
+    if current_app.config.get('MPESA_DISPATCH_MODE', 'thread') == 'thread':
+        get_stk_dispatcher().ensure_started()
 
 @mpesa_bp.route('/pay', methods=['POST'])
 @cross_origin()
 @jwt_required()
 def stk_push():
+    """
+    Queues the STK push and returns a checkout handle straight away; the
+    dispatcher talks to Daraja in the background. Poll /status/<handle>.
+    Send an Idempotency-Key header to make retries of this call safe.
+    """
     data = request.get_json()
     try:
         amount = int(float(data.get('amount', 0))) 
@@ -49,265 +43,164 @@ def stk_push():
         if not amount or not phone_number:
             return jsonify({"msg": "Missing amount or phone"}), 400
 
-        token = get_access_token()
-        if not token:
-            return jsonify({"msg": "M-Pesa Auth Failed"}), 500
-
-        password, timestamp = get_mpesa_password()
-        shortcode = current_app.config.get('MPESA_SHORTCODE')
-        callback_url = current_app.config.get('MPESA_CALLBACK_URL')
-
-        payload = {
-            "BusinessShortCode": shortcode,
-            "Password": password,
-            "Timestamp": timestamp,
-            "TransactionType": "CustomerPayBillOnline",
-            "Amount": amount, 
-            "PartyA": phone_number,
-            "PartyB": shortcode,
-            "PhoneNumber": phone_number,
-            "CallBackURL": callback_url,
-            "AccountReference": "RadaPOS",
-            "TransactionDesc": "POS Sale"
-        }
-
-        headers = { "Authorization": f"Bearer {token}" }
-
-        print(f"Sending STK to {phone_number} for {amount} KES")
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        payment_request = StkDispatcher.enqueue(sale_id, phone_number, amount, idempotency_key)
+        db.session.commit()
+        get_stk_dispatcher().wake()
 
-        req = requests.post('https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest', json=payload, headers=headers)
-        res_data = req.json()
-        
-        if 'ResponseCode' in res_data and res_data['ResponseCode'] == '0':
-            new_payment = MpesaPayment(
-                sale_id=sale_id, 
-                checkout_request_id=res_data['CheckoutRequestID'],
-                merchant_request_id=res_data['MerchantRequestID'],
-                phone_number=phone_number,
-                amount=amount,
-                result_desc="Pending"
-            )
-            db.session.add(new_payment)
-            db.session.commit()
-            return jsonify({"msg": "Sent", "checkout_request_id": res_data['CheckoutRequestID'], "sale_id": sale_id}), 200
-        else:
-            print(f"STK Failed: {res_data}")
-            return jsonify({"msg": "STK Push Failed", "error": res_data}), 400
+        handle = payment_request.idempotency_key
+        return jsonify({
+            "msg": "Queued",
+            "checkout": handle,
+            "checkout_request_id": handle,
+            "sale_id": payment_request.sale_id,
+            "status": "PENDING"
+        }), 202
 
     except Exception as e:
+        db.session.rollback()
         print(f"STK System Error: {e}")
         return jsonify({"msg": "Request failed", "error": str(e)}), 500
 
 @mpesa_bp.route('/callback', methods=['POST'])
 @cross_origin()
 def callback():
-    try:
-        data = request.get_json()
-        body = data.get('Body', {})
-        stk_callback = body.get('stkCallback', {})
-        
-        result_code = stk_callback.get('ResultCode')
-        result_desc = stk_callback.get('ResultDesc')
-        checkout_id = stk_callback.get('CheckoutRequestID')
-
-        payment = MpesaPayment.query.filter_by(checkout_request_id=checkout_id).first()
-        
-        if not payment:
-            return jsonify({"ResultCode": 0, "ResultDesc": "Ignored"}), 200
-
-        payment.result_code = result_code
-        payment.result_desc = result_desc
-
-        if result_code == 0:
-            metadata = stk_callback.get('CallbackMetadata', {}).get('Item', [])
-            for item in metadata:
-                if item.get('Name') == 'MpesaReceiptNumber':
-                    payment.mpesa_receipt_number = item.get('Value')
-
-            if payment.parent_sale:
-                sale = payment.parent_sale
-                sale.status = 'COMPLETED'
-                
-                target_vendor_id = None
-                if sale.items:
-                      prod = Product.query.get(sale.items[0].product_id)
-                      if prod: target_vendor_id = prod.vendor_id
-                
-                if not target_vendor_id:
-                      cashier = User.query.get(sale.cashier_id)
-                      if cashier: target_vendor_id = cashier.vendor_id if cashier.role != 'VENDOR' else cashier.id
-
-                if target_vendor_id:
-                      from app.services.wallet_service import WalletService
-                      
-                      net_amount = float(sale.total_amount) * 0.90
-                      WalletService.add_funds(vendor_id=target_vendor_id, amount=net_amount)
-                      
-                      wallet = Wallet.query.filter_by(vendor_id=target_vendor_id).first()
-                      if wallet:
-                          settlement = Settlement(
-                             wallet_id=wallet.id,
-                             sale_id=sale.id,
-                             amount=net_amount,
-                             status='completed'
-                          )
-                          db.session.add(settlement)
-        else:
-             if payment.parent_sale:
-                 payment.parent_sale.status = 'FAILED'
+    body, status = MpesaCallbackService.ingest(request.get_json(silent=True))
+    return jsonify(body), status
 
+@mpesa_bp.route('/b2c/result', methods=['POST'])
+@cross_origin()
+def b2c_result():
+    result = (request.get_json(silent=True) or {}).get('Result', {})
+    try:
+        found = PayoutDispatcher.apply_result(result)
         db.session.commit()
-        return jsonify({"ResultCode": 0, "ResultDesc": "Success"}), 200
-
     except Exception as e:
         db.session.rollback()
-        print(f"Callback Error: {e}")
-        return jsonify({"ResultCode": 1, "ResultDesc": "Internal Error"}), 500
-
-@mpesa_bp.route('/status/<checkout_id>', methods=['GET'])
+        print(f"B2C Result Error: {e}")
+        # Non-zero ResultCode makes Daraja deliver the result again
+        return jsonify({"ResultCode": 1, "ResultDesc": "Retry"}), 500
+    if not found:
+        print(f"B2C Result for unknown payout: {result.get('OriginatorConversationID')}")
+    return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"}), 200
+
+@mpesa_bp.route('/b2c/timeout', methods=['POST'])
 @cross_origin()
-def check_status(checkout_id):
+def b2c_timeout():
+    result = (request.get_json(silent=True) or {}).get('Result', {})
+    try:
+        get_payout_dispatcher().apply_timeout(result)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"B2C Timeout Error: {e}")
+        return jsonify({"ResultCode": 1, "ResultDesc": "Retry"}), 500
+    return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"}), 200
+
+def resolve_payment_status(checkout_id):
+    """Accepts either a Daraja CheckoutRequestID or the handle returned by /pay."""
     payment = MpesaPayment.query.filter_by(checkout_request_id=checkout_id).first()
-    if not payment: return jsonify({"status": "PENDING"}), 200
+    if not payment:
+        payment_request = PaymentRequest.query.filter_by(idempotency_key=checkout_id).first()
+        if payment_request and payment_request.status == PaymentRequest.FAILED:
+            return {"status": "FAILED", "reason": payment_request.last_error}
+        if payment_request and payment_request.status == PaymentRequest.UNKNOWN:
+            # Daraja may have prompted the customer; wait for the callback rather than prompting again
+            return {"status": "PENDING", "reason": "Waiting for M-Pesa to confirm the request"}
+        if payment_request and payment_request.checkout_request_id:
+            payment = MpesaPayment.query.filter_by(checkout_request_id=payment_request.checkout_request_id).first()
+
+    if not payment:
+        return {"status": "PENDING"}
     
     if str(payment.result_code) == '0':
-        return jsonify({"status": "COMPLETED", "sale_id": payment.sale_id}), 200
+        return {"status": "COMPLETED", "sale_id": payment.sale_id}
     elif payment.result_code is not None:
-        return jsonify({"status": "FAILED", "reason": payment.result_desc}), 200
+        return {"status": "FAILED", "reason": payment.result_desc}
     
-    return jsonify({"status": "PENDING"}), 200
+    return {"status": "PENDING"}
+
+def wait_for_status(checkout_id, timeout):
+    """
+    Returns as soon as the payment leaves PENDING or `timeout` runs out. The
+    DB connection goes back to the pool while we wait on the hub.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        with payment_events.subscribe(checkout_id) as changed:
+            status = resolve_payment_status(checkout_id)
+            db.session.close()
+            remaining = deadline - time.monotonic()
+            if status["status"] != "PENDING" or remaining <= 0:
+                return status
+            if not changed.wait(remaining):
+                return status
+
+@mpesa_bp.route('/status/<checkout_id>', methods=['GET'])
+@cross_origin()
+def check_status(checkout_id):
+    """Pass ?wait=<seconds> to long-poll until the payment resolves."""
+    wait = min(request.args.get('wait', 0, type=float), STATUS_MAX_WAIT)
+    if wait > 0:
+        ensure_payment_listener(current_app._get_current_object())
+        return jsonify(wait_for_status(checkout_id, wait)), 200
+    return jsonify(resolve_payment_status(checkout_id)), 200
+
+@mpesa_bp.route('/status/<checkout_id>/stream', methods=['GET'])
+@cross_origin()
+def stream_status(checkout_id):
+    """
+    Server-Sent Events: one `status` event when the payment resolves. The
+    stream closes after STATUS_MAX_WAIT; EventSource reconnects by itself.
+    """
+    ensure_payment_listener(current_app._get_current_object())
+
+    def events():
+        yield "retry: 2000\n\n"
+        deadline = time.monotonic() + STATUS_MAX_WAIT
+        while True:
+            remaining = deadline - time.monotonic()
+            status = wait_for_status(checkout_id, min(STATUS_HEARTBEAT, max(remaining, 0)))
+            if status["status"] != "PENDING":
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                return
+            if remaining <= STATUS_HEARTBEAT:
+                return
+            yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @mpesa_bp.route('/receipt/<int:sale_id>', methods=['GET'])
 @cross_origin()
 def download_receipt(sale_id):
-    try:
-        sale = Sale.query.get_or_404(sale_id)
-        
-        vendor = None
-        cashier = User.query.get(sale.cashier_id)
-        if cashier:
-            vendor_id = cashier.id if cashier.role == 'VENDOR' else cashier.vendor_id
-            vendor = User.query.get(vendor_id)
-
-        business_name = vendor.business_name.upper() if (vendor and vendor.business_name) else "RADA POS"
-        footer_text = getattr(vendor, 'receipt_footer', "Thank you for shopping with us!") or "Thank you for shopping!"
-        phone = vendor.phone_number if vendor else ""
-
-        # Fetch M-Pesa Code if exists
-        mpesa_code = None
-        if sale.payment_method in ['MPESA', 'SPLIT']:
-            mpesa_txn = MpesaPayment.query.filter_by(sale_id=sale.id, result_code=0).first()
-            if mpesa_txn:
-                mpesa_code = mpesa_txn.mpesa_receipt_number
+    """PDF by default; ?format=text or ?format=escpos for counter printers."""
+    fmt = request.args.get('format', 'pdf').lower()
+    if fmt not in ('pdf', 'text', 'escpos'):
+        return jsonify({"msg": "Unsupported format. Use pdf, text or escpos"}), 400
 
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=(300, 750))
-
-        y = 720
-        p.setFont("Helvetica-Bold", 14)
-        p.drawCentredString(150, y, business_name)
-        y -= 20
-        p.setFont("Helvetica", 9)
-        p.drawCentredString(150, y, "Nairobi, Kenya")
-        y -= 15
-        if phone:
-            p.drawCentredString(150, y, f"Tel: {phone}")
-            y -= 20
-        
-        p.line(20, y, 280, y)
-        y -= 20
-
-        p.setFont("Helvetica-Bold", 10)
-        p.drawString(20, y, f"RECEIPT #: {sale.id}")
-        y -= 15
-        p.setFont("Helvetica", 9)
-        local_time = sale.created_at + timedelta(hours=3)
-        p.drawString(20, y, f"Date: {local_time.strftime('%d/%m/%Y %H:%M')}")
-        y -= 15
-        p.drawString(20, y, f"Cashier: {sale.cashier.name if sale.cashier else 'N/A'}")
-        
-        if mpesa_code:
-            y -= 15
-            p.drawString(20, y, f"M-Pesa Ref: {mpesa_code}")
-            
-        y -= 25
-
-        p.setFont("Helvetica-Bold", 9)
-        p.drawString(20, y, "ITEM")
-        p.drawRightString(200, y, "QTY")
-        p.drawRightString(280, y, "TOTAL")
-        p.line(20, y-5, 280, y-5)
-        y -= 20
-        
-        p.setFont("Helvetica", 9)
-        for item in sale.items:
-            name = item.product_name[:22] + "..." if len(item.product_name) > 22 else item.product_name
-            p.drawString(20, y, name)
-            p.drawRightString(200, y, str(item.quantity))
-            p.drawRightString(280, y, f"{item.price * item.quantity:,.2f}")
-            y -= 15
-
-        y -= 10
-        p.line(20, y, 280, y)
-        y -= 20
-
-        discount = getattr(sale, 'discount', 0) or 0
-
-        if discount > 0:
-            subtotal = sale.total_amount + discount
-            
-            p.setFont("Helvetica", 9)
-            p.drawString(20, y, "Subtotal")
-            p.drawRightString(280, y, f"{subtotal:,.2f}")
-            y -= 15
-            
-            p.drawString(20, y, "Discount")
-            p.drawRightString(280, y, f"-{discount:,.2f}")
-            y -= 15
-            
-            p.setLineWidth(0.5)
-            p.line(180, y+5, 280, y+5) 
-            y -= 5
-
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(20, y, "TOTAL")
-        p.drawRightString(280, y, f"KES {sale.total_amount:,.2f}")
-        
-        if sale.payment_method == 'SPLIT':
-             y -= 20
-             p.setFont("Helvetica", 9)
-             p.drawString(20, y, "Paid via Cash:")
-             p.drawRightString(280, y, f"{sale.amount_cash:,.2f}")
-             y -= 15
-             p.drawString(20, y, "Paid via M-Pesa:")
-             p.drawRightString(280, y, f"{sale.amount_mpesa:,.2f}")
-
-        landing_page_url = "https://rada-pos.vercel.app/" 
-        qr = qrcode.QRCode(box_size=10, border=1)
-        qr.add_data(landing_page_url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        
-        qr_buf = io.BytesIO()
-        qr_img.save(qr_buf, format='PNG')
-        qr_buf.seek(0)
-        
-        y -= 90
-        p.drawImage(ImageReader(qr_buf), 110, y, width=80, height=80)
-
-        y -= 20
-        p.setFont("Helvetica-Oblique", 8)
-        p.drawCentredString(150, y, footer_text)
-        
-        y -= 12
-        p.setFont("Helvetica", 6)
-        p.setFillColorRGB(0.5, 0.5, 0.5)
-        p.drawCentredString(150, y, "Powered by RadaPOS Enterprise")
-
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name=f"Receipt_{sale.id}.pdf", mimetype='application/pdf')
+    try:
+        if fmt == 'pdf':
+            pdf = ReceiptService.get_pdf(sale_id)
+            if pdf is None:
+                return jsonify({"msg": "Sale not found"}), 404
+            return send_file(io.BytesIO(pdf), as_attachment=True, download_name=f"Receipt_{sale_id}.pdf", mimetype='application/pdf')
+
+        data = ReceiptService.load(sale_id)
+        if data is None:
+            return jsonify({"msg": "Sale not found"}), 404
+
+        if fmt == 'text':
+            return Response(ReceiptService.render_text(data), mimetype='text/plain')
+
+        return Response(
+            ReceiptService.render_escpos(data),
+            mimetype='application/octet-stream',
+            headers={"Content-Disposition": f"attachment; filename=Receipt_{sale_id}.bin"}
+        )
     except Exception as e:
         print(f"Receipt Error: {e}")
-        return jsonify({"msg": "Failed to generate receipt"}), 500
\ No newline at end of file
+        return jsonify({"msg": "Failed to generate receipt"}), 500
@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from app.models.product import Product
 from app.models.user import User
 from app.extensions import db
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
 from app.utils.audit import audit_log
+from app.services.product_import_service import ProductImportService
+from app.services.catalog_service import CatalogService
+from app.services.catalog_cache import get_catalog_cache
+from app.utils.auth import tenant_id_for
 
 product_bp = Blueprint('product_bp', __name__)
 
@@ -12,8 +16,7 @@ product_bp = Blueprint('product_bp', __name__)
 @jwt_required()
 def get_products():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
 
         if not user:
             return jsonify({"msg": "User not found"}), 404
@@ -21,39 +24,55 @@ def get_products():
         # 1. DATA ISOLATION LOGIC
         if user.role.upper() in ['ADMIN', 'ADMINISTRATOR']:
             # Admins see all products
-            products = Product.query.all()
-            
-        elif user.role.upper() == 'VENDOR':
-            # Vendors see ONLY their own products
-            products = Product.query.filter_by(vendor_id=current_user_id).all()
-            
-        elif user.role.upper() == 'CASHIER':
-            # Cashiers see products belonging to their Employing Vendor
-            if user.vendor_id:
-                products = Product.query.filter_by(vendor_id=user.vendor_id).all()
-            else:
-                products = []
-        else:
+            return jsonify(CatalogService.products()), 200
+
+        if user.role.upper() not in ['VENDOR', 'CASHIER']:
+            return jsonify([]), 200
+
+        # Vendors see their own products, cashiers their employing vendor's
+        vendor_id = tenant_id_for(user)
+        if not vendor_id:
             return jsonify([]), 200
 
-        # 2. Serialize Output
-        output = []
-        for product in products:
-            output.append({
-                'id': product.id,
-                'name': product.name,
-                'price': product.price,
-                'stock_quantity': product.stock_quantity,
-                'description': product.description,
-                'vendor_id': product.vendor_id,
-                'category': getattr(product, 'category', 'General') 
-            })
-        return jsonify(output), 200
+        # 2. Revalidation: an unchanged catalog costs one indexed lookup
+        version = CatalogService.current_version(vendor_id)
+        etag = CatalogService.etag(vendor_id, version)
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(jsonify(CatalogService.cached_products(vendor_id, version)), 200)
+
+        response.set_etag(etag, weak=True)
+        response.headers['X-Catalog-Version'] = str(version)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         print(f"Error fetching products: {e}")
         return jsonify({"msg": "Error fetching products"}), 500
 
+# CATALOG DELTA SINCE A VERSION
+@product_bp.route('/changes', methods=['GET'])
+@jwt_required()
+def get_product_changes():
+    user = get_current_user()
+    if not user or user.role.upper() not in ['VENDOR', 'CASHIER']:
+        return jsonify({"msg": "Unauthorized"}), 403
+
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({"msg": "since must be a catalog version (integer >= 0)"}), 400
+
+    vendor_id = tenant_id_for(user)
+    if not vendor_id:
+        return jsonify({"version": 0, "since": since, "reset": False, "products": [], "deleted": []}), 200
+
+    try:
+        return jsonify(CatalogService.changes_since(vendor_id, since)), 200
+    except Exception as e:
+        print(f"Error fetching product changes: {e}")
+        return jsonify({"msg": "Error fetching product changes"}), 500
+
 # ADD PRODUCT
 @product_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -62,7 +81,7 @@ def add_product():
         data = request.get_json()
         current_user_id = get_jwt_identity()
         
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user or user.role.upper() != 'VENDOR':
             return jsonify({"msg": "Unauthorized. Only Vendors can add products."}), 403
@@ -73,11 +92,13 @@ def add_product():
             stock_quantity=int(data['stock_quantity']),
             description=data.get('description', ''),
             category=data.get('category', 'General'),
-            vendor_id=current_user_id 
+            vendor_id=current_user_id,
+            catalog_version=CatalogService.bump(user.id)
         )
         
         db.session.add(new_product)
         db.session.commit()
+        get_catalog_cache().put(new_product)
         
         return jsonify({
             'id': new_product.id,
@@ -100,8 +121,10 @@ def delete_product(id):
         if str(product.vendor_id) != str(current_user_id):
             return jsonify({"msg": "Unauthorized: You do not own this product"}), 403
             
+        CatalogService.record_deletes(product.vendor_id, [product.id])
         db.session.delete(product)
         db.session.commit()
+        get_catalog_cache().remove(product.vendor_id, product.id)
         return jsonify({"msg": "Product deleted successfully"}), 200
 
     except Exception as e:
@@ -130,10 +153,42 @@ def update_product(id):
         product.stock_quantity = data.get('stock_quantity', product.stock_quantity)
         product.description = data.get('description', product.description)
         product.category = data.get('category', product.category)
+        product.catalog_version = CatalogService.bump(product.vendor_id)
 
         db.session.commit()
+        get_catalog_cache().put(product)
         return jsonify({"msg": "Product updated successfully", "id": product.id}), 200
         
     except Exception as e:
         print(f"Error updating product: {e}")
-        return jsonify({"msg": "Failed to update product"}), 500
\ No newline at end of file
+        return jsonify({"msg": "Failed to update product"}), 500
+
+# BULK IMPORT / UPDATE
+@product_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+@audit_log("Bulk Imported Products")
+def bulk_import_products():
+    """
+    Accepts a JSON array (or {"products": [...]}), NDJSON, a text/csv body or
+    a multipart CSV `file`. Rows are validated and written in chunks; the
+    response reports per-row errors by 1-based row number.
+    """
+    user = get_current_user()
+    if not user or user.role.upper() != 'VENDOR':
+        return jsonify({"msg": "Unauthorized. Only Vendors can import products."}), 403
+
+    try:
+        report = ProductImportService.run(ProductImportService.iter_rows(request), user.id)
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({"msg": f"Could not read upload: {e}"}), 400
+    except Exception as e:
+        print(f"Bulk Import Error: {e}")
+        db.session.rollback()
+        return jsonify({"msg": "Failed to import products"}), 500
+    finally:
+        # Earlier chunks may have committed even if a later one failed
+        get_catalog_cache().invalidate(user.id)
+
+    status = 200 if report["failed"] == 0 else 207
+    return jsonify(report), status
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
 from app.models.user import User
 from app.models.audit import AuditLog  
 from app.extensions import db, bcrypt
@@ -12,8 +12,7 @@ settings_bp = Blueprint('settings_bp', __name__)
 @settings_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
     
     return jsonify({
         "name": user.name,
@@ -28,8 +27,7 @@ def get_profile():
 @settings_bp.route('/profile', methods=['PUT'])
 @jwt_required()
 def update_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
     data = request.get_json()
 
     if 'name' in data: user.name = data['name']
@@ -52,8 +50,7 @@ def update_profile():
 @settings_bp.route('/security/password', methods=['PUT'])
 @jwt_required()
 def change_password():
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
     data = request.get_json()
 
     current_password = data.get('current_password')
@@ -78,8 +75,7 @@ def change_password():
 @settings_bp.route('/notifications', methods=['GET'])
 @jwt_required()
 def get_notifications():
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
     
     return jsonify({
         "notify_email": user.notify_email, 
@@ -90,8 +86,7 @@ def get_notifications():
 @settings_bp.route('/notifications', methods=['PUT'])
 @jwt_required()
 def update_notifications():
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
     data = request.get_json()
     
     if 'emailAlerts' in data: user.notify_email = data['emailAlerts']
@@ -116,7 +111,7 @@ def update_notifications():
 def get_audit_logs():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
 
         if not user:
             return jsonify({"msg": "User not found"}), 404
@@ -145,7 +140,7 @@ def get_audit_logs():
 @jwt_required()
 def handle_discounts():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_current_user()
     
     if user.role != 'VENDOR':
         return jsonify({"msg": "Unauthorized"}), 403
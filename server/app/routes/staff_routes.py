@@ -2,7 +2,7 @@ import string
 import secrets
 import os
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user, current_user
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from app.models.user import User
@@ -20,7 +20,7 @@ def generate_temp_password(length=8):
 def get_staff():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({"msg": "User not found"}), 404
@@ -47,7 +47,6 @@ def get_staff():
 def add_staff():
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
         
         if current_user.role.upper() not in ['VENDOR', 'ADMIN', 'ADMINISTRATOR']:
              return jsonify({"msg": "Unauthorized action"}), 403
@@ -119,7 +118,6 @@ def add_staff():
 def delete_staff(id):
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
         
         staff = User.query.get_or_404(id)
         
@@ -1,96 +1,124 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.models.transaction import Sale, SaleItem, MpesaPayment
-from app.models.product import Product
 from app.models.user import User
-from app.models.notification import Notification
 from app.extensions import db
-from datetime import datetime
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
 from app.models.discount import DiscountCode
-import csv
-import io
+from app.services.checkout_service import CheckoutService, CheckoutError
+from app.services.export_service import SalesExportService
+from app.services.callback_service import MpesaCallbackService
+from app.utils.auth import current_tenant_id
+from app.utils.pagination import get_page_size, encode_cursor, decode_cursor
+from sqlalchemy import func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 
 transaction_bp = Blueprint('transaction_bp', __name__)
 
+BATCH_MAX_SALES = 500
+
 @transaction_bp.route('/mpesa/callback', methods=['POST'])
 def mpesa_callback():
-    data = request.get_json()
-    
-    callback_data = data.get('Body', {}).get('stkCallback', {})
-    result_code = callback_data.get('ResultCode')
-    checkout_id = callback_data.get('CheckoutRequestID')
+    body, status = MpesaCallbackService.ingest(request.get_json(silent=True))
+    return jsonify(body), status
 
-    payment = MpesaPayment.query.filter_by(checkout_request_id=checkout_id).first()
-    
-    if not payment:
-        return jsonify({"ResultCode": 1, "ResultDesc": "Ignored"}), 200
+def serialize_sale_row(s, cashier_name, items_count):
+    final_cash = s.amount_cash or 0
+    final_mpesa = s.amount_mpesa or 0
 
-    if result_code == 0:
-        payment.result_code = 0
-        payment.result_desc = "Success"
-        
-        metadata = callback_data.get('CallbackMetadata', {}).get('Item', [])
-        for item in metadata:
-            if item['Name'] == 'MpesaReceiptNumber':
-                payment.mpesa_receipt_number = item['Value']
-
-        if payment.parent_sale:
-            payment.parent_sale.status = 'COMPLETED'
-    else:
-        payment.result_code = result_code
-        payment.result_desc = callback_data.get('ResultDesc', 'Failed')
-        if payment.parent_sale:
-            payment.parent_sale.status = 'FAILED'
-
-    db.session.commit()
-    return jsonify({"ResultCode": 0, "ResultDesc": "Success"}), 200
+    if s.payment_method == 'CASH' and final_cash == 0:
+        final_cash = s.total_amount
+    elif s.payment_method == 'MPESA' and final_mpesa == 0:
+        final_mpesa = s.total_amount
+    
+    method_display = s.payment_method
+    if s.payment_method == 'SPLIT':
+        method_display = f"SPLIT (Cash: {final_cash}, M-Pesa: {final_mpesa})"
+    
+    return {
+        "id": s.id,
+        "total_amount": s.total_amount,
+        "amount_cash": final_cash,
+        "amount_mpesa": final_mpesa,
+        "payment_method": s.payment_method,
+        "method_display": method_display,
+        "status": s.status,
+        "created_at": s.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "cashier_name": cashier_name or "Unknown",
+        "items_count": items_count
+    }
 
 @transaction_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_transactions():
+    """
+    Lists sales visible to the caller. Cashier names come from a join and
+    item counts from one grouped query over the page, so the cost is two
+    queries regardless of history size.
+
+    Passing ?limit= or ?cursor= switches to keyset pagination on
+    (created_at, id) and returns {"items": [...], "next_cursor": ...}.
+    """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
+
+        cashier = aliased(User)
+        query = db.session.query(Sale, cashier.name)\
+            .outerjoin(cashier, Sale.cashier_id == cashier.id)
 
         if user.role.upper() in ['ADMIN', 'ADMINISTRATOR']:
-            sales = Sale.query.order_by(Sale.created_at.desc()).all()
-            
+            pass
         elif user.role.upper() == 'VENDOR':
             vendor_id = user.id
-            sales = Sale.query.join(User, Sale.cashier_id == User.id)\
-                .filter((User.id == vendor_id) | (User.vendor_id == vendor_id))\
-                .order_by(Sale.created_at.desc()).all()
+            query = query.filter((cashier.id == vendor_id) | (cashier.vendor_id == vendor_id))
         else:
-            sales = Sale.query.filter_by(cashier_id=current_user_id).order_by(Sale.created_at.desc()).all()
-        
-        results = []
-        for s in sales:
-            final_cash = s.amount_cash or 0
-            final_mpesa = s.amount_mpesa or 0
+            query = query.filter(Sale.cashier_id == current_user_id)
+
+        paginate = 'limit' in request.args or 'cursor' in request.args
+        if paginate:
+            limit = get_page_size(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            if cursor:
+                try:
+                    cursor_ts, cursor_id = decode_cursor(cursor)
+                except ValueError:
+                    return jsonify({"msg": "Invalid cursor"}), 400
+                query = query.filter(or_(
+                    Sale.created_at < cursor_ts,
+                    and_(Sale.created_at == cursor_ts, Sale.id < cursor_id)
+                ))
+
+        query = query.order_by(Sale.created_at.desc(), Sale.id.desc())
+        rows = query.limit(limit + 1).all() if paginate else query.all()
+
+        has_more = paginate and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+
+        sale_ids = [s.id for s, _ in rows]
+        item_counts = {}
+        if sale_ids:
+            item_counts = dict(
+                db.session.query(SaleItem.sale_id, func.count(SaleItem.id))
+                .filter(SaleItem.sale_id.in_(sale_ids))
+                .group_by(SaleItem.sale_id).all()
+            )
 
-            if s.payment_method == 'CASH' and final_cash == 0:
-                final_cash = s.total_amount
-            elif s.payment_method == 'MPESA' and final_mpesa == 0:
-                final_mpesa = s.total_amount
-            
-            method_display = s.payment_method
-            if s.payment_method == 'SPLIT':
-                method_display = f"SPLIT (Cash: {final_cash}, M-Pesa: {final_mpesa})"
-            
-            results.append({
-                "id": s.id,
-                "total_amount": s.total_amount,
-                "amount_cash": final_cash,
-                "amount_mpesa": final_mpesa,
-                "payment_method": s.payment_method,
-                "method_display": method_display,
-                "status": s.status,
-                "created_at": s.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "cashier_name": s.cashier.name if s.cashier else "Unknown",
-                "items_count": len(s.items)
-            })
-            
-        return jsonify(results), 200
+        results = [
+            serialize_sale_row(s, cashier_name, item_counts.get(s.id, 0))
+            for s, cashier_name in rows
+        ]
+
+        if not paginate:
+            return jsonify(results), 200
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1][0]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        return jsonify({"items": results, "next_cursor": next_cursor}), 200
     except Exception as e:
         print(f"Fetch Error: {e}")
         return jsonify({"msg": "Failed to fetch transactions"}), 500
@@ -99,23 +127,17 @@ def get_transactions():
 @jwt_required()
 def export_transactions():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
 
-        if user.role.upper() == 'VENDOR':
-            vendor_id = user.id
-            sales = Sale.query.join(User, Sale.cashier_id == User.id)\
-                .filter((User.id == vendor_id) | (User.vendor_id == vendor_id))\
-                .order_by(Sale.created_at.desc()).all()
-        else:
+        if user.role.upper() != 'VENDOR':
              return jsonify({"msg": "Unauthorized"}), 403
 
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        writer.writerow(['Sale ID', 'Date', 'Cashier', 'Method', 'Total', 'Cash Paid', 'M-Pesa Paid', 'Status'])
-        
-        for s in sales:
+        try:
+            query = SalesExportService.build_query(request.args, vendor_id=user.id)
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+
+        def to_row(s):
             final_cash = s.amount_cash or 0
             final_mpesa = s.amount_mpesa or 0
 
@@ -124,20 +146,24 @@ def export_transactions():
             elif s.payment_method == 'MPESA' and final_mpesa == 0:
                 final_mpesa = s.total_amount
 
-            writer.writerow([
+            return [
                 s.id, 
                 s.created_at.strftime("%Y-%m-%d %H:%M"), 
-                s.cashier.name if s.cashier else "Unknown",
+                s.cashier_name or "Unknown",
                 s.payment_method,
                 s.total_amount,
                 final_cash,
                 final_mpesa,
                 s.status
-            ])
-            
-        output.seek(0)
+            ]
+
+        stream = SalesExportService.stream_csv(
+            ['Sale ID', 'Date', 'Cashier', 'Method', 'Total', 'Cash Paid', 'M-Pesa Paid', 'Status'],
+            query,
+            to_row
+        )
         return Response(
-            output, 
+            stream_with_context(stream), 
             mimetype="text/csv", 
             headers={"Content-Disposition": "attachment;filename=sales_report.csv"}
         )
@@ -152,135 +178,70 @@ def create_transaction():
     try:
         current_user_id = get_jwt_identity()
         data = request.get_json()
-        
-        cart_items = data.get('items', [])
-        payment_method = data.get('payment_method', 'CASH').upper()
-        coupon_code = data.get('coupon_code')
-        
-        req_cash = float(data.get('amount_cash', 0))
-        req_mpesa = float(data.get('amount_mpesa', 0))
-        
-        if not cart_items:
-            return jsonify({"msg": "Cart is empty"}), 400
-
-        calculated_total = 0
-        valid_items = []
-
-        for item in cart_items:
-            product = Product.query.get(item['id'])
-            if not product:
-                return jsonify({"msg": f"Product ID {item['id']} not found"}), 400
-            
-            if product.stock_quantity < item['quantity']:
-                return jsonify({"msg": f"Insufficient stock for {product.name}"}), 400
-            
-            line_total = product.price * item['quantity']
-            calculated_total += line_total
-            
-            valid_items.append({
-                "product": product,
-                "quantity": item['quantity'],
-                "price": product.price
-            })
-
-        discount_amount = 0.0
-        applied_coupon = None
-
-        if coupon_code:
-            user = User.query.get(current_user_id)
-            vendor_id = user.id if user.role == 'VENDOR' else user.vendor_id
-            
-            coupon = DiscountCode.query.filter_by(code=coupon_code, vendor_id=vendor_id).first()
-            
-            if coupon and coupon.is_valid():
-                discount_amount = (calculated_total * coupon.percentage) / 100
-                applied_coupon = coupon.code
-
-        final_total = calculated_total - discount_amount
-
-        final_cash = 0.0
-        final_mpesa = 0.0
-
-        if payment_method == 'CASH':
-            final_cash = final_total
-        elif payment_method == 'MPESA':
-            final_mpesa = final_total
-        elif payment_method == 'SPLIT':
-            if abs((req_cash + req_mpesa) - final_total) > 1.0:
-                 return jsonify({"msg": f"Split amounts ({req_cash} + {req_mpesa}) do not match Total ({final_total})"}), 400
-            final_cash = req_cash
-            final_mpesa = req_mpesa
-
-        new_sale = Sale(
-            total_amount=final_total,
-            discount_amount=discount_amount,
-            coupon_code=applied_coupon,
-            payment_method=payment_method,
-            amount_cash=final_cash,
-            amount_mpesa=final_mpesa,
-            status='PENDING' if (payment_method == 'MPESA' or payment_method == 'SPLIT') else 'COMPLETED',
-            cashier_id=current_user_id,
-            created_at=datetime.utcnow()
-        )
-        
-        db.session.add(new_sale)
-        db.session.flush()
-
-        for v_item in valid_items:
-            product = v_item['product']
-            qty = v_item['quantity']
-            
-            product.stock_quantity -= qty
-
-            if product.stock_quantity <= 5:
-                existing_alert = Notification.query.filter_by(
-                    user_id=product.vendor_id, 
-                    message=f"Low Stock Alert: {product.name} is down to {product.stock_quantity} items."
-                ).first()
-
-                if not existing_alert:
-                    alert = Notification(
-                        user_id=product.vendor_id, 
-                        message=f"Low Stock Alert: {product.name} is down to {product.stock_quantity} items.",
-                        type='warning'
-                    )
-                    db.session.add(alert)
-            
-            sale_item = SaleItem(
-                sale_id=new_sale.id,
-                product_id=product.id,
-                product_name=product.name,
-                quantity=qty,
-                price=v_item['price']
-            )
-            db.session.add(sale_item)
 
+        new_sale = CheckoutService.create_sale(current_user_id, data)
         db.session.commit()
+        CheckoutService.publish_stock()
 
         return jsonify({
             "msg": "Transaction processed successfully", 
             "sale_id": new_sale.id,
-            "total": final_total,
-            "amount_mpesa": final_mpesa,
+            "total": new_sale.total_amount,
+            "amount_mpesa": new_sale.amount_mpesa,
             "status": new_sale.status
         }), 201
 
+    except CheckoutError as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         print(f"Transaction Error: {e}")
         return jsonify({"msg": f"Transaction failed: {str(e)}"}), 500
 
+@transaction_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def create_transaction_batch():
+    """
+    Offline sync: {"sales": [{client_uuid, created_at, items, payment_method, ...}]}.
+    Each sale gets its own result; duplicates (already synced client_uuids)
+    are reported, not re-booked, so a till can safely resend its whole queue.
+    """
+    data = request.get_json(silent=True)
+    entries = data.get('sales') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"msg": "Expected a non-empty list of sales"}), 400
+    if len(entries) > BATCH_MAX_SALES:
+        return jsonify({"msg": f"At most {BATCH_MAX_SALES} sales per batch"}), 413
+
+    try:
+        results = CheckoutService.create_sales_batch(int(get_jwt_identity()), entries)
+        db.session.commit()
+        CheckoutService.publish_stock()
+    except IntegrityError:
+        # Another request synced some of these client_uuids concurrently; a resend resolves them as duplicates
+        db.session.rollback()
+        return jsonify({"msg": "Batch overlapped a concurrent sync. Please resend."}), 409
+    except CheckoutError as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Batch Sync Error: {e}")
+        return jsonify({"msg": "Batch sync failed"}), 500
+
+    counts = {"created": 0, "duplicate": 0, "rejected": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return jsonify({"results": results, **counts}), 200
+
 @transaction_bp.route('/validate-coupon', methods=['POST'])
 @jwt_required()
 def validate_coupon():
     try:
         data = request.get_json()
         code_text = data.get('code', '').upper().strip()
-        current_user_id = get_jwt_identity()
-        
-        user = User.query.get(current_user_id)
-        
-        vendor_id = user.id if user.role == 'VENDOR' else user.vendor_id
+        vendor_id = current_tenant_id()
         
         if not vendor_id:
              return jsonify({"msg": "Configuration Error: No linked vendor"}), 400
@@ -308,10 +269,7 @@ def validate_coupon():
 @jwt_required()
 def get_available_coupons():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        vendor_id = user.id if user.role == 'VENDOR' else user.vendor_id
+        vendor_id = current_tenant_id()
         
         if not vendor_id:
             return jsonify([]), 200
@@ -1,18 +1,19 @@
-from flask import Blueprint, jsonify, request, send_file
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, jsonify, request, send_file, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
 from app.models.user import User
 from app.models.product import Product
 from app.models.transaction import Sale, SaleItem
 from app.models.wallet import Wallet, Settlement
 from app.models.notification import Notification
 from app.extensions import db
+from app.services.event_sales_service import EventSalesService
+from app.services.vendor_analytics_service import VendorAnalyticsService
+from app.services.wallet_service import WalletService, WalletError
 from sqlalchemy import func
 from datetime import datetime, timedelta
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import io
+from app.models.report_job import ReportJob
+from app.services.report_jobs import ReportService, ReportError, get_report_runner
+import os
 
 vendor_bp = Blueprint('vendor_bp', __name__)
 
@@ -55,27 +56,28 @@ def direct_payout():
         if amount <= 0:
             return jsonify({"msg": "Invalid amount"}), 400
         
-        wallet = Wallet.query.filter_by(vendor_id=current_user_id).first()
-        if not wallet or wallet.current_balance < amount:
-            return jsonify({"msg": "Insufficient funds"}), 400
-
-        # ATOMIC DEDUCTION
-        wallet.current_balance -= amount
         payout = Settlement(
             vendor_id=current_user_id,
             amount=amount,
             status='paid', 
             notes=f"Direct Payout to {recipient} ({phone})"
         )
-        
         db.session.add(payout)
+        db.session.flush()
+
+        # ATOMIC DEDUCTION: guarded UPDATE, fails instead of overdrawing
+        new_balance = WalletService.debit(int(current_user_id), amount, 'PAYOUT',
+                                          settlement_id=payout.id, description=payout.notes)
         db.session.commit()
 
         return jsonify({
             "msg": f"Successfully paid KES {amount:,.2f} to {recipient}", 
-            "new_balance": wallet.current_balance
+            "new_balance": new_balance
         }), 200
 
+    except WalletError as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         print(f"Payout Error: {e}")
@@ -87,9 +89,8 @@ def direct_payout():
 def get_vendor_stats():
     current_user_id = get_jwt_identity()
     
-    total_sales = db.session.query(func.sum(SaleItem.price * SaleItem.quantity))\
-        .join(Product).filter(Product.vendor_id == current_user_id)\
-        .join(Sale).filter(Sale.status == 'COMPLETED').scalar() or 0.0
+    summary = VendorAnalyticsService.summary(int(current_user_id))
+    total_sales = summary["revenue"]
 
     wallet = Wallet.query.filter_by(vendor_id=current_user_id).first()
     balance = wallet.current_balance if wallet else 0.0
@@ -106,9 +107,7 @@ def get_vendor_stats():
         "earnings": float(total_sales * 0.90),
         "balance": float(balance),
         "products": product_count,
-        "total_orders": Sale.query.join(SaleItem).join(Product)\
-            .filter(Product.vendor_id == current_user_id, Sale.status == 'COMPLETED')\
-            .distinct().count(),
+        "total_orders": summary["order_count"],
         "low_stock": low_stock
     }), 200
 
@@ -116,40 +115,34 @@ def get_vendor_stats():
 @jwt_required()
 def get_vendor_graph():
     current_user_id = get_jwt_identity()
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=7)
-
-    results = db.session.query(
-        func.date(Sale.created_at).label('date'),
-        func.sum(SaleItem.price * SaleItem.quantity).label('total')
-    ).join(SaleItem).join(Product)\
-    .filter(
-        Product.vendor_id == current_user_id, 
-        Sale.created_at >= start_date, 
-        Sale.status == 'COMPLETED'
-    )\
-    .group_by(func.date(Sale.created_at)).all()
+    start_date = (datetime.utcnow() - timedelta(days=7)).date()
 
-    data = [{"date": str(r.date), "amount": float(r.total)} for r in results]
+    results = VendorAnalyticsService.daily_series(int(current_user_id), start_day=start_date)
+
+    data = [{"date": str(day), "amount": float(total)} for day, total in results]
     return jsonify(data), 200
 
+@vendor_bp.route('/events', methods=['GET'])
+@jwt_required()
+def get_vendor_events():
+    current_user_id = get_jwt_identity()
+    try:
+        start, end = EventSalesService.parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(EventSalesService.vendor_events(int(current_user_id), start, end)), 200
+
 @vendor_bp.route('/wallet/request-withdrawal', methods=['POST'])
 @jwt_required()
 def request_withdrawal():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_current_user()
     data = request.get_json()
     amount = float(data.get('amount', 0))
 
     if amount <= 0:
         return jsonify({"msg": "Invalid amount"}), 400
 
-    wallet = Wallet.query.filter_by(vendor_id=current_user_id).first()
-    if not wallet or wallet.current_balance < amount:
-        return jsonify({"msg": "Insufficient funds"}), 400
-
-    wallet.current_balance -= amount
-    
     settlement = Settlement(
         vendor_id=current_user_id,
         amount=amount, 
@@ -157,6 +150,13 @@ def request_withdrawal():
         notes="Withdrawal Request to Admin"
     )
     db.session.add(settlement)
+    db.session.flush()
+
+    try:
+        WalletService.debit(int(current_user_id), amount, 'WITHDRAWAL', settlement_id=settlement.id)
+    except WalletError as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 400
 
     admin = User.query.filter((User.role == 'ADMIN') | (User.role == 'ADMINISTRATOR')).first()
     if admin:
@@ -179,96 +179,102 @@ def get_wallet_history():
     try:
         current_user_id = get_jwt_identity()
         
-        transactions = Settlement.query.filter_by(vendor_id=current_user_id)\
-            .order_by(Settlement.created_at.desc()).limit(20).all()
-
-        output = []
-        for t in transactions:
-            t_type = "Transaction"
-            if t.status == 'pending': 
-                t_type = "Withdrawal Request"
-            elif t.status == 'paid': 
-                t_type = "Direct Payout"
-            elif t.status == 'completed': 
-                t_type = "Sale Revenue"
-            elif t.status == 'rejected': 
-                t_type = "Refunded (Rejected)"
-
-            output.append({
-                "id": t.id,
-                "amount": float(t.amount or 0),
-                "status": t.status or 'Unknown',
-                "date": t.created_at.strftime("%Y-%m-%d %H:%M") if t.created_at else "N/A",
-                "type": t_type,
-                "notes": t.notes or ""
-            })
-
+        output = WalletService.history(int(current_user_id))
         return jsonify(output), 200
     except Exception as e:
         print(f"History Logic Error: {e}")
         return jsonify([]), 200
 
+def _job_response(job, code=200):
+    body = job.to_dict()
+    body["status_url"] = f"/api/vendor/reports/jobs/{job.id}"
+    body["download_url"] = f"/api/vendor/reports/jobs/{job.id}/download" if job.status == ReportJob.DONE else None
+    return jsonify(body), code
+
+@vendor_bp.route('/reports/jobs', methods=['POST'])
+@jwt_required()
+def create_report_job():
+    user = get_current_user()
+    if not user or user.role.upper() != 'VENDOR':
+        return jsonify({"msg": "Unauthorized"}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        params = ReportService.parse_params(data)
+        job = ReportService.enqueue(user.id, user.id, data.get('kind', 'sales_pdf'), params)
+        db.session.commit()
+    except ReportError as e:
+        db.session.rollback()
+        return jsonify({"msg": str(e)}), 400
+
+    runner = get_report_runner()
+    runner.submit(job.id)
+    runner.prune()
+    return _job_response(job, 202)
+
+@vendor_bp.route('/reports/jobs', methods=['GET'])
+@jwt_required()
+def list_report_jobs():
+    current_user_id = get_jwt_identity()
+    jobs = ReportJob.query.filter_by(vendor_id=current_user_id)\
+        .order_by(ReportJob.created_at.desc()).limit(20).all()
+    return jsonify([job.to_dict() for job in jobs]), 200
+
+@vendor_bp.route('/reports/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_report_job(job_id):
+    current_user_id = get_jwt_identity()
+    job = ReportJob.query.filter_by(id=job_id, vendor_id=current_user_id).first()
+    if not job:
+        return jsonify({"msg": "Report not found"}), 404
+    return _job_response(job)
+
+@vendor_bp.route('/reports/jobs/<int:job_id>/download', methods=['GET'])
+@jwt_required()
+def download_report_job(job_id):
+    current_user_id = get_jwt_identity()
+    job = ReportJob.query.filter_by(id=job_id, vendor_id=current_user_id).first()
+    if not job:
+        return jsonify({"msg": "Report not found"}), 404
+    if job.status != ReportJob.DONE:
+        return _job_response(job, 409)
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({"msg": "Report file has expired. Please generate it again."}), 410
+
+    return send_file(
+        job.file_path,
+        as_attachment=True,
+        download_name=f"Sales_Report_{job.created_at.date()}.pdf",
+        mimetype='application/pdf'
+    )
+
 @vendor_bp.route('/reports/export-pdf', methods=['GET'])
 @jwt_required()
 def export_vendor_pdf():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    sales = Sale.query.join(SaleItem).join(Product)\
-        .filter(Product.vendor_id == current_user_id, Sale.status == 'COMPLETED')\
-        .order_by(Sale.created_at.desc()).all()
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    elements.append(Paragraph(f"Sales Report: {user.business_name or user.name}", styles['Title']))
-    elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
-    elements.append(Spacer(1, 20))
-
-    data = [['Date', 'Sale ID', 'Method', 'Total (KES)']]
-    total_revenue = 0.0
-
-    for s in sales:
-        data.append([
-            s.created_at.strftime('%Y-%m-%d'),
-            f"#{s.id}",
-            s.payment_method,
-            f"{s.total_amount:,.2f}"
-        ])
-        total_revenue += s.total_amount
-
-    data.append(['', '', 'GRAND TOTAL:', f"{total_revenue:,.2f}"])
-
-    table = Table(data, colWidths=[100, 80, 100, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
+    """
+    Kept for older clients: queues a report job and waits briefly for it.
+    Small reports come back as the PDF as before; larger ones return 202
+    with the job so the client can poll instead of holding this worker.
+    """
+    user = get_current_user()
+    job = ReportService.enqueue(user.id, user.id)
+    db.session.commit()
+
+    job = get_report_runner().run_and_wait(job.id, current_app.config.get('REPORT_SYNC_WAIT_SECONDS', 10))
+    if job.status != ReportJob.DONE:
+        return _job_response(job, 500 if job.status == ReportJob.FAILED else 202)
+
     return send_file(
-        buffer, 
-        as_attachment=True, 
-        download_name=f"Sales_Report_{datetime.now().date()}.pdf", 
+        job.file_path,
+        as_attachment=True,
+        download_name=f"Sales_Report_{datetime.now().date()}.pdf",
         mimetype='application/pdf'
     )
 
 @vendor_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_current_user()
     if not user:
         return jsonify({"msg": "User not found"}), 404
         
@@ -284,8 +290,7 @@ def get_profile():
 @jwt_required()
 def update_profile():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         data = request.get_json()
 
         if 'business_name' in data: user.business_name = data['business_name']
@@ -3,24 +3,11 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.extensions import db
 from app.models.wallet import Wallet, Withdrawal, Settlement
 from app.services.daraja_service import MpesaService
-import functools
+from app.utils.decorators import role_required
 from datetime import datetime
 
 wallet_bp = Blueprint("wallet", __name__)
 
-def role_required(role):
-    def decorator(fn):
-        @functools.wraps(fn)
-        def wrapper(*args, **kwargs):
-            from app.models.user import User
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            if not user or user.role.upper() != role.upper():
-                return jsonify({"msg": "Unauthorized. Vendor access only."}), 403
-            return fn(*args, **kwargs)
-        return wrapper
-    return decorator
-
 @wallet_bp.route("/", methods=["GET"])
 @jwt_required()
 @role_required("VENDOR")
@@ -0,0 +1,182 @@
+import json
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models.mpesa_callback import MpesaCallback
+from app.models.transaction import SaleItem, MpesaPayment
+from app.models.user import User
+from app.models.wallet import Settlement
+from app.services.rollup_service import RollupService
+from app.services.wallet_service import WalletService
+from app.services.stk_dispatcher import StkDispatcher
+from app.utils.pubsub import publish_payment_status
+
+VENDOR_SHARE = 0.90
+
+
+class MpesaCallbackService:
+    """
+    Single ingestion path for STK callbacks, shared by both callback URLs.
+    The raw payload is stored under its CheckoutRequestID in the same
+    transaction as the sale transition and wallet credit, so a delivery is
+    applied exactly once: replays of an applied callback return at once,
+    and a failed delivery rolls back completely for Safaricom to retry. A
+    callback with no MpesaPayment yet is kept unapplied until the
+    dispatcher records the payment.
+    """
+
+    @staticmethod
+    def ingest(data):
+        """Returns (body, status_code) to acknowledge Safaricom with."""
+        stk_callback = (data or {}).get('Body', {}).get('stkCallback', {})
+        checkout_id = stk_callback.get('CheckoutRequestID')
+        if not checkout_id:
+            return {"ResultCode": 0, "ResultDesc": "Ignored"}, 200
+
+        stored = db.session.get(MpesaCallback, checkout_id)
+        if stored is not None and stored.applied_at is not None:
+            return {"ResultCode": 0, "ResultDesc": "Duplicate"}, 200
+
+        if stored is None:
+            try:
+                db.session.add(MpesaCallback(
+                    checkout_request_id=checkout_id,
+                    result_code=stk_callback.get('ResultCode'),
+                    payload=json.dumps(data)
+                ))
+                # A concurrent delivery of the same callback blocks here until the
+                # first one commits, then fails the primary key
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                return {"ResultCode": 0, "ResultDesc": "Duplicate"}, 200
+
+        try:
+            applied = MpesaCallbackService.apply_once(checkout_id, stk_callback)
+            if applied is False:
+                db.session.rollback()
+                return {"ResultCode": 0, "ResultDesc": "Duplicate"}, 200
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Callback Error: {e}")
+            return {"ResultCode": 1, "ResultDesc": "Internal Error"}, 500
+
+        if applied is None:
+            # Stored; applied by the dispatcher once it records the payment
+            return {"ResultCode": 0, "ResultDesc": "Accepted"}, 200
+
+        publish_payment_status(checkout_id, StkDispatcher.handle_for_checkout(checkout_id))
+        return {"ResultCode": 0, "ResultDesc": "Success"}, 200
+
+    @staticmethod
+    def apply_once(checkout_id, stk_callback):
+        """
+        Applies the stored callback and marks it applied with a guarded
+        UPDATE, so of two concurrent deliveries only one commits. Returns
+        True when applied, None when no payment matches yet (nothing
+        changed), False when another delivery got there first (the caller
+        rolls back). Does not commit.
+        """
+        if not MpesaCallbackService.apply(stk_callback):
+            return None
+        claimed = db.session.execute(
+            update(MpesaCallback)
+            .where(MpesaCallback.checkout_request_id == checkout_id, MpesaCallback.applied_at.is_(None))
+            .values(applied_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        return claimed == 1
+
+    @staticmethod
+    def apply_stored(checkout_id):
+        """Applies a callback that arrived before its MpesaPayment existed. True if applied."""
+        stored = db.session.get(MpesaCallback, checkout_id)
+        if stored is None or stored.applied_at is not None:
+            return False
+
+        stk_callback = json.loads(stored.payload).get('Body', {}).get('stkCallback', {})
+        try:
+            applied = MpesaCallbackService.apply_once(checkout_id, stk_callback)
+            if not applied:
+                db.session.rollback()
+                return False
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        publish_payment_status(checkout_id, StkDispatcher.handle_for_checkout(checkout_id))
+        return True
+
+    @staticmethod
+    def apply_pending():
+        """Retries every stored callback not applied yet. Returns how many were applied."""
+        checkout_ids = [row.checkout_request_id for row in db.session.query(MpesaCallback.checkout_request_id)
+                        .filter(MpesaCallback.applied_at.is_(None)).all()]
+        return sum(1 for checkout_id in checkout_ids if MpesaCallbackService.apply_stored(checkout_id))
+
+    @staticmethod
+    def apply(stk_callback):
+        """Moves the payment and its sale to their final state. Does not commit."""
+        checkout_id = stk_callback.get('CheckoutRequestID')
+        result_code = stk_callback.get('ResultCode')
+
+        payment = MpesaPayment.query.filter_by(checkout_request_id=checkout_id).first()
+        if not payment and StkDispatcher.adopt_unknown(stk_callback):
+            payment = MpesaPayment.query.filter_by(checkout_request_id=checkout_id).first()
+        if not payment:
+            return False
+
+        payment.result_code = result_code
+        payment.result_desc = stk_callback.get('ResultDesc') or ("Success" if result_code == 0 else "Failed")
+        sale = payment.parent_sale
+
+        if result_code != 0:
+            if sale and sale.status != 'COMPLETED':
+                sale.status = 'FAILED'
+            return True
+
+        metadata = stk_callback.get('CallbackMetadata', {}).get('Item', [])
+        for item in metadata:
+            if item.get('Name') == 'MpesaReceiptNumber':
+                payment.mpesa_receipt_number = item.get('Value')
+
+        if sale and sale.status != 'COMPLETED':
+            sale.status = 'COMPLETED'
+            RollupService.record_sale(sale)
+            MpesaCallbackService.settle(sale, payment.mpesa_receipt_number)
+        return True
+
+    @staticmethod
+    def vendor_for_sale(sale):
+        # Lines carry the vendor stamped at checkout; no join to products
+        vendor_id = db.session.query(SaleItem.vendor_id)\
+            .filter(SaleItem.sale_id == sale.id)\
+            .order_by(SaleItem.id).limit(1).scalar()
+        if vendor_id:
+            return vendor_id
+        cashier = db.session.get(User, sale.cashier_id) if sale.cashier_id else None
+        return RollupService.vendor_for_cashier(cashier) or None
+
+    @staticmethod
+    def settle(sale, receipt_number=None):
+        """Credits the vendor's share of a completed sale, inside the caller's transaction."""
+        vendor_id = MpesaCallbackService.vendor_for_sale(sale)
+        if not vendor_id:
+            return None
+
+        net_amount = float(sale.total_amount) * VENDOR_SHARE
+        settlement = Settlement(
+            vendor_id=vendor_id,
+            sale_id=sale.id,
+            amount=net_amount,
+            status='completed',
+            mpesa_receipt=receipt_number
+        )
+        db.session.add(settlement)
+        db.session.flush()
+        WalletService.add_funds(vendor_id=vendor_id, amount=net_amount, commit=False, entry_type='SALE',
+                                settlement_id=settlement.id, description=f"M-Pesa sale #{sale.id}")
+        return settlement
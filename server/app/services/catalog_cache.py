@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from app.extensions import db
+from app.models.catalog import CatalogVersion, ProductTombstone
+from app.models.product import Product
+
+# Fields a cached record carries. Stock is deliberately absent: it changes on
+# every sale and stays authoritative in SQL.
+ITEM_COLUMNS = (
+    Product.id, Product.vendor_id, Product.name, Product.price,
+    Product.description, Product.category
+)
+
+
+class CatalogItem:
+    __slots__ = ('id', 'vendor_id', 'name', 'price', 'description', 'category')
+
+    def __init__(self, id, vendor_id, name, price, description=None, category=None):
+        self.id = id
+        self.vendor_id = vendor_id
+        self.name = name
+        self.price = price
+        self.description = description
+        self.category = category
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def to_tuple(self):
+        return (self.id, self.vendor_id, self.name, self.price, self.description, self.category)
+
+
+class CatalogSnapshot:
+    """A vendor's records as of catalog `version`. Treated as immutable once stored."""
+    __slots__ = ('version', 'items')
+
+    def __init__(self, version, items):
+        self.version = version
+        self.items = items
+
+    def replace(self, upserts=(), removals=(), version=None):
+        items = dict(self.items)
+        for item in upserts:
+            items[item.id] = item
+        for product_id in removals:
+            items.pop(product_id, None)
+        return CatalogSnapshot(self.version if version is None else version, items)
+
+
+class MemoryCatalogStore:
+    """Bounded per-process LRU of vendor snapshots; entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, vendor_id):
+        with self._lock:
+            entry = self._items.get(vendor_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                del self._items[vendor_id]
+                return None
+            self._items.move_to_end(vendor_id)
+            return snapshot
+
+    def set(self, vendor_id, snapshot):
+        with self._lock:
+            self._items[vendor_id] = (time.monotonic() + self.ttl, snapshot)
+            self._items.move_to_end(vendor_id)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, vendor_id):
+        with self._lock:
+            self._items.pop(vendor_id, None)
+
+
+class RedisCatalogStore:
+    """Snapshots shared by every worker through Redis, so write-through updates are seen everywhere."""
+
+    def __init__(self, client, ttl=300, prefix='radapos:catalog:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, vendor_id):
+        raw = self.client.get(f"{self.prefix}{vendor_id}")
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CatalogSnapshot(data['version'], {row[0]: CatalogItem(*row) for row in data['items']})
+
+    def set(self, vendor_id, snapshot):
+        payload = json.dumps({
+            "version": snapshot.version,
+            "items": [item.to_tuple() for item in snapshot.items.values()]
+        })
+        self.client.setex(f"{self.prefix}{vendor_id}", self.ttl, payload)
+
+    def delete(self, vendor_id):
+        self.client.delete(f"{self.prefix}{vendor_id}")
+
+
+class CatalogCache:
+    """
+    Name/price/category records per vendor for the product grid. Checkout
+    never prices from here; it reads the locked product rows.
+
+    Every read is checked against the catalog version: snapshot(vendor_id,
+    version) replays only the products and tombstones newer than the cached
+    copy. Writers in this app also update the cache after they commit
+    (put/remove) or drop a vendor outright (invalidate), but SQL stays the
+    authority: put() also winds the snapshot back to just before the product's
+    catalog_version, so the next versioned read re-reads it. A put() lost to
+    a concurrent load(), or one landing after a newer edit from another
+    worker, is corrected on that read.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    # Reads
+    @staticmethod
+    def current_version(vendor_id):
+        return db.session.query(CatalogVersion.version).filter_by(vendor_id=vendor_id).scalar() or 0
+
+    def load(self, vendor_id):
+        # Version first, rows second: anything committed in between is replayed again later
+        version = self.current_version(vendor_id)
+        rows = db.session.query(*ITEM_COLUMNS).filter(Product.vendor_id == vendor_id).all()
+        snapshot = CatalogSnapshot(version, {row.id: CatalogItem.from_row(row) for row in rows})
+        self.store.set(vendor_id, snapshot)
+        return snapshot
+
+    def refresh(self, vendor_id, snapshot, version):
+        changed = db.session.query(*ITEM_COLUMNS).filter(
+            Product.vendor_id == vendor_id, Product.catalog_version > snapshot.version
+        ).all()
+        changed_ids = {row.id for row in changed}
+        deleted = [pid for (pid,) in db.session.query(ProductTombstone.product_id).filter(
+            ProductTombstone.vendor_id == vendor_id, ProductTombstone.version > snapshot.version
+        ).all() if pid not in changed_ids]
+
+        snapshot = snapshot.replace([CatalogItem.from_row(row) for row in changed], deleted, version)
+        self.store.set(vendor_id, snapshot)
+        return snapshot
+
+    def snapshot(self, vendor_id, version):
+        """
+        The vendor's records as of `version` (read from catalog_versions by
+        the caller). A cached copy that is current costs no SQL; an older one
+        is brought forward with a delta query first.
+        """
+        snapshot = self.store.get(vendor_id)
+        if snapshot is None:
+            return self.load(vendor_id)
+        if version > snapshot.version:
+            return self.refresh(vendor_id, snapshot, version)
+        return snapshot
+
+    # Write-through, called after the writer commits
+    def put(self, product):
+        snapshot = self.store.get(product.vendor_id)
+        if snapshot is not None:
+            item = CatalogItem(product.id, product.vendor_id, product.name, product.price,
+                               product.description, product.category)
+            version = min(snapshot.version, product.catalog_version - 1)
+            self.store.set(product.vendor_id, snapshot.replace([item], version=version))
+
+    def remove(self, vendor_id, product_id):
+        snapshot = self.store.get(vendor_id)
+        if snapshot is not None:
+            self.store.set(vendor_id, snapshot.replace(removals=[product_id]))
+
+    def invalidate(self, vendor_id):
+        self.store.delete(vendor_id)
+
+
+_cache_lock = threading.Lock()
+
+
+def make_store(config):
+    url = config.get('CATALOG_CACHE_URL')
+    ttl = config.get('CATALOG_CACHE_TTL', 300)
+    if url:
+        import redis
+        return RedisCatalogStore(redis.Redis.from_url(url), ttl=ttl)
+    return MemoryCatalogStore(maxsize=config.get('CATALOG_CACHE_SIZE', 256), ttl=ttl)
+
+
+def get_catalog_cache(app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('catalog_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = app.extensions.get('catalog_cache')
+            if cache is None:
+                cache = CatalogCache(make_store(app.config))
+                app.extensions['catalog_cache'] = cache
+    return cache
@@ -0,0 +1,141 @@
+from datetime import datetime
+from sqlalchemy import update
+from app.extensions import db
+from app.models.catalog import CatalogVersion, ProductTombstone
+from app.models.product import Product
+from app.utils.upsert import upsert_increment, upsert_rows
+from app.services.catalog_cache import CatalogCache, get_catalog_cache
+
+# Fields sent to the POS product grid, read as plain columns (no ORM objects)
+CATALOG_COLUMNS = (
+    Product.id, Product.name, Product.price, Product.stock_quantity,
+    Product.description, Product.vendor_id, Product.category
+)
+
+
+class CatalogService:
+    """
+    Versioned vendor catalogs. Writers call bump() inside their transaction
+    and stamp the returned version on whatever they changed; the counter row
+    is locked until commit, so versions become visible in order and a till
+    holding version N has seen every change up to N. Sales only move stock,
+    and stamp it after they commit (touch()) rather than hold the row.
+    """
+
+    @staticmethod
+    def bump(vendor_id):
+        """Increments the vendor's catalog version and returns the new value. Caller commits."""
+        upsert_increment(CatalogVersion, {"vendor_id": vendor_id, "version": 1}, ['vendor_id'], ['version'])
+        return db.session.query(CatalogVersion.version).filter_by(vendor_id=vendor_id).scalar()
+
+    @staticmethod
+    def touch(vendor_id, product_ids):
+        """
+        Stamps products whose stock changed with a fresh version in its own
+        short transaction. Checkout calls this after its commit, so sales
+        never queue on the vendor's counter row; a till may see the stock
+        change one sync late, and never before the sale is committed.
+        """
+        try:
+            version = CatalogService.bump(vendor_id)
+            db.session.execute(
+                update(Product)
+                .where(Product.vendor_id == vendor_id, Product.id.in_(sorted(product_ids)))
+                .values(catalog_version=version)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Catalog Touch Error: {e}")
+
+    @staticmethod
+    def current_version(vendor_id):
+        return CatalogCache.current_version(vendor_id)
+
+    @staticmethod
+    def record_deletes(vendor_id, product_ids):
+        """Tombstones deleted products under a fresh version. Caller commits."""
+        if not product_ids:
+            return
+        version = CatalogService.bump(vendor_id)
+        now = datetime.utcnow()
+        upsert_rows(ProductTombstone, [
+            {"product_id": pid, "vendor_id": vendor_id, "version": version, "deleted_at": now}
+            for pid in product_ids
+        ], ['product_id'], ['vendor_id', 'version', 'deleted_at'])
+
+    @staticmethod
+    def etag(vendor_id, version):
+        return f"catalog-{vendor_id}-{version}"
+
+    @staticmethod
+    def serialize(rows):
+        return [{
+            'id': row.id,
+            'name': row.name,
+            'price': row.price,
+            'stock_quantity': row.stock_quantity,
+            'description': row.description,
+            'vendor_id': row.vendor_id,
+            'category': row.category
+        } for row in rows]
+
+    @staticmethod
+    def products(vendor_id=None, since=None):
+        query = db.session.query(*CATALOG_COLUMNS)
+        if vendor_id is not None:
+            query = query.filter(Product.vendor_id == vendor_id)
+        if since is not None:
+            query = query.filter(Product.catalog_version > since)
+        return CatalogService.serialize(query.order_by(Product.id).all())
+
+    @staticmethod
+    def cached_products(vendor_id, version):
+        """
+        The full grid for one vendor: records from the catalog cache, brought
+        up to `version`, joined with stock read fresh from the covering
+        (vendor_id, stock_quantity) index.
+        """
+        items = get_catalog_cache().snapshot(vendor_id, version).items
+        stock = db.session.query(Product.id, Product.stock_quantity)\
+            .filter(Product.vendor_id == vendor_id).order_by(Product.id).all()
+
+        output = []
+        for product_id, stock_quantity in stock:
+            item = items.get(product_id)
+            if item is None:
+                # Committed after `version` was read; it arrives with the next version
+                continue
+            output.append({
+                'id': item.id,
+                'name': item.name,
+                'price': item.price,
+                'stock_quantity': stock_quantity,
+                'description': item.description,
+                'vendor_id': item.vendor_id,
+                'category': item.category
+            })
+        return output
+
+    @staticmethod
+    def changes_since(vendor_id, since):
+        """
+        Products changed and ids deleted after `since`. A `since` ahead of the
+        server (restored database, another tenant's cache) gets the full
+        catalog with reset=True so the till replaces its copy.
+        """
+        # Version is read first: a write landing mid-request is resent next time, never skipped
+        version = CatalogService.current_version(vendor_id)
+        if since > version:
+            return {"version": version, "since": since, "reset": True,
+                    "products": CatalogService.products(vendor_id), "deleted": []}
+
+        products = CatalogService.products(vendor_id, since=since)
+        live_ids = {p['id'] for p in products}
+        # SQLite can hand a deleted max id to the next insert; the live row wins
+        deleted = [pid for (pid,) in db.session.query(ProductTombstone.product_id).filter(
+            ProductTombstone.vendor_id == vendor_id, ProductTombstone.version > since
+        ).all() if pid not in live_ids]
+        return {"version": version, "since": since, "reset": False,
+                "products": products, "deleted": deleted}
@@ -0,0 +1,376 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import case, insert, update
+from app.extensions import db
+from app.models.product import Product
+from app.models.transaction import Sale, SaleItem
+from app.models.notification import Notification
+from app.models.discount import DiscountCode
+from app.models.user import User
+from app.services.rollup_service import RollupService
+from app.services.catalog_service import CatalogService
+from app.utils.auth import tenant_id_for
+from app.utils.upsert import insert_ignore
+
+
+class CheckoutError(Exception):
+    """Raised for cart problems the cashier can fix; maps to a 400 response."""
+    pass
+
+
+class CheckoutService:
+    LOW_STOCK_THRESHOLD = 5
+
+    @staticmethod
+    def aggregate_cart(cart_items):
+        """Collapses cart lines into {product_id: quantity}, keeping cart order."""
+        quantities = OrderedDict()
+        for item in cart_items:
+            try:
+                product_id = int(item['id'])
+                qty = int(item['quantity'])
+            except (KeyError, TypeError, ValueError):
+                raise CheckoutError("Invalid cart item")
+            if qty <= 0:
+                raise CheckoutError(f"Invalid quantity for product ID {product_id}")
+            quantities[product_id] = quantities.get(product_id, 0) + qty
+        return quantities
+
+    @staticmethod
+    def lock_products(product_ids):
+        """
+        Reads vendor, name, price and stock for every cart product in one IN
+        query over narrow columns. On Postgres the rows are locked FOR UPDATE
+        in id order so concurrent tills queue instead of deadlocking, and a
+        price edit cannot land between pricing and commit; SQLite ignores the
+        lock and relies on the guarded UPDATE.
+        """
+        rows = db.session.query(Product.id, Product.vendor_id, Product.name, Product.price, Product.stock_quantity)\
+            .filter(Product.id.in_(product_ids))\
+            .order_by(Product.id).with_for_update().all()
+        return {row.id: row for row in rows}
+
+    @staticmethod
+    def price_cart(quantities, products, available=None):
+        """
+        Prices the cart from the rows locked above, never from the catalog
+        cache, so every worker charges the committed price. Stock is checked
+        against the same rows, or `available` ({product_id: stock}) when
+        several carts share them.
+        """
+        calculated_total = 0
+        valid_items = []
+
+        for product_id, qty in quantities.items():
+            item = products.get(product_id)
+            if not item:
+                raise CheckoutError(f"Product ID {product_id} not found")
+
+            in_stock = available[product_id] if available is not None else item.stock_quantity
+            if in_stock < qty:
+                raise CheckoutError(f"Insufficient stock for {item.name}")
+
+            calculated_total += item.price * qty
+            valid_items.append({
+                "product": item,
+                "quantity": qty,
+                "price": item.price
+            })
+
+        return calculated_total, valid_items
+
+    @staticmethod
+    def decrement_stock(quantities, products):
+        """
+        Applies every decrement in a single guarded UPDATE so stock can never
+        go negative, even if another till committed between our read and this
+        write. The catalog version is not bumped here: that would hold the
+        vendor's counter row for the whole checkout. The changed products are
+        noted on the session for publish_stock() to stamp after commit. Stock
+        is not held in the catalog cache, so nothing there needs invalidating.
+        Returns {product_id: new_stock}.
+        """
+        qty_case = case(dict(quantities), value=Product.id)
+        stmt = update(Product)\
+            .where(Product.id.in_(list(quantities)), Product.stock_quantity >= qty_case)\
+            .values(stock_quantity=Product.stock_quantity - qty_case)\
+            .execution_options(synchronize_session=False)
+
+        if db.session.get_bind().dialect.update_returning:
+            rows = db.session.execute(stmt.returning(Product.id, Product.stock_quantity)).all()
+            new_stock = {row.id: row.stock_quantity for row in rows}
+            updated = len(rows)
+        else:
+            updated = db.session.execute(stmt).rowcount
+            new_stock = {pid: products[pid].stock_quantity - qty for pid, qty in quantities.items()}
+
+        if updated != len(quantities):
+            raise CheckoutError("Stock changed during checkout. Please retry.")
+
+        changed = db.session.info.setdefault('stock_changed', {})
+        for product_id in quantities:
+            changed.setdefault(products[product_id].vendor_id, set()).add(product_id)
+        return new_stock
+
+    @staticmethod
+    def publish_stock():
+        """
+        Call after committing a checkout: bumps each vendor's catalog version
+        in a short transaction of its own and stamps the products whose stock
+        moved, so tills pick the change up on their next delta sync.
+        """
+        changed = db.session.info.pop('stock_changed', {})
+        for vendor_id in sorted(changed):
+            CatalogService.touch(vendor_id, changed[vendor_id])
+
+    @staticmethod
+    def raise_low_stock_alerts(items, new_stock):
+        """One deduplicated insert for every product that crossed the threshold."""
+        rows = []
+        for product_id, stock in new_stock.items():
+            if stock > CheckoutService.LOW_STOCK_THRESHOLD:
+                continue
+            item = items[product_id]
+            rows.append({
+                "user_id": item.vendor_id,
+                "message": f"Low Stock Alert: {item.name} is down to {stock} items.",
+                "type": 'warning',
+                "dedup_key": f"low_stock:{product_id}:{stock}"
+            })
+        insert_ignore(Notification, rows, ['user_id', 'dedup_key'])
+
+    @staticmethod
+    def resolve_discount(cashier_id, coupon_code, calculated_total):
+        if not coupon_code:
+            return 0.0, None
+
+        # Already in the identity map from the request's JWT user lookup (keyed by int id)
+        vendor_id = tenant_id_for(db.session.get(User, int(cashier_id)))
+
+        coupon = DiscountCode.query.filter_by(code=coupon_code, vendor_id=vendor_id).first()
+
+        if coupon and coupon.is_valid():
+            return (calculated_total * coupon.percentage) / 100, coupon.code
+        return 0.0, None
+
+    @staticmethod
+    def parse_client_time(value):
+        """A till's ISO-8601 sale time as naive UTC; missing or future times become now."""
+        now = datetime.utcnow()
+        if not value:
+            return now
+        try:
+            moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            raise CheckoutError(f"Invalid created_at '{value}'")
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        # Till clocks drift; never book a sale in the future
+        return min(moment, now)
+
+    @staticmethod
+    def attribution(cashier_id, product_vendor_ids):
+        """
+        The cashier's vendor and {vendor_id: event_id} for it and every
+        vendor in the cart, read once so sales and lines are stamped with
+        the event current at checkout rather than resolved again at report time.
+        """
+        vendor_id = RollupService.vendor_for_cashier(db.session.get(User, int(cashier_id))) or None
+        events = RollupService.current_event_ids(set(product_vendor_ids) | {vendor_id})
+        return vendor_id, events
+
+    @staticmethod
+    def build_sale(cashier_id, data, quantities, products, available=None):
+        """
+        Prices one cart, applies its coupon and splits the payment. Returns an
+        unsaved Sale and its priced lines; raises CheckoutError for bad carts.
+        """
+        payment_method = data.get('payment_method', 'CASH').upper()
+
+        try:
+            req_cash = float(data.get('amount_cash', 0))
+            req_mpesa = float(data.get('amount_mpesa', 0))
+        except (TypeError, ValueError):
+            raise CheckoutError("Invalid split amounts")
+
+        calculated_total, valid_items = CheckoutService.price_cart(quantities, products, available)
+
+        discount_amount, applied_coupon = CheckoutService.resolve_discount(
+            cashier_id, data.get('coupon_code'), calculated_total
+        )
+        final_total = calculated_total - discount_amount
+
+        final_cash = 0.0
+        final_mpesa = 0.0
+
+        if payment_method == 'CASH':
+            final_cash = final_total
+        elif payment_method == 'MPESA':
+            final_mpesa = final_total
+        elif payment_method == 'SPLIT':
+            if abs((req_cash + req_mpesa) - final_total) > 1.0:
+                raise CheckoutError(f"Split amounts ({req_cash} + {req_mpesa}) do not match Total ({final_total})")
+            final_cash = req_cash
+            final_mpesa = req_mpesa
+
+        sale = Sale(
+            total_amount=final_total,
+            discount_amount=discount_amount,
+            coupon_code=applied_coupon,
+            payment_method=payment_method,
+            amount_cash=final_cash,
+            amount_mpesa=final_mpesa,
+            status='PENDING' if (payment_method == 'MPESA' or payment_method == 'SPLIT') else 'COMPLETED',
+            cashier_id=cashier_id,
+            client_uuid=data.get('client_uuid'),
+            created_at=datetime.utcnow()
+        )
+        return sale, valid_items
+
+    @staticmethod
+    def insert_items(priced_sales, events):
+        """
+        One executemany insert for the lines of every (sale, valid_items)
+        pair; sales must be flushed. `events` is {vendor_id: event_id} from attribution().
+        """
+        db.session.execute(insert(SaleItem), [
+            {
+                "sale_id": sale.id,
+                "product_id": v_item['product'].id,
+                "vendor_id": v_item['product'].vendor_id,
+                "event_id": events.get(v_item['product'].vendor_id),
+                "product_name": v_item['product'].name,
+                "quantity": v_item['quantity'],
+                "price": v_item['price']
+            }
+            for sale, valid_items in priced_sales
+            for v_item in valid_items
+        ])
+
+    @staticmethod
+    def create_sale(cashier_id, data):
+        """
+        Builds the sale, its items, the stock decrement and low stock alerts
+        in the current session. The caller owns the commit/rollback. A retry
+        carrying an already-used `client_uuid` returns the original sale.
+        """
+        cart_items = data.get('items', [])
+
+        if not cart_items:
+            raise CheckoutError("Cart is empty")
+
+        client_uuid = data.get('client_uuid')
+        if client_uuid:
+            existing = Sale.query.filter_by(client_uuid=str(client_uuid)).first()
+            if existing:
+                return existing
+
+        quantities = CheckoutService.aggregate_cart(cart_items)
+        products = CheckoutService.lock_products(list(quantities))
+        new_sale, valid_items = CheckoutService.build_sale(cashier_id, data, quantities, products)
+        vendor_id, events = CheckoutService.attribution(cashier_id, {row.vendor_id for row in products.values()})
+        new_sale.vendor_id = vendor_id
+        new_sale.event_id = events.get(vendor_id)
+
+        db.session.add(new_sale)
+        db.session.flush()
+        CheckoutService.insert_items([(new_sale, valid_items)], events)
+
+        new_stock = CheckoutService.decrement_stock(quantities, products)
+        CheckoutService.raise_low_stock_alerts(
+            {v_item['product'].id: v_item['product'] for v_item in valid_items}, new_stock
+        )
+
+        if new_sale.status == 'COMPLETED':
+            RollupService.record_sale(new_sale)
+
+        return new_sale
+
+    @staticmethod
+    def create_sales_batch(cashier_id, entries):
+        """
+        Applies sales a till queued while offline. Every entry needs a
+        `client_uuid`; ones already stored are reported as duplicates rather
+        than booked twice. Products for the whole batch are locked in one
+        query, carts are checked in sale-time order against a running stock
+        count, and the accepted ones share one sale insert, one items insert
+        and one guarded stock UPDATE. Returns one result per entry, in input
+        order. The caller owns the commit/rollback.
+        """
+        results = [None] * len(entries)
+        pending = []
+        seen = set()
+
+        for index, entry in enumerate(entries):
+            client_uuid = entry.get('client_uuid') if isinstance(entry, dict) else None
+            result = results[index] = {"client_uuid": client_uuid}
+            try:
+                if not client_uuid or not isinstance(client_uuid, str) or len(client_uuid) > 64:
+                    raise CheckoutError("client_uuid is required (string, at most 64 characters)")
+                if client_uuid in seen:
+                    raise CheckoutError("Duplicate client_uuid in this batch")
+                seen.add(client_uuid)
+                if not entry.get('items'):
+                    raise CheckoutError("Cart is empty")
+                quantities = CheckoutService.aggregate_cart(entry['items'])
+                created_at = CheckoutService.parse_client_time(entry.get('created_at'))
+            except CheckoutError as e:
+                result.update(status='rejected', msg=str(e))
+                continue
+            pending.append((created_at, index, entry, quantities))
+
+        existing = {}
+        if pending:
+            existing = dict(db.session.query(Sale.client_uuid, Sale.id)
+                            .filter(Sale.client_uuid.in_([p[2]['client_uuid'] for p in pending])).all())
+
+        fresh = []
+        for created_at, index, entry, quantities in pending:
+            if entry['client_uuid'] in existing:
+                results[index].update(status='duplicate', sale_id=existing[entry['client_uuid']])
+            else:
+                fresh.append((created_at, index, entry, quantities))
+        fresh.sort(key=lambda p: (p[0], p[1]))
+
+        product_ids = sorted({pid for _, _, _, quantities in fresh for pid in quantities})
+        products = CheckoutService.lock_products(product_ids) if product_ids else {}
+        available = {pid: row.stock_quantity for pid, row in products.items()}
+
+        accepted = []
+        for created_at, index, entry, quantities in fresh:
+            try:
+                sale, valid_items = CheckoutService.build_sale(cashier_id, entry, quantities, products, available)
+            except CheckoutError as e:
+                results[index].update(status='rejected', msg=str(e))
+                continue
+            for product_id, qty in quantities.items():
+                available[product_id] -= qty
+            sale.created_at = created_at
+            accepted.append((index, sale, valid_items, quantities))
+
+        if not accepted:
+            return results
+
+        vendor_id, events = CheckoutService.attribution(cashier_id, {row.vendor_id for row in products.values()})
+        for _, sale, _, _ in accepted:
+            sale.vendor_id = vendor_id
+            sale.event_id = events.get(vendor_id)
+
+        db.session.add_all([sale for _, sale, _, _ in accepted])
+        db.session.flush()
+        CheckoutService.insert_items([(sale, valid_items) for _, sale, valid_items, _ in accepted], events)
+
+        totals = OrderedDict()
+        items = {}
+        for _, _, valid_items, quantities in accepted:
+            for product_id, qty in quantities.items():
+                totals[product_id] = totals.get(product_id, 0) + qty
+            items.update((v_item['product'].id, v_item['product']) for v_item in valid_items)
+
+        new_stock = CheckoutService.decrement_stock(totals, products)
+        CheckoutService.raise_low_stock_alerts(items, new_stock)
+        RollupService.record_sales([sale for _, sale, _, _ in accepted if sale.status == 'COMPLETED'])
+
+        for index, sale, _, _ in accepted:
+            results[index].update(status='created', sale_id=sale.id, total=sale.total_amount, sale_status=sale.status)
+        return results
@@ -0,0 +1,163 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+from flask import current_app
+
+DEFAULT_BASE_URL = "https://sandbox.safaricom.co.ke"
+
+
+class DarajaAuthError(Exception):
+    pass
+
+
+def request_never_sent(error):
+    """
+    True only for failures raised before a POST reached Daraja: no token,
+    a connect timeout, or a connection that could not be opened (refused,
+    DNS). A connection reset or closed after the body went out is also a
+    requests.ConnectionError, but Daraja may have acted on it, so it is False.
+    """
+    if isinstance(error, (DarajaAuthError, requests.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        cause = error.args[0] if error.args else None
+        # requests wraps urllib3's MaxRetryError, whose reason is the real cause
+        cause = getattr(cause, 'reason', cause)
+        return isinstance(cause, NewConnectionError)
+    return False
+
+
+class DarajaClient:
+    """
+    Shared Safaricom Daraja client. Keeps one pooled keep-alive session per
+    process and caches the OAuth token until shortly before it expires, so an
+    STK push costs a single HTTPS request on a warm connection.
+    """
+    TOKEN_REFRESH_MARGIN = 60
+    TOKEN_RETRIES = 2
+    TOKEN_BACKOFF = 0.3
+
+    def __init__(self, consumer_key, consumer_secret, base_url=DEFAULT_BASE_URL,
+                 timeout=(3.05, 15), pool_size=10):
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        # Only idempotent GETs (the token call) are retried automatically
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=self.TOKEN_RETRIES, backoff_factor=self.TOKEN_BACKOFF,
+                              allowed_methods=frozenset(['GET']), status_forcelist=(502, 503, 504),
+                              respect_retry_after_header=False)
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            consumer_key=config.get('MPESA_CONSUMER_KEY'),
+            consumer_secret=config.get('MPESA_CONSUMER_SECRET'),
+            base_url=config.get('MPESA_BASE_URL') or DEFAULT_BASE_URL,
+            timeout=(config.get('MPESA_CONNECT_TIMEOUT', 3.05), config.get('MPESA_READ_TIMEOUT', 15)),
+            pool_size=config.get('MPESA_POOL_SIZE', 10)
+        )
+
+    def max_post_seconds(self):
+        """
+        Upper bound on one post(): a token fetch with its retries and
+        backoff, the POST (whose connect, but never its read, is retried the
+        same way), then both again after a 401. Senders size their leases
+        from this so a slow call never outlives its claim.
+        """
+        connect, read = self.timeout
+        tries = self.TOKEN_RETRIES + 1
+        backoff = sum(self.TOKEN_BACKOFF * 2 ** i for i in range(self.TOKEN_RETRIES))
+        token = tries * (connect + read) + backoff
+        post = tries * connect + read + backoff
+        return 2 * (token + post)
+
+    def _token_valid(self):
+        return self._token is not None and time.monotonic() < self._expires_at
+
+    def get_access_token(self, force_refresh=False):
+        if not force_refresh and self._token_valid():
+            return self._token
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not force_refresh and self._token_valid():
+                return self._token
+
+            if not self.consumer_key or not self.consumer_secret:
+                raise DarajaAuthError("M-Pesa Consumer Key or Secret is missing in .env")
+
+            try:
+                r = self.session.get(
+                    f"{self.base_url}/oauth/v1/generate",
+                    params={"grant_type": "client_credentials"},
+                    auth=(self.consumer_key, self.consumer_secret),
+                    timeout=self.timeout
+                )
+                r.raise_for_status()
+                body = r.json()
+            except (requests.RequestException, ValueError) as e:
+                raise DarajaAuthError(f"Failed to generate M-Pesa Token: {e}")
+
+            expires_in = float(body.get('expires_in', 3599))
+            self._token = body['access_token']
+            self._expires_at = time.monotonic() + max(expires_in - self.TOKEN_REFRESH_MARGIN, 0)
+            return self._token
+
+    def invalidate_token(self):
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def post(self, path, payload):
+        """POSTs JSON with the cached bearer token, refreshing it once on a 401."""
+        response = None
+        for attempt in range(2):
+            token = self.get_access_token(force_refresh=attempt > 0)
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=self.timeout
+            )
+            if response.status_code != 401:
+                break
+            self.invalidate_token()
+        return response
+
+    def stk_push(self, payload):
+        return self.post('/mpesa/stkpush/v1/processrequest', payload)
+
+    def b2c(self, payload):
+        return self.post('/mpesa/b2c/v1/paymentrequest', payload)
+
+
+_clients_lock = threading.Lock()
+
+
+def get_daraja_client(app=None):
+    """The process-wide client for the given (or current) Flask app."""
+    app = app or current_app._get_current_object()
+    client = app.extensions.get('daraja_client')
+    if client is None:
+        with _clients_lock:
+            client = app.extensions.get('daraja_client')
+            if client is None:
+                client = DarajaClient.from_config(app.config)
+                app.extensions['daraja_client'] = client
+    return client
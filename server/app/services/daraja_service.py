@@ -1,31 +1,31 @@
 import requests
 import base64
+import uuid
 from datetime import datetime
 from flask import current_app
+from app.services.daraja_client import get_daraja_client, DarajaAuthError
 
 class MpesaService:
     @staticmethod
     def get_access_token():
-        consumer_key = current_app.config.get('MPESA_CONSUMER_KEY')
-        consumer_secret = current_app.config.get('MPESA_CONSUMER_SECRET')
-        api_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-
-        if not consumer_key or not consumer_secret:
-            raise Exception("M-Pesa Consumer Key or Secret is missing in .env")
-
         try:
-            r = requests.get(api_url, auth=(consumer_key, consumer_secret))
-            r.raise_for_status()
-            return r.json()['access_token']
-        except Exception as e:
+            return get_daraja_client().get_access_token()
+        except DarajaAuthError as e:
             print(f"❌ Token Gen Failed: {str(e)}")
             raise Exception("Failed to generate M-Pesa Token. Check credentials.")
 
+    @staticmethod
+    def format_phone(phone_number):
+        """Normalises 07.../+254... to the 2547... form Daraja expects."""
+        phone_number = str(phone_number).strip()
+        if phone_number.startswith('0'): phone_number = '254' + phone_number[1:]
+        elif phone_number.startswith('+254'): phone_number = phone_number[1:]
+        return phone_number
+
     @staticmethod
     def initiate_stk_push(phone_number, amount, account_reference="RadaPOS"):
         """Handles Customer to Business (C2B) STK Push"""
-        access_token = MpesaService.get_access_token()
-        api_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
+        MpesaService.get_access_token()
         
         business_short_code = current_app.config.get('MPESA_SHORTCODE')
         passkey = current_app.config.get('MPESA_PASSKEY')
@@ -39,8 +39,7 @@ class MpesaService:
         password = base64.b64encode(password_str.encode()).decode('utf-8')
 
         # Format Phone (Ensure 254...)
-        if phone_number.startswith('0'): phone_number = '254' + phone_number[1:]
-        elif phone_number.startswith('+254'): phone_number = phone_number[1:]
+        phone_number = MpesaService.format_phone(phone_number)
 
         payload = {
             "BusinessShortCode": business_short_code,
@@ -56,10 +55,8 @@ class MpesaService:
             "TransactionDesc": "POS Sale"
         }
 
-        headers = { "Authorization": f"Bearer {access_token}" }
-
         try:
-            response = requests.post(api_url, json=payload, headers=headers)
+            response = get_daraja_client().stk_push(payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
@@ -70,13 +67,36 @@ class MpesaService:
             raise e
 
     @staticmethod
-    def initiate_b2c(phone_number, amount, remarks="Withdrawal"):
-        """Handles Business to Customer (B2C) Payouts"""
-        access_token = MpesaService.get_access_token()
-        
-        # (Keep your B2C logic here)
-        return {
-            "ConversationID": "AG_MOCK_ID",
-            "ResponseCode": "0",
-            "ResponseDescription": "Success"
-        }
\ No newline at end of file
+    def initiate_b2c(phone_number, amount, remarks="Withdrawal", originator_id=None):
+        """
+        Handles Business to Customer (B2C) Payouts. Returns Daraja's response
+        body (ResponseCode '0' means accepted; the outcome arrives on the
+        result URL). Transport errors and 5xx responses raise, so callers can
+        tell a payout Daraja refused (a 4xx) from one whose outcome is
+        unknown. An unreadable 4xx body comes back as an errorMessage; an
+        unreadable success raises ValueError.
+        """
+        config = current_app.config
+        payload = {
+            "OriginatorConversationID": originator_id or uuid.uuid4().hex,
+            "InitiatorName": config.get('MPESA_B2C_INITIATOR'),
+            "SecurityCredential": config.get('MPESA_B2C_SECURITY_CREDENTIAL'),
+            "CommandID": config.get('MPESA_B2C_COMMAND_ID') or 'BusinessPayment',
+            "Amount": int(amount),
+            "PartyA": config.get('MPESA_B2C_SHORTCODE') or config.get('MPESA_SHORTCODE'),
+            "PartyB": MpesaService.format_phone(phone_number),
+            "Remarks": remarks,
+            "QueueTimeOutURL": config.get('MPESA_B2C_TIMEOUT_URL'),
+            "ResultURL": config.get('MPESA_B2C_RESULT_URL'),
+            "Occasion": remarks
+        }
+
+        response = get_daraja_client().b2c(payload)
+        if response.status_code >= 500:
+            raise requests.HTTPError(f"Daraja {response.status_code}", response=response)
+        try:
+            return response.json()
+        except ValueError:
+            if response.status_code < 400:
+                raise
+            return {"errorMessage": f"Daraja {response.status_code}"}
@@ -0,0 +1,134 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from app.extensions import db
+from app.models.event import Event
+from app.models.transaction import Sale, SaleItem
+from app.models.user import User
+
+
+class EventSalesService:
+    """
+    Event and vendor revenue read straight off the event_id/vendor_id stamped
+    on sales and their lines at checkout. Every query is a range scan of the
+    (event_id | vendor_id, status, created_at) indexes; nothing is resolved
+    through cashiers, products or event_vendors.
+    """
+
+    @staticmethod
+    def parse_range(args):
+        """(start, end) datetimes from ?start_date=&end_date= (YYYY-MM-DD, inclusive). Raises ValueError."""
+        bounds = []
+        for key in ('start_date', 'end_date'):
+            value = args.get(key)
+            try:
+                bounds.append(date.fromisoformat(value) if value else None)
+            except ValueError:
+                raise ValueError(f"{key} must be YYYY-MM-DD")
+        start, end = bounds
+        if start and end and start > end:
+            raise ValueError("start_date is after end_date")
+        return (datetime.combine(start, datetime.min.time()) if start else None,
+                datetime.combine(end, datetime.min.time()) + timedelta(days=1) if end else None)
+
+    @staticmethod
+    def completed(query, start=None, end=None):
+        query = query.filter(Sale.status == 'COMPLETED')
+        if start:
+            query = query.filter(Sale.created_at >= start)
+        if end:
+            query = query.filter(Sale.created_at < end)
+        return query
+
+    @staticmethod
+    def events(start=None, end=None):
+        """Revenue and sale count for every event that has sales, highest revenue first."""
+        totals = EventSalesService.completed(db.session.query(
+            Sale.event_id,
+            func.count(Sale.id).label('sale_count'),
+            func.sum(Sale.total_amount).label('revenue')
+        ).filter(Sale.event_id.isnot(None)), start, end).group_by(Sale.event_id).subquery()
+
+        rows = db.session.query(Event.id, Event.name, Event.is_active, totals.c.sale_count, totals.c.revenue)\
+            .join(totals, totals.c.event_id == Event.id)\
+            .order_by(totals.c.revenue.desc()).all()
+        return [{
+            "event_id": r.id,
+            "name": r.name,
+            "is_active": r.is_active,
+            "sale_count": r.sale_count,
+            "revenue": float(r.revenue or 0)
+        } for r in rows]
+
+    @staticmethod
+    def event_summary(event, start=None, end=None, top=10):
+        """Totals, payment split, per-vendor revenue and best-selling products for one event."""
+        def scoped(*columns):
+            return EventSalesService.completed(
+                db.session.query(*columns).filter(Sale.event_id == event.id), start, end
+            )
+
+        sale_count, revenue = scoped(func.count(Sale.id), func.sum(Sale.total_amount)).one()
+        methods = scoped(Sale.payment_method, func.count(Sale.id), func.sum(Sale.total_amount))\
+            .group_by(Sale.payment_method).all()
+
+        vendor_totals = scoped(Sale.vendor_id, func.count(Sale.id).label('sale_count'),
+                               func.sum(Sale.total_amount).label('revenue'))\
+            .group_by(Sale.vendor_id).subquery()
+        vendors = db.session.query(vendor_totals, User.business_name, User.name)\
+            .outerjoin(User, User.id == vendor_totals.c.vendor_id)\
+            .order_by(vendor_totals.c.revenue.desc()).all()
+
+        # Lines carry the event of their product's vendor, so this also counts
+        # goods sold on another vendor's till during the event
+        line_revenue = func.sum(SaleItem.quantity * SaleItem.price)
+        products = EventSalesService.completed(db.session.query(
+            SaleItem.product_id,
+            func.max(SaleItem.product_name).label('name'),
+            SaleItem.vendor_id,
+            func.sum(SaleItem.quantity).label('quantity'),
+            line_revenue.label('revenue')
+        ).join(Sale, Sale.id == SaleItem.sale_id).filter(SaleItem.event_id == event.id), start, end)\
+            .group_by(SaleItem.product_id, SaleItem.vendor_id)\
+            .order_by(line_revenue.desc()).limit(top).all()
+
+        return {
+            "event": event.to_dict(),
+            "sale_count": sale_count,
+            "revenue": float(revenue or 0),
+            "by_payment_method": [
+                {"payment_method": method, "sale_count": count, "revenue": float(total or 0)}
+                for method, count, total in methods
+            ],
+            "vendors": [{
+                "vendor_id": v.vendor_id,
+                "name": v.business_name or v.name,
+                "sale_count": v.sale_count,
+                "revenue": float(v.revenue or 0)
+            } for v in vendors],
+            "top_products": [{
+                "product_id": p.product_id,
+                "name": p.name,
+                "vendor_id": p.vendor_id,
+                "quantity": int(p.quantity or 0),
+                "revenue": float(p.revenue or 0)
+            } for p in products]
+        }
+
+    @staticmethod
+    def vendor_events(vendor_id, start=None, end=None):
+        """One vendor's revenue per event; sales made outside any event appear with event_id None."""
+        totals = EventSalesService.completed(db.session.query(
+            Sale.event_id,
+            func.count(Sale.id).label('sale_count'),
+            func.sum(Sale.total_amount).label('revenue')
+        ).filter(Sale.vendor_id == vendor_id), start, end).group_by(Sale.event_id).subquery()
+
+        rows = db.session.query(totals, Event.name)\
+            .outerjoin(Event, Event.id == totals.c.event_id)\
+            .order_by(totals.c.revenue.desc()).all()
+        return [{
+            "event_id": r.event_id,
+            "name": r.name,
+            "sale_count": r.sale_count,
+            "revenue": float(r.revenue or 0)
+        } for r in rows]
@@ -0,0 +1,117 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.models.transaction import Sale
+from app.models.user import User
+from app.models.event import Event
+
+
+class SalesExportService:
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def build_query(args, vendor_id=None, status=None):
+        """
+        Column-only sales query with the cashier name joined in. Rows are plain
+        tuples so nothing accumulates in the session identity map while a large
+        export is streaming. Raises ValueError on malformed filters.
+        """
+        cashier = aliased(User)
+        query = db.session.query(
+            Sale.id,
+            Sale.created_at,
+            Sale.payment_method,
+            Sale.total_amount,
+            Sale.amount_cash,
+            Sale.amount_mpesa,
+            Sale.status,
+            cashier.name.label('cashier_name')
+        ).outerjoin(cashier, Sale.cashier_id == cashier.id)
+
+        if vendor_id is not None:
+            query = query.filter((cashier.id == vendor_id) | (cashier.vendor_id == vendor_id))
+        if status:
+            query = query.filter(Sale.status == status)
+
+        start = args.get('start')
+        end = args.get('end')
+        try:
+            if start:
+                query = query.filter(Sale.created_at >= datetime.strptime(start, "%Y-%m-%d"))
+            if end:
+                query = query.filter(Sale.created_at < datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1))
+        except ValueError:
+            raise ValueError("Dates must be in YYYY-MM-DD format")
+
+        event_id = args.get('event_id')
+        if event_id:
+            try:
+                event = db.session.get(Event, int(event_id))
+            except (TypeError, ValueError):
+                raise ValueError("Invalid event_id")
+            if not event:
+                raise ValueError("Event not found")
+
+            vendor_ids = [v.id for v in event.vendors]
+            query = query.filter(or_(cashier.id.in_(vendor_ids), cashier.vendor_id.in_(vendor_ids)))
+            if event.starts_at:
+                query = query.filter(Sale.created_at >= event.starts_at)
+            if event.ends_at:
+                query = query.filter(Sale.created_at <= event.ends_at)
+
+        return query
+
+    @staticmethod
+    def iter_batches(query, batch_size=None):
+        """Walks the query newest-first in keyset-paginated chunks of (created_at, id)."""
+        batch_size = batch_size or SalesExportService.BATCH_SIZE
+        query = query.order_by(Sale.created_at.desc(), Sale.id.desc())
+        last = None
+
+        while True:
+            page = query
+            if last is not None:
+                page = page.filter(or_(
+                    Sale.created_at < last.created_at,
+                    and_(Sale.created_at == last.created_at, Sale.id < last.id)
+                ))
+            rows = page.limit(batch_size).all()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]
+
+    @staticmethod
+    def stream_csv(header, query, row_fn, footer_fn=None, batch_size=None):
+        """
+        Generator of CSV text chunks: the header goes out before the first
+        query runs, then one chunk per batch. `footer_fn` receives the running
+        total of `total_amount` and returns any trailing rows.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def drain():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return chunk
+
+        writer.writerow(header)
+        yield drain()
+
+        total = 0.0
+        for rows in SalesExportService.iter_batches(query, batch_size):
+            for r in rows:
+                total += r.total_amount or 0
+                writer.writerow(row_fn(r))
+            yield drain()
+
+        if footer_fn:
+            writer.writerows(footer_fn(total))
+            yield drain()
@@ -0,0 +1,328 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import requests
+from flask import current_app
+from sqlalchemy import insert, update
+from app.extensions import db
+from app.models.notification import Notification
+from app.models.payout_request import PayoutRequest
+from app.models.wallet import Settlement
+from app.services.daraja_client import get_daraja_client, request_never_sent, DarajaAuthError
+from app.services.daraja_service import MpesaService
+from app.services.wallet_service import WalletService
+
+
+class PayoutDispatcher:
+    """
+    Sends approved withdrawals through MpesaService.initiate_b2c. Each sweep
+    claims up to BATCH_SIZE due payouts with one conditional UPDATE and
+    sends them on a pool of `workers` threads, so no more than that many
+    Daraja calls are in flight per process however many were approved.
+
+    Only failures where the request never reached Daraja (connection
+    refused, connect timeout, no token) are retried with backoff. B2C does
+    not dedupe on OriginatorConversationID, so a payout that may have been
+    accepted (read timeout, a connection dropped mid-request, 5xx, unreadable
+    answer, or a sender that died holding the lease) becomes UNKNOWN and is never re-sent or refunded
+    automatically: its result callback settles it, or an admin resolves it
+    against the M-Pesa statement. A payout Daraja refuses outright, or whose
+    result callback reports failure, is refunded to the wallet.
+    """
+    # Lease floor; the lease also outlasts the Daraja client's slowest possible call
+    LEASE_SECONDS = 120
+    LEASE_MARGIN = 30
+    BATCH_SIZE = 50
+
+    def __init__(self, app, workers=4, poll_interval=5.0, max_attempts=5):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='b2c-dispatch')
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(
+            app,
+            workers=app.config.get('MPESA_B2C_WORKERS', 4),
+            poll_interval=app.config.get('MPESA_B2C_POLL_SECONDS', 5.0),
+            max_attempts=app.config.get('MPESA_B2C_MAX_ATTEMPTS', 5)
+        )
+
+    # Lifecycle
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run_forever, name='b2c-dispatcher', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.pool.shutdown(wait=True)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    # Keep sweeping while full batches come back
+                    while self.dispatch_due() >= self.BATCH_SIZE:
+                        pass
+            except Exception as e:
+                print(f"B2C Dispatcher Error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    # Queue
+    @staticmethod
+    def enqueue(settlements):
+        """Queues one payout per (settlement, phone_number) pair in one insert. Caller commits."""
+        now = datetime.utcnow()
+        rows = [{
+            "settlement_id": settlement.id,
+            "vendor_id": settlement.vendor_id,
+            "phone_number": MpesaService.format_phone(phone_number),
+            "amount": int(settlement.amount),
+            "status": PayoutRequest.QUEUED,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "originator_conversation_id": uuid.uuid4().hex,
+            "created_at": now,
+            "updated_at": now
+        } for settlement, phone_number in settlements]
+        if rows:
+            db.session.execute(insert(PayoutRequest), rows)
+        return len(rows)
+
+    def expire_leases(self):
+        """Payouts whose sender died mid-request may have reached Daraja: mark them UNKNOWN."""
+        expired = db.session.execute(
+            update(PayoutRequest)
+            .where(PayoutRequest.status == PayoutRequest.SENDING,
+                   PayoutRequest.next_attempt_at <= datetime.utcnow())
+            .values(status=PayoutRequest.UNKNOWN, last_error="Sender stopped before Daraja answered")
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return expired
+
+    def lease_seconds(self):
+        return max(self.LEASE_SECONDS, get_daraja_client().max_post_seconds() + self.LEASE_MARGIN)
+
+    def claim_batch(self):
+        """
+        Moves up to BATCH_SIZE due QUEUED payouts to SENDING in one UPDATE.
+        The lease expiry doubles as the claim token: the ids we own are the
+        SENDING rows carrying exactly our expiry.
+        """
+        now = datetime.utcnow()
+        lease = now + timedelta(seconds=self.lease_seconds())
+        due = db.session.query(PayoutRequest.id).filter(
+            PayoutRequest.status == PayoutRequest.QUEUED,
+            PayoutRequest.next_attempt_at <= now
+        ).order_by(PayoutRequest.next_attempt_at).limit(self.BATCH_SIZE).subquery()
+
+        db.session.execute(
+            update(PayoutRequest)
+            .where(
+                PayoutRequest.id.in_(db.session.query(due.c.id)),
+                PayoutRequest.status == PayoutRequest.QUEUED,
+                PayoutRequest.next_attempt_at <= now
+            )
+            .values(status=PayoutRequest.SENDING, attempts=PayoutRequest.attempts + 1, next_attempt_at=lease)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return [row.id for row in db.session.query(PayoutRequest.id).filter(
+            PayoutRequest.status == PayoutRequest.SENDING, PayoutRequest.next_attempt_at == lease
+        ).all()]
+
+    def dispatch_due(self):
+        """Claims and sends one batch, returning once every send finished. Returns the batch size."""
+        self.expire_leases()
+        payout_ids = self.claim_batch()
+        db.session.rollback()
+        list(self.pool.map(self._send_in_context, payout_ids))
+        return len(payout_ids)
+
+    # Sending
+    def _send_in_context(self, payout_id):
+        with self.app.app_context():
+            try:
+                self.send(payout_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"B2C Send Error ({payout_id}): {e}")
+
+    def backoff(self, attempts):
+        return timedelta(seconds=min(2 ** attempts, 300))
+
+    def send(self, payout_id):
+        payout = db.session.get(PayoutRequest, payout_id)
+        if not payout or payout.status != PayoutRequest.SENDING:
+            return
+
+        try:
+            res_data = MpesaService.initiate_b2c(
+                payout.phone_number, payout.amount,
+                remarks=f"Withdrawal {payout.settlement_id}",
+                originator_id=payout.originator_conversation_id
+            )
+        except (requests.RequestException, DarajaAuthError, ValueError) as e:
+            if request_never_sent(e):
+                # The request never left, so sending it again cannot pay twice
+                self.retry_or_fail(payout, str(e))
+            else:
+                # Read timeout, dropped connection, 5xx or an unreadable answer: Daraja may have accepted it
+                PayoutDispatcher.mark_unknown(payout, str(e))
+            db.session.commit()
+            return
+
+        if res_data.get('ResponseCode') == '0':
+            payout.status = PayoutRequest.SENT
+            payout.conversation_id = res_data.get('ConversationID')
+            payout.last_error = None
+        else:
+            print(f"B2C Failed: {res_data}")
+            PayoutDispatcher.fail(payout, str(
+                res_data.get('errorMessage') or res_data.get('ResponseDescription') or res_data
+            ))
+        db.session.commit()
+
+    @staticmethod
+    def mark_unknown(payout, error):
+        """Parks a payout Daraja may have accepted until its result or an admin settles it. Caller commits."""
+        payout.status = PayoutRequest.UNKNOWN
+        payout.last_error = error[:255]
+
+    def retry_or_fail(self, payout, error):
+        """
+        Requeues a payout that never reached Daraja, or fails it after
+        max_attempts. Only for errors raised before the request left. Caller commits.
+        """
+        payout.last_error = error[:255]
+        if payout.attempts >= self.max_attempts:
+            PayoutDispatcher.fail(payout, error)
+        else:
+            payout.status = PayoutRequest.QUEUED
+            payout.next_attempt_at = datetime.utcnow() + self.backoff(payout.attempts)
+
+    @staticmethod
+    def fail(payout, error):
+        """
+        Marks the payout and its withdrawal failed and returns the money to
+        the wallet. Only for payouts known not to have been paid. The guarded
+        settlement transition makes a replayed failure a no-op. Caller commits.
+        """
+        payout.status = PayoutRequest.FAILED
+        payout.last_error = error[:255]
+        if WalletService.transition(payout.settlement_id, ['processing'], 'failed',
+                                    processed_at=datetime.utcnow()):
+            WalletService.add_funds(payout.vendor_id, payout.amount, commit=False, entry_type='REFUND',
+                                    settlement_id=payout.settlement_id,
+                                    description="M-Pesa payout failed")
+            db.session.add(Notification(
+                user_id=payout.vendor_id,
+                message=f"Your withdrawal of KES {payout.amount:,.2f} could not be sent to M-Pesa. Funds returned to wallet.",
+                type="error"
+            ))
+
+    # Results
+    @staticmethod
+    def find(result):
+        originator_id = result.get('OriginatorConversationID')
+        conversation_id = result.get('ConversationID')
+        payout = None
+        if originator_id:
+            payout = PayoutRequest.query.filter_by(originator_conversation_id=originator_id).first()
+        if payout is None and conversation_id:
+            payout = PayoutRequest.query.filter_by(conversation_id=conversation_id).first()
+        return payout
+
+    @staticmethod
+    def complete(payout, transaction_id):
+        """Marks the payout and its withdrawal paid. Caller commits."""
+        payout.status = PayoutRequest.COMPLETED
+        payout.transaction_id = transaction_id
+        payout.last_error = None
+        if WalletService.transition(payout.settlement_id, ['processing'], 'completed',
+                                    processed_at=datetime.utcnow(), mpesa_receipt=transaction_id):
+            db.session.add(Notification(
+                user_id=payout.vendor_id,
+                message=f"Your withdrawal of KES {payout.amount:,.2f} has been sent to M-Pesa ({transaction_id}).",
+                type="success"
+            ))
+
+    @staticmethod
+    def apply_result(result):
+        """
+        Applies a B2C result callback, including for UNKNOWN payouts. A
+        payout already COMPLETED or FAILED is left alone, so Daraja's retries
+        are harmless. Returns False if no payout matches. Caller commits.
+        """
+        payout = PayoutDispatcher.find(result)
+        if payout is None:
+            return False
+        if payout.status in (PayoutRequest.COMPLETED, PayoutRequest.FAILED):
+            return True
+
+        if str(result.get('ResultCode')) != '0':
+            PayoutDispatcher.fail(payout, str(result.get('ResultDesc') or "B2C payout failed"))
+            return True
+
+        payout.conversation_id = payout.conversation_id or result.get('ConversationID')
+        PayoutDispatcher.complete(payout, result.get('TransactionID'))
+        return True
+
+    def apply_timeout(self, result):
+        """
+        Daraja timed the request out in its queue. It is neither re-sent nor
+        refunded: the payout becomes UNKNOWN until a result callback or an
+        admin settles it. Caller commits.
+        """
+        payout = PayoutDispatcher.find(result)
+        if payout is None:
+            return False
+        if payout.status in (PayoutRequest.SENT, PayoutRequest.SENDING):
+            PayoutDispatcher.mark_unknown(payout, "Daraja queue timeout")
+        return True
+
+    @staticmethod
+    def resolve(payout, paid, transaction_id=None):
+        """
+        Settles an UNKNOWN payout by hand after checking the M-Pesa statement:
+        paid=True completes it, paid=False refunds the wallet. Returns False
+        if the payout is not UNKNOWN. Caller commits.
+        """
+        if payout.status != PayoutRequest.UNKNOWN:
+            return False
+        if paid:
+            PayoutDispatcher.complete(payout, transaction_id)
+        else:
+            PayoutDispatcher.fail(payout, "Not paid (confirmed by admin)")
+        return True
+
+
+_dispatcher_lock = threading.Lock()
+
+
+def get_payout_dispatcher(app=None):
+    app = app or current_app._get_current_object()
+    dispatcher = app.extensions.get('payout_dispatcher')
+    if dispatcher is None:
+        with _dispatcher_lock:
+            dispatcher = app.extensions.get('payout_dispatcher')
+            if dispatcher is None:
+                dispatcher = PayoutDispatcher.from_config(app)
+                app.extensions['payout_dispatcher'] = dispatcher
+    return dispatcher
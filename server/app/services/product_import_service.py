@@ -0,0 +1,243 @@
+import codecs
+import csv
+import json
+import math
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import update, insert
+from app.extensions import db
+from app.models.product import Product
+from app.services.catalog_service import CatalogService
+
+
+class ProductImportService:
+    """
+    Bulk create/update of a vendor's catalog. Rows are validated a chunk at
+    a time and each chunk is written in its own transaction with executemany
+    statements, so a 2,000-SKU menu is a handful of commits instead of
+    thousands of requests. Rows carrying an `id`, or the `sku` of an
+    existing product, update only the fields they carry; anything else is
+    inserted with defaults for the missing fields.
+    """
+    CHUNK_SIZE = 500
+    MAX_ERRORS = 1000
+    WRITE_COLS = ['name', 'price', 'stock_quantity', 'description', 'category', 'image_url', 'updated_at', 'catalog_version']
+
+    # Input
+    @staticmethod
+    def iter_rows(req):
+        """
+        Yields raw row dicts from a JSON array ({"products": [...]} or a bare
+        list), NDJSON or CSV. CSV and NDJSON bodies, and uploaded CSV files,
+        are read as a stream rather than loaded whole.
+        """
+        upload = req.files.get('file')
+        if upload is not None:
+            yield from csv.DictReader(codecs.iterdecode(upload.stream, 'utf-8-sig'))
+            return
+
+        if req.mimetype in ('text/csv', 'application/csv'):
+            yield from csv.DictReader(codecs.iterdecode(req.stream, 'utf-8-sig'))
+            return
+
+        if req.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            for line in codecs.iterdecode(req.stream, 'utf-8'):
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        body = req.get_json(silent=True)
+        if isinstance(body, dict):
+            body = body.get('products')
+        if not isinstance(body, list):
+            raise ValueError("Expected a JSON array of products, NDJSON or CSV")
+        yield from body
+
+    # Validation
+    @staticmethod
+    def _text(raw, field, max_len, required=False):
+        value = raw.get(field)
+        value = value.strip() if isinstance(value, str) else value
+        if value in (None, ''):
+            if required:
+                raise ValueError(f"{field} is required")
+            return None
+        value = str(value)
+        if len(value) > max_len:
+            raise ValueError(f"{field} is longer than {max_len} characters")
+        return value
+
+    @staticmethod
+    def _number(raw, field, cast, required):
+        value = raw.get(field)
+        if value in (None, ''):
+            if required:
+                raise ValueError(f"{field} is required")
+            return None
+        try:
+            number = cast(str(value).replace(',', '')) if isinstance(value, str) else cast(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"{field} must be a number")
+        if not math.isfinite(number):
+            raise ValueError(f"{field} must be a finite number")
+        if number < 0:
+            raise ValueError(f"{field} cannot be negative")
+        return number
+
+    @staticmethod
+    def validate_chunk(chunk, vendor_id, seen_skus):
+        """
+        Checks a chunk of (row_number, raw) pairs in one pass, plus one query
+        for the ownership of any ids it references and one that resolves its
+        SKUs to existing products (setting their `id`). name and price are
+        only required of rows left to insert. Returns (valid_rows, errors).
+        """
+        svc = ProductImportService
+        parsed, errors = [], []
+
+        for row_number, raw in chunk:
+            if not isinstance(raw, dict):
+                errors.append({"row": row_number, "errors": ["Row must be an object"]})
+                continue
+
+            row_errors = []
+            values = {}
+            # A row keyed by id or sku may be a partial update; whether it is known after the lookup below
+            keyed = bool(raw.get('id')) or bool(str(raw.get('sku') or '').strip())
+            checks = [
+                ('id', lambda: svc._number(raw, 'id', int, False)),
+                ('sku', lambda: svc._text(raw, 'sku', 64)),
+                ('name', lambda: svc._text(raw, 'name', 100, required=not keyed)),
+                ('price', lambda: svc._number(raw, 'price', float, not keyed)),
+                ('stock_quantity', lambda: svc._number(raw, 'stock_quantity', int, False)),
+                ('description', lambda: svc._text(raw, 'description', 5000)),
+                ('category', lambda: svc._text(raw, 'category', 50)),
+                ('image_url', lambda: svc._text(raw, 'image_url', 255)),
+            ]
+            for field, check in checks:
+                try:
+                    values[field] = check()
+                except ValueError as e:
+                    row_errors.append(str(e))
+
+            sku = values.get('sku')
+            if sku and not values.get('id'):
+                if sku in seen_skus:
+                    row_errors.append(f"Duplicate sku '{sku}' in this import")
+                else:
+                    seen_skus.add(sku)
+
+            if row_errors:
+                errors.append({"row": row_number, "errors": row_errors})
+            else:
+                parsed.append((row_number, values))
+
+        ids = {v['id'] for _, v in parsed if v.get('id')}
+        owned = set()
+        if ids:
+            owned = {pid for (pid,) in db.session.query(Product.id)
+                     .filter(Product.id.in_(ids), Product.vendor_id == vendor_id).all()}
+
+        skus = [v['sku'] for _, v in parsed if v.get('sku') and not v.get('id')]
+        existing = {}
+        if skus:
+            existing = dict(db.session.query(Product.sku, Product.id)
+                            .filter(Product.vendor_id == vendor_id, Product.sku.in_(skus)).all())
+
+        valid = []
+        for row_number, values in parsed:
+            if values.get('id') and values['id'] not in owned:
+                errors.append({"row": row_number, "errors": [f"Product {values['id']} not found or unauthorized"]})
+                continue
+            if not values.get('id'):
+                values['id'] = existing.get(values.get('sku'))
+            if not values['id']:
+                missing = [f"{field} is required" for field in ('name', 'price') if values.get(field) is None]
+                if missing:
+                    errors.append({"row": row_number, "errors": missing})
+                    continue
+            valid.append((row_number, values))
+        return valid, errors
+
+    # Writing
+    @staticmethod
+    def apply_chunk(valid, vendor_id):
+        """
+        Writes validated rows with executemany statements: rows with an `id`
+        (given, or resolved from their SKU) as partial updates, the rest as
+        inserts. Returns (inserted, updated). Does not commit.
+        """
+        if not valid:
+            return 0, 0
+        now = datetime.utcnow()
+        # One catalog version per chunk, stamped on every row it writes
+        version = CatalogService.bump(vendor_id)
+
+        updates, inserts = [], []
+        for _, v in valid:
+            product_id = v.get('id')
+            if product_id:
+                # Partial update: only the fields the row actually carried
+                row = {k: v[k] for k in ProductImportService.WRITE_COLS if v.get(k) is not None}
+                if v.get('sku'):
+                    row['sku'] = v['sku']
+                row.update(id=product_id, updated_at=now, catalog_version=version)
+                updates.append(row)
+                continue
+
+            inserts.append({
+                "vendor_id": vendor_id,
+                "sku": v.get('sku'),
+                "name": v['name'],
+                "price": v['price'],
+                "stock_quantity": v.get('stock_quantity') or 0,
+                "description": v.get('description') or '',
+                "category": v.get('category') or 'General',
+                "image_url": v.get('image_url'),
+                "created_at": now,
+                "updated_at": now,
+                "catalog_version": version,
+            })
+
+        # ORM bulk UPDATE by primary key groups rows that share a key set
+        if updates:
+            db.session.execute(update(Product), updates)
+        # A SKU inserted concurrently by another import fails the unique key and rejects the chunk
+        if inserts:
+            db.session.execute(insert(Product), inserts)
+
+        return len(inserts), len(updates)
+
+    @staticmethod
+    def run(rows, vendor_id, chunk_size=None):
+        """Validates and writes `rows`, committing once per chunk. Returns the per-row report."""
+        chunk_size = chunk_size or ProductImportService.CHUNK_SIZE
+        report = {"received": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+        seen_skus = set()
+        numbered = enumerate(rows, start=1)
+
+        while True:
+            chunk = list(islice(numbered, chunk_size))
+            if not chunk:
+                break
+            report["received"] += len(chunk)
+
+            valid, errors = ProductImportService.validate_chunk(chunk, vendor_id, seen_skus)
+            try:
+                inserted, updated = ProductImportService.apply_chunk(valid, vendor_id)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Bulk Import Error: {e}")
+                errors += [{"row": n, "errors": ["Chunk rejected by the database"]} for n, _ in valid]
+                inserted = updated = 0
+
+            report["inserted"] += inserted
+            report["updated"] += updated
+            report["failed"] += len(errors)
+            room = ProductImportService.MAX_ERRORS - len(report["errors"])
+            if room > 0:
+                report["errors"] += sorted(errors, key=lambda e: e["row"])[:room]
+
+        report["errors_truncated"] = report["failed"] > len(report["errors"])
+        return report
@@ -0,0 +1,364 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+import qrcode
+from flask import current_app
+from sqlalchemy import and_, case
+from sqlalchemy.orm import aliased, joinedload
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+from app.extensions import db
+from app.models.transaction import Sale, MpesaPayment
+from app.models.user import User
+
+LANDING_PAGE_URL = "https://rada-pos.vercel.app/"
+TEXT_WIDTH = 42
+
+# ESC/POS control sequences
+ESC_INIT = b'\x1b@'
+ESC_ALIGN = {'left': b'\x1ba\x00', 'center': b'\x1ba\x01'}
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+GS_DOUBLE_HEIGHT = b'\x1d!\x01'
+GS_NORMAL_SIZE = b'\x1d!\x00'
+GS_FEED_AND_CUT = b'\x1dVB\x03'
+
+
+@lru_cache(maxsize=1)
+def landing_qr_png():
+    """The receipt QR never changes, so it is encoded once per process."""
+    qr = qrcode.QRCode(box_size=10, border=1)
+    qr.add_data(LANDING_PAGE_URL)
+    qr.make(fit=True)
+    qr_buf = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(qr_buf, format='PNG')
+    return qr_buf.getvalue()
+
+
+class ReceiptCache:
+    """Bounded LRU of rendered receipts, optionally backed by a directory."""
+
+    def __init__(self, maxsize=256, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        sale_id, digest = key
+        return os.path.join(self.directory, f"receipt_{sale_id}_{digest}.pdf")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        if self.directory:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return None
+            self._remember(key, data)
+            return data
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.directory:
+            try:
+                tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                print(f"Receipt Cache Error: {e}")
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+_cache_lock = threading.Lock()
+
+
+def get_receipt_cache(app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('receipt_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = app.extensions.get('receipt_cache')
+            if cache is None:
+                cache = ReceiptCache(
+                    maxsize=app.config.get('RECEIPT_CACHE_SIZE', 256),
+                    directory=app.config.get('RECEIPT_CACHE_DIR')
+                )
+                app.extensions['receipt_cache'] = cache
+    return cache
+
+
+class ReceiptService:
+    @staticmethod
+    def load(sale_id):
+        """
+        Everything a receipt prints, from one query: the sale with its items,
+        the cashier, the cashier's vendor and the successful M-Pesa payment.
+        Returns a plain dict, or None if the sale does not exist.
+        """
+        cashier = aliased(User)
+        vendor = aliased(User)
+        vendor_id = case((cashier.role == 'VENDOR', cashier.id), else_=cashier.vendor_id)
+
+        row = db.session.query(Sale, cashier, vendor, MpesaPayment.mpesa_receipt_number)\
+            .outerjoin(cashier, cashier.id == Sale.cashier_id)\
+            .outerjoin(vendor, vendor.id == vendor_id)\
+            .outerjoin(MpesaPayment, and_(MpesaPayment.sale_id == Sale.id, MpesaPayment.result_code == 0))\
+            .options(joinedload(Sale.items))\
+            .filter(Sale.id == sale_id)\
+            .first()
+        if row is None:
+            return None
+        sale, cashier, vendor, mpesa_code = row
+
+        local_time = sale.created_at + timedelta(hours=3)
+        return {
+            "sale_id": sale.id,
+            "business_name": vendor.business_name.upper() if (vendor and vendor.business_name) else "RADA POS",
+            "phone": vendor.phone_number if vendor else "",
+            "footer": getattr(vendor, 'receipt_footer', "Thank you for shopping with us!") or "Thank you for shopping!",
+            "date": local_time.strftime('%d/%m/%Y %H:%M'),
+            "cashier": cashier.name if cashier else 'N/A',
+            "mpesa_code": mpesa_code if sale.payment_method in ['MPESA', 'SPLIT'] else None,
+            "items": [
+                {"name": item.product_name, "quantity": item.quantity, "total": item.price * item.quantity}
+                for item in sorted(sale.items, key=lambda i: i.id)
+            ],
+            "discount": sale.discount_amount or 0,
+            "total": sale.total_amount,
+            "payment_method": sale.payment_method,
+            "amount_cash": sale.amount_cash or 0,
+            "amount_mpesa": sale.amount_mpesa or 0,
+        }
+
+    @staticmethod
+    def content_hash(data):
+        return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def render_pdf(data):
+        buffer = io.BytesIO()
+        p = canvas.Canvas(buffer, pagesize=(300, 750))
+
+        y = 720
+        p.setFont("Helvetica-Bold", 14)
+        p.drawCentredString(150, y, data['business_name'])
+        y -= 20
+        p.setFont("Helvetica", 9)
+        p.drawCentredString(150, y, "Nairobi, Kenya")
+        y -= 15
+        if data['phone']:
+            p.drawCentredString(150, y, f"Tel: {data['phone']}")
+            y -= 20
+
+        p.line(20, y, 280, y)
+        y -= 20
+
+        p.setFont("Helvetica-Bold", 10)
+        p.drawString(20, y, f"RECEIPT #: {data['sale_id']}")
+        y -= 15
+        p.setFont("Helvetica", 9)
+        p.drawString(20, y, f"Date: {data['date']}")
+        y -= 15
+        p.drawString(20, y, f"Cashier: {data['cashier']}")
+
+        if data['mpesa_code']:
+            y -= 15
+            p.drawString(20, y, f"M-Pesa Ref: {data['mpesa_code']}")
+
+        y -= 25
+
+        p.setFont("Helvetica-Bold", 9)
+        p.drawString(20, y, "ITEM")
+        p.drawRightString(200, y, "QTY")
+        p.drawRightString(280, y, "TOTAL")
+        p.line(20, y-5, 280, y-5)
+        y -= 20
+
+        p.setFont("Helvetica", 9)
+        for item in data['items']:
+            name = item['name'][:22] + "..." if len(item['name']) > 22 else item['name']
+            p.drawString(20, y, name)
+            p.drawRightString(200, y, str(item['quantity']))
+            p.drawRightString(280, y, f"{item['total']:,.2f}")
+            y -= 15
+
+        y -= 10
+        p.line(20, y, 280, y)
+        y -= 20
+
+        if data['discount'] > 0:
+            subtotal = data['total'] + data['discount']
+
+            p.setFont("Helvetica", 9)
+            p.drawString(20, y, "Subtotal")
+            p.drawRightString(280, y, f"{subtotal:,.2f}")
+            y -= 15
+
+            p.drawString(20, y, "Discount")
+            p.drawRightString(280, y, f"-{data['discount']:,.2f}")
+            y -= 15
+
+            p.setLineWidth(0.5)
+            p.line(180, y+5, 280, y+5)
+            y -= 5
+
+        p.setFont("Helvetica-Bold", 12)
+        p.drawString(20, y, "TOTAL")
+        p.drawRightString(280, y, f"KES {data['total']:,.2f}")
+
+        if data['payment_method'] == 'SPLIT':
+            y -= 20
+            p.setFont("Helvetica", 9)
+            p.drawString(20, y, "Paid via Cash:")
+            p.drawRightString(280, y, f"{data['amount_cash']:,.2f}")
+            y -= 15
+            p.drawString(20, y, "Paid via M-Pesa:")
+            p.drawRightString(280, y, f"{data['amount_mpesa']:,.2f}")
+
+        y -= 90
+        p.drawImage(ImageReader(io.BytesIO(landing_qr_png())), 110, y, width=80, height=80)
+
+        y -= 20
+        p.setFont("Helvetica-Oblique", 8)
+        p.drawCentredString(150, y, data['footer'])
+
+        y -= 12
+        p.setFont("Helvetica", 6)
+        p.setFillColorRGB(0.5, 0.5, 0.5)
+        p.drawCentredString(150, y, "Powered by RadaPOS Enterprise")
+
+        p.showPage()
+        p.save()
+        return buffer.getvalue()
+
+    @staticmethod
+    def receipt_lines(data, width=TEXT_WIDTH):
+        """
+        The receipt as (style, text) lines for fixed-width printers. Style is
+        None, 'center', 'bold', 'title', 'rule' or 'qr' (text is the URL).
+        """
+        rule = ('rule', '-' * width)
+        qty_w, total_w = 6, 12
+        name_w = width - qty_w - total_w
+
+        def pair(label, value):
+            return f"{label}{value:>{width - len(label)}}"
+
+        lines = [('title', data['business_name'][:width]), ('center', "Nairobi, Kenya")]
+        if data['phone']:
+            lines.append(('center', f"Tel: {data['phone']}"))
+        lines.append(rule)
+
+        lines.append(('bold', f"RECEIPT #: {data['sale_id']}"))
+        lines.append((None, f"Date: {data['date']}"))
+        lines.append((None, f"Cashier: {data['cashier']}"[:width]))
+        if data['mpesa_code']:
+            lines.append((None, f"M-Pesa Ref: {data['mpesa_code']}"))
+        lines.append(rule)
+
+        lines.append(('bold', f"{'ITEM':<{name_w}}{'QTY':>{qty_w}}{'TOTAL':>{total_w}}"))
+        for item in data['items']:
+            name = item['name'] if len(item['name']) <= name_w else item['name'][:name_w - 3] + "..."
+            lines.append((None, f"{name:<{name_w}}{item['quantity']:>{qty_w}}{item['total']:>{total_w},.2f}"))
+        lines.append(rule)
+
+        if data['discount'] > 0:
+            lines.append((None, pair("Subtotal", f"{data['total'] + data['discount']:,.2f}")))
+            lines.append((None, pair("Discount", f"-{data['discount']:,.2f}")))
+        lines.append(('bold', pair("TOTAL", f"KES {data['total']:,.2f}")))
+
+        if data['payment_method'] == 'SPLIT':
+            lines.append((None, pair("Paid via Cash:", f"{data['amount_cash']:,.2f}")))
+            lines.append((None, pair("Paid via M-Pesa:", f"{data['amount_mpesa']:,.2f}")))
+        lines.append(rule)
+
+        lines.append(('qr', LANDING_PAGE_URL))
+        lines.append(('center', data['footer'][:width]))
+        lines.append(('center', "Powered by RadaPOS Enterprise"))
+        return lines
+
+    @staticmethod
+    def render_text(data, width=TEXT_WIDTH):
+        out = []
+        for style, text in ReceiptService.receipt_lines(data, width):
+            if style in ('center', 'title', 'qr'):
+                text = text.center(width).rstrip()
+            out.append(text)
+        return "\n".join(out) + "\n"
+
+    @staticmethod
+    def escpos_qr(url, module_size=6):
+        """Native printer QR (model 2), so no raster image goes over the wire."""
+        payload = url.encode('ascii')
+        store_len = len(payload) + 3
+        return b''.join([
+            b'\x1d(k\x04\x001A2\x00',
+            b'\x1d(k\x03\x001C' + bytes([module_size]),
+            b'\x1d(k\x03\x001E0',
+            b'\x1d(k' + bytes([store_len % 256, store_len // 256]) + b'1P0' + payload,
+            b'\x1d(k\x03\x001Q0',
+        ])
+
+    @staticmethod
+    def render_escpos(data, width=TEXT_WIDTH):
+        out = [ESC_INIT]
+        align = 'left'
+        for style, text in ReceiptService.receipt_lines(data, width):
+            wanted = 'center' if style in ('center', 'title', 'qr') else 'left'
+            if wanted != align:
+                out.append(ESC_ALIGN[wanted])
+                align = wanted
+
+            if style == 'qr':
+                out += [ReceiptService.escpos_qr(text), b'\n']
+                continue
+
+            encoded = text.encode('ascii', errors='replace') + b'\n'
+            if style == 'title':
+                out += [ESC_BOLD_ON, GS_DOUBLE_HEIGHT, encoded, GS_NORMAL_SIZE, ESC_BOLD_OFF]
+            elif style == 'bold':
+                out += [ESC_BOLD_ON, encoded, ESC_BOLD_OFF]
+            else:
+                out.append(encoded)
+        out.append(GS_FEED_AND_CUT)
+        return b''.join(out)
+
+    @staticmethod
+    def get_pdf(sale_id):
+        """
+        PDF bytes for the sale, or None if it does not exist. Receipts are
+        cached by content hash, so a reprint skips ReportLab entirely while
+        a sale that changed (e.g. M-Pesa ref arrived) renders afresh.
+        """
+        data = ReceiptService.load(sale_id)
+        if data is None:
+            return None
+
+        cache = get_receipt_cache()
+        key = (sale_id, ReceiptService.content_hash(data))
+        pdf = cache.get(key)
+        if pdf is None:
+            pdf = ReceiptService.render_pdf(data)
+            cache.put(key, pdf)
+        return pdf
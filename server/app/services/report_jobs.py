@@ -0,0 +1,278 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from flask import current_app
+from sqlalchemy import update, exists, and_
+from app.extensions import db
+from app.models.report_job import ReportJob
+from app.models.transaction import Sale, SaleItem
+from app.models.user import User
+
+
+class ReportError(Exception):
+    """Raised for report requests the caller can fix; maps to a 400 response."""
+    pass
+
+
+def render_sales_pdf(path, title, rows):
+    """
+    Writes the vendor sales table to `path` and returns its size. Runs in a
+    pool process, so it only takes plain values: `rows` is a list of
+    (date, sale_id, method, total) tuples.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+
+    doc = SimpleDocTemplate(path, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    elements.append(Paragraph(title, styles['Title']))
+    elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+
+    data = [['Date', 'Sale ID', 'Method', 'Total (KES)']]
+    total_revenue = 0.0
+
+    for day, sale_id, method, total in rows:
+        data.append([day, f"#{sale_id}", method, f"{total:,.2f}"])
+        total_revenue += total
+
+    data.append(['', '', 'GRAND TOTAL:', f"{total_revenue:,.2f}"])
+
+    table = Table(data, colWidths=[100, 80, 100, 100], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+
+    elements.append(table)
+    doc.build(elements)
+    return os.path.getsize(path)
+
+
+class ReportService:
+    KINDS = ('sales_pdf',)
+
+    @staticmethod
+    def parse_params(data):
+        """Validates {start_date, end_date} (YYYY-MM-DD, both optional)."""
+        params = {}
+        for key in ('start_date', 'end_date'):
+            value = data.get(key)
+            if value:
+                try:
+                    params[key] = date.fromisoformat(str(value)).isoformat()
+                except ValueError:
+                    raise ReportError(f"{key} must be YYYY-MM-DD")
+        if params.get('start_date') and params.get('end_date') and params['start_date'] > params['end_date']:
+            raise ReportError("start_date is after end_date")
+        return params
+
+    @staticmethod
+    def enqueue(vendor_id, requested_by, kind='sales_pdf', params=None):
+        """Adds a QUEUED job. Caller commits, then hands job.id to the runner."""
+        if kind not in ReportService.KINDS:
+            raise ReportError(f"Unknown report kind '{kind}'")
+        job = ReportJob(
+            vendor_id=vendor_id,
+            requested_by=requested_by,
+            kind=kind,
+            params=json.dumps(params or {}),
+            status=ReportJob.QUEUED
+        )
+        db.session.add(job)
+        return job
+
+    @staticmethod
+    def load_sales(job):
+        """
+        Title and rows for a sales report: one row per COMPLETED sale that
+        contains the vendor's products, newest first, read as plain columns.
+        """
+        params = json.loads(job.params or '{}')
+        vendor = db.session.get(User, job.vendor_id)
+
+        has_vendor_item = exists().where(and_(
+            SaleItem.sale_id == Sale.id,
+            SaleItem.vendor_id == job.vendor_id
+        ))
+        query = db.session.query(Sale.created_at, Sale.id, Sale.payment_method, Sale.total_amount)\
+            .filter(Sale.status == 'COMPLETED', has_vendor_item)
+        if params.get('start_date'):
+            query = query.filter(Sale.created_at >= datetime.fromisoformat(params['start_date']))
+        if params.get('end_date'):
+            query = query.filter(Sale.created_at < datetime.fromisoformat(params['end_date']) + timedelta(days=1))
+
+        rows = [
+            (created_at.strftime('%Y-%m-%d'), sale_id, method, float(total or 0))
+            for created_at, sale_id, method, total in query.order_by(Sale.created_at.desc()).all()
+        ]
+        title = f"Sales Report: {(vendor.business_name or vendor.name) if vendor else job.vendor_id}"
+        return title, rows
+
+
+class ReportRunner:
+    """
+    Renders queued report jobs. A thread per slot claims the job, reads the
+    data and waits on a process pool that does the ReportLab work, so large
+    renders never hold a request worker or the GIL of the web process.
+    Jobs run in the process that enqueued them; `flask run-report-jobs`
+    picks up any left QUEUED by a worker that restarted.
+    """
+
+    def __init__(self, app, workers=2, directory=None, timeout=300, retention_hours=24):
+        self.app = app
+        self.workers = workers
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'radapos_reports')
+        self.timeout = timeout
+        self.retention = timedelta(hours=retention_hours)
+        self.threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-job')
+        self._processes = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(
+            app,
+            workers=app.config.get('REPORT_WORKERS', 2),
+            directory=app.config.get('REPORT_DIR'),
+            timeout=app.config.get('REPORT_TIMEOUT_SECONDS', 300),
+            retention_hours=app.config.get('REPORT_RETENTION_HOURS', 24)
+        )
+
+    @property
+    def processes(self):
+        # Started on first use; spawn avoids forking a process that holds threads and DB connections
+        if self._processes is None:
+            with self._lock:
+                if self._processes is None:
+                    self._processes = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._processes
+
+    def submit(self, job_id):
+        return self.threads.submit(self._run_in_context, job_id)
+
+    def stop(self):
+        self.threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+
+    # Execution
+    def claim(self, job_id):
+        """Atomically moves a QUEUED job to RUNNING. True if we own it."""
+        result = db.session.execute(
+            update(ReportJob)
+            .where(ReportJob.id == job_id, ReportJob.status == ReportJob.QUEUED)
+            .values(status=ReportJob.RUNNING, started_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _run_in_context(self, job_id):
+        with self.app.app_context():
+            try:
+                self.run(job_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Report Job Error ({job_id}): {e}")
+                db.session.execute(
+                    update(ReportJob).where(ReportJob.id == job_id)
+                    .values(status=ReportJob.FAILED, error=str(e)[:255], finished_at=datetime.utcnow())
+                )
+                db.session.commit()
+
+    def run(self, job_id):
+        if not self.claim(job_id):
+            return
+        job = db.session.get(ReportJob, job_id)
+        title, rows = ReportService.load_sales(job)
+        # Release the connection while the pool renders
+        db.session.rollback()
+
+        path = os.path.join(self.directory, f"report_{job_id}_{uuid.uuid4().hex}.pdf")
+        size = self.processes.submit(render_sales_pdf, path, title, rows).result(timeout=self.timeout)
+
+        job = db.session.get(ReportJob, job_id)
+        job.status = ReportJob.DONE
+        job.file_path = path
+        job.file_size = size
+        job.row_count = len(rows)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def run_and_wait(self, job_id, timeout):
+        """Submits a job and blocks up to `timeout` seconds for it. Returns the (refreshed) job."""
+        future = self.submit(job_id)
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass
+        db.session.expire_all()
+        return db.session.get(ReportJob, job_id)
+
+    # Housekeeping
+    def run_pending(self):
+        """Submits every QUEUED job and fails RUNNING ones older than the timeout. Returns the count submitted."""
+        now = datetime.utcnow()
+        db.session.execute(
+            update(ReportJob)
+            .where(ReportJob.status == ReportJob.RUNNING,
+                   ReportJob.started_at < now - timedelta(seconds=self.timeout * 2))
+            .values(status=ReportJob.FAILED, error='Interrupted', finished_at=now)
+        )
+        db.session.commit()
+
+        job_ids = [job_id for (job_id,) in db.session.query(ReportJob.id)
+                   .filter(ReportJob.status == ReportJob.QUEUED).order_by(ReportJob.created_at).all()]
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    def prune(self):
+        """Deletes finished jobs, and their files, older than the retention window."""
+        cutoff = datetime.utcnow() - self.retention
+        old = ReportJob.query.filter(
+            ReportJob.status.in_([ReportJob.DONE, ReportJob.FAILED]), ReportJob.created_at < cutoff
+        ).all()
+        for job in old:
+            if job.file_path:
+                try:
+                    os.remove(job.file_path)
+                except OSError:
+                    pass
+            db.session.delete(job)
+        db.session.commit()
+        return len(old)
+
+
+_runner_lock = threading.Lock()
+
+
+def get_report_runner(app=None):
+    app = app or current_app._get_current_object()
+    runner = app.extensions.get('report_runner')
+    if runner is None:
+        with _runner_lock:
+            runner = app.extensions.get('report_runner')
+            if runner is None:
+                runner = ReportRunner.from_config(app)
+                app.extensions['report_runner'] = runner
+    return runner
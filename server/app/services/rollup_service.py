@@ -0,0 +1,173 @@
+from datetime import date, datetime
+from sqlalchemy import func, insert
+from app.extensions import db
+from app.models.rollup import DailySalesRollup, VendorSalesSummary
+from app.models.transaction import Sale
+from app.models.user import User
+from app.models.event import event_vendors
+from app.utils.upsert import upsert_increment
+
+ROLLUP_KEY = ['day', 'vendor_id', 'event_id', 'payment_method']
+ROLLUP_MEASURES = ['sale_count', 'total_amount', 'amount_cash', 'amount_mpesa']
+
+
+def _as_date(value):
+    # func.date() comes back as a string on SQLite and a date on Postgres
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+class RollupService:
+    @staticmethod
+    def vendor_for_cashier(cashier):
+        if not cashier:
+            return 0
+        return cashier.id if cashier.role == 'VENDOR' else (cashier.vendor_id or 0)
+
+    @staticmethod
+    def current_event_ids(vendor_ids):
+        """Latest event assignment per vendor, {vendor_id: event_id}."""
+        vendor_ids = [v for v in set(vendor_ids) if v]
+        if not vendor_ids:
+            return {}
+        rows = db.session.query(event_vendors.c.user_id, func.max(event_vendors.c.event_id))\
+            .filter(event_vendors.c.user_id.in_(vendor_ids))\
+            .group_by(event_vendors.c.user_id).all()
+        return dict(rows)
+
+    @staticmethod
+    def record_sale(sale):
+        """
+        Adds a COMPLETED sale to its rollup bucket inside the caller's
+        transaction. Call exactly once per sale, when it becomes COMPLETED.
+        """
+        RollupService.record_sales([sale])
+
+    @staticmethod
+    def record_sales(sales):
+        """record_sale for many sales at once: one upsert per bucket they land in."""
+        if not sales:
+            return
+        # Sales stamped at checkout carry their own attribution; older ones fall back to the cashier
+        unstamped = {s.cashier_id for s in sales if s.vendor_id is None and s.cashier_id}
+        # Cashiers are usually already in the identity map from the JWT lookup
+        vendor_of = {cid: RollupService.vendor_for_cashier(db.session.get(User, cid)) for cid in unstamped}
+        event_of = RollupService.current_event_ids(vendor_of.values())
+
+        buckets = {}
+        for sale in sales:
+            if sale.vendor_id is not None:
+                vendor_id, event_id = sale.vendor_id, sale.event_id or 0
+            else:
+                vendor_id = vendor_of.get(sale.cashier_id, 0)
+                event_id = event_of.get(vendor_id, 0)
+            key = ((sale.created_at or datetime.utcnow()).date(), vendor_id, event_id, sale.payment_method)
+            bucket = buckets.setdefault(key, [0, 0.0, 0.0, 0.0])
+            bucket[0] += 1
+            bucket[1] += float(sale.total_amount or 0)
+            bucket[2] += float(sale.amount_cash or 0)
+            bucket[3] += float(sale.amount_mpesa or 0)
+
+        for key, values in buckets.items():
+            upsert_increment(DailySalesRollup, dict(zip(ROLLUP_KEY, key), **dict(zip(ROLLUP_MEASURES, values))),
+                             ROLLUP_KEY, ROLLUP_MEASURES)
+        for vendor_id, values in RollupService.vendor_totals(buckets).items():
+            upsert_increment(VendorSalesSummary, dict(vendor_id=vendor_id, **dict(zip(ROLLUP_MEASURES, values))),
+                             ['vendor_id'], ROLLUP_MEASURES)
+
+    @staticmethod
+    def vendor_totals(buckets):
+        """Folds {rollup key: measures} into {vendor_id: measures}."""
+        totals = {}
+        for key, values in buckets.items():
+            total = totals.setdefault(key[1], [0, 0.0, 0.0, 0.0])
+            for i, value in enumerate(values):
+                total[i] += value
+        return totals
+
+    @staticmethod
+    def recompute():
+        """
+        {rollup key: measures} computed from scratch off COMPLETED sales,
+        grouped directly on the vendor and event stamped at checkout.
+        """
+        day = func.date(Sale.created_at)
+        vendor = func.coalesce(Sale.vendor_id, 0)
+        event = func.coalesce(Sale.event_id, 0)
+        grouped = db.session.query(
+            day.label('day'),
+            vendor,
+            event,
+            Sale.payment_method,
+            func.count(Sale.id),
+            func.sum(Sale.total_amount),
+            func.sum(func.coalesce(Sale.amount_cash, 0)),
+            func.sum(func.coalesce(Sale.amount_mpesa, 0))
+        ).filter(Sale.status == 'COMPLETED')\
+         .group_by(day, vendor, event, Sale.payment_method).all()
+
+        buckets = {}
+        for r in grouped:
+            key = (_as_date(r[0]), r[1], r[2], r[3])
+            bucket = buckets.setdefault(key, [0, 0.0, 0.0, 0.0])
+            for i, value in enumerate(r[4:]):
+                bucket[i] += value or 0
+        return buckets
+
+    @staticmethod
+    def rebuild():
+        """Replaces daily_sales_rollup and vendor_sales_summary with a full recompute. Returns the bucket count."""
+        buckets = RollupService.recompute()
+
+        DailySalesRollup.query.delete()
+        VendorSalesSummary.query.delete()
+        if buckets:
+            db.session.execute(insert(DailySalesRollup), [
+                dict(zip(ROLLUP_KEY, key), **dict(zip(ROLLUP_MEASURES, values)))
+                for key, values in buckets.items()
+            ])
+            db.session.execute(insert(VendorSalesSummary), [
+                dict(vendor_id=vendor_id, **dict(zip(ROLLUP_MEASURES, values)))
+                for vendor_id, values in RollupService.vendor_totals(buckets).items()
+            ])
+        db.session.commit()
+        return len(buckets)
+
+    @staticmethod
+    def filtered(query, start_day=None, end_day=None, vendor_id=None, event_id=None):
+        if start_day:
+            query = query.filter(DailySalesRollup.day >= start_day)
+        if end_day:
+            query = query.filter(DailySalesRollup.day <= end_day)
+        if vendor_id is not None:
+            query = query.filter(DailySalesRollup.vendor_id == vendor_id)
+        if event_id is not None:
+            query = query.filter(DailySalesRollup.event_id == event_id)
+        return query
+
+    @staticmethod
+    def total(**filters):
+        query = db.session.query(func.sum(DailySalesRollup.total_amount))
+        return float(RollupService.filtered(query, **filters).scalar() or 0.0)
+
+    @staticmethod
+    def order_count(**filters):
+        query = db.session.query(func.sum(DailySalesRollup.sale_count))
+        return int(RollupService.filtered(query, **filters).scalar() or 0)
+
+    @staticmethod
+    def daily_series(**filters):
+        """[(day, total)] ordered by day."""
+        query = db.session.query(DailySalesRollup.day, func.sum(DailySalesRollup.total_amount))
+        query = RollupService.filtered(query, **filters)
+        return query.group_by(DailySalesRollup.day).order_by(DailySalesRollup.day).all()
+
+    @staticmethod
+    def by_payment_method(**filters):
+        """[(payment_method, total)]."""
+        query = db.session.query(DailySalesRollup.payment_method, func.sum(DailySalesRollup.total_amount).label('total'))
+        query = RollupService.filtered(query, **filters)
+        return query.group_by(DailySalesRollup.payment_method).all()
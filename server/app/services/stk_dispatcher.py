@@ -0,0 +1,304 @@
+import base64
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import requests
+from flask import current_app
+from sqlalchemy import update
+from app.extensions import db
+from app.models.payment_request import PaymentRequest
+from app.models.transaction import MpesaPayment
+from app.services.daraja_client import get_daraja_client, request_never_sent, DarajaAuthError
+from app.services.daraja_service import MpesaService
+from app.utils.pubsub import publish_payment_status
+
+
+class StkDispatcher:
+    """
+    Background sender for queued STK pushes. A poller thread claims due rows
+    with a conditional UPDATE (so several gunicorn workers, or a separate
+    `flask run-stk-dispatcher` process, never send the same request twice)
+    and hands them to a small thread pool. A push is only sent again when
+    the request never reached Daraja (connection refused, connect timeout,
+    no token); Daraja rejections fail immediately. A push that may have
+    reached Daraja without us seeing the reply (read timeout, a connection
+    dropped mid-request, 5xx, a sender that died holding the lease) becomes
+    UNKNOWN and is never re-sent, since that would prompt the customer
+    twice; its callback settles it.
+    """
+    # Lease floor; the lease also outlasts the Daraja client's slowest possible call
+    LEASE_SECONDS = 60
+    LEASE_MARGIN = 30
+    BATCH_SIZE = 20
+
+    def __init__(self, app, workers=4, poll_interval=1.0, max_attempts=5):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stk-dispatch')
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(
+            app,
+            workers=app.config.get('MPESA_DISPATCH_WORKERS', 4),
+            poll_interval=app.config.get('MPESA_DISPATCH_POLL_SECONDS', 1.0),
+            max_attempts=app.config.get('MPESA_DISPATCH_MAX_ATTEMPTS', 5)
+        )
+
+    # Lifecycle
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run_forever, name='stk-dispatcher', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.pool.shutdown(wait=True)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.dispatch_due()
+            except Exception as e:
+                print(f"STK Dispatcher Error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    # Queue
+    @staticmethod
+    def enqueue(sale_id, phone_number, amount, idempotency_key=None):
+        """Adds (or returns the existing) request for this key. Caller commits."""
+        if idempotency_key:
+            existing = PaymentRequest.query.filter_by(idempotency_key=idempotency_key).first()
+            if existing:
+                return existing
+
+        payment_request = PaymentRequest(
+            idempotency_key=idempotency_key or uuid.uuid4().hex,
+            sale_id=sale_id,
+            phone_number=phone_number,
+            amount=amount,
+            status=PaymentRequest.QUEUED,
+            next_attempt_at=datetime.utcnow()
+        )
+        db.session.add(payment_request)
+        return payment_request
+
+    @staticmethod
+    def handle_for_checkout(checkout_id):
+        """The /pay handle behind a Daraja CheckoutRequestID, if it was queued here."""
+        return db.session.query(PaymentRequest.idempotency_key)\
+            .filter_by(checkout_request_id=checkout_id).scalar()
+
+    @staticmethod
+    def adopt_unknown(stk_callback):
+        """
+        Attaches a successful callback whose CheckoutRequestID we never saw to
+        the oldest UNKNOWN push for the same phone and amount, recording the
+        MpesaPayment it should have had. Returns the request or None. Caller commits.
+        """
+        metadata = {item.get('Name'): item.get('Value')
+                    for item in stk_callback.get('CallbackMetadata', {}).get('Item', [])}
+        if stk_callback.get('ResultCode') != 0 or not metadata.get('PhoneNumber') or not metadata.get('Amount'):
+            return None
+
+        phone_number = MpesaService.format_phone(metadata['PhoneNumber'])
+        candidates = PaymentRequest.query.filter(
+            PaymentRequest.status == PaymentRequest.UNKNOWN,
+            PaymentRequest.amount == int(float(metadata['Amount']))
+        ).order_by(PaymentRequest.created_at).with_for_update().all()
+        payment_request = next(
+            (r for r in candidates if MpesaService.format_phone(r.phone_number) == phone_number), None
+        )
+        if payment_request is None:
+            return None
+
+        StkDispatcher.mark_sent(payment_request, stk_callback['CheckoutRequestID'],
+                                stk_callback.get('MerchantRequestID'))
+        db.session.flush()
+        return payment_request
+
+    @staticmethod
+    def mark_sent(payment_request, checkout_request_id, merchant_request_id):
+        payment_request.status = PaymentRequest.SENT
+        payment_request.checkout_request_id = checkout_request_id
+        payment_request.merchant_request_id = merchant_request_id
+        payment_request.last_error = None
+        db.session.add(MpesaPayment(
+            sale_id=payment_request.sale_id,
+            checkout_request_id=checkout_request_id,
+            merchant_request_id=merchant_request_id,
+            phone_number=payment_request.phone_number,
+            amount=payment_request.amount,
+            result_desc="Pending"
+        ))
+
+    def expire_leases(self):
+        """Pushes whose sender died mid-request may have reached Daraja: mark them UNKNOWN."""
+        expired = db.session.execute(
+            update(PaymentRequest)
+            .where(PaymentRequest.status == PaymentRequest.SENDING,
+                   PaymentRequest.next_attempt_at <= datetime.utcnow())
+            .values(status=PaymentRequest.UNKNOWN, last_error="Sender stopped before Daraja answered")
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return expired
+
+    def lease_seconds(self):
+        return max(self.LEASE_SECONDS, get_daraja_client().max_post_seconds() + self.LEASE_MARGIN)
+
+    def claim(self, request_id):
+        """Atomically moves a due QUEUED row to SENDING under a lease. True if we own it."""
+        now = datetime.utcnow()
+        result = db.session.execute(
+            update(PaymentRequest)
+            .where(
+                PaymentRequest.id == request_id,
+                PaymentRequest.status == PaymentRequest.QUEUED,
+                PaymentRequest.next_attempt_at <= now
+            )
+            .values(
+                status=PaymentRequest.SENDING,
+                attempts=PaymentRequest.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=self.lease_seconds())
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def dispatch_due(self):
+        self.expire_leases()
+        due_ids = [row.id for row in db.session.query(PaymentRequest.id).filter(
+            PaymentRequest.status == PaymentRequest.QUEUED,
+            PaymentRequest.next_attempt_at <= datetime.utcnow()
+        ).order_by(PaymentRequest.next_attempt_at).limit(self.BATCH_SIZE).all()]
+        db.session.rollback()
+
+        for request_id in due_ids:
+            if self.claim(request_id):
+                self.pool.submit(self._send_in_context, request_id)
+        return len(due_ids)
+
+    # Sending
+    def _send_in_context(self, request_id):
+        with self.app.app_context():
+            try:
+                self.send(request_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"STK Send Error ({request_id}): {e}")
+
+    @staticmethod
+    def build_payload(phone_number, amount):
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        shortcode = current_app.config.get('MPESA_SHORTCODE')
+        passkey = current_app.config.get('MPESA_PASSKEY')
+        password = base64.b64encode(f"{shortcode}{passkey}{timestamp}".encode()).decode('utf-8')
+
+        return {
+            "BusinessShortCode": shortcode,
+            "Password": password,
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": amount,
+            "PartyA": phone_number,
+            "PartyB": shortcode,
+            "PhoneNumber": phone_number,
+            "CallBackURL": current_app.config.get('MPESA_CALLBACK_URL'),
+            "AccountReference": "RadaPOS",
+            "TransactionDesc": "POS Sale"
+        }
+
+    def backoff(self, attempts):
+        return timedelta(seconds=min(2 ** attempts, 60))
+
+    def send(self, request_id):
+        payment_request = db.session.get(PaymentRequest, request_id)
+        if not payment_request or payment_request.status != PaymentRequest.SENDING:
+            return
+
+        payload = self.build_payload(payment_request.phone_number, payment_request.amount)
+
+        try:
+            response = get_daraja_client().stk_push(payload)
+        except (requests.RequestException, DarajaAuthError) as e:
+            if request_never_sent(e):
+                # The push never left: safe to send again
+                self._retry_or_fail(payment_request, str(e))
+            else:
+                self._mark_unknown(payment_request, str(e))
+            return
+
+        if response.status_code >= 500:
+            self._mark_unknown(payment_request, f"Daraja {response.status_code}")
+            return
+        try:
+            res_data = response.json()
+        except ValueError as e:
+            if response.status_code < 400:
+                self._mark_unknown(payment_request, f"Unreadable Daraja response: {e}")
+                return
+            res_data = {"errorMessage": f"Daraja {response.status_code}"}
+
+        if res_data.get('ResponseCode') == '0':
+            StkDispatcher.mark_sent(payment_request, res_data['CheckoutRequestID'], res_data['MerchantRequestID'])
+        else:
+            print(f"STK Failed: {res_data}")
+            payment_request.status = PaymentRequest.FAILED
+            payment_request.last_error = str(
+                res_data.get('errorMessage') or res_data.get('ResponseDescription') or res_data
+            )[:255]
+        db.session.commit()
+
+        if payment_request.status == PaymentRequest.SENT:
+            # The callback may have beaten this commit; if so it is stored and waiting
+            from app.services.callback_service import MpesaCallbackService
+            MpesaCallbackService.apply_stored(payment_request.checkout_request_id)
+        publish_payment_status(payment_request.idempotency_key)
+
+    def _mark_unknown(self, payment_request, error):
+        payment_request.status = PaymentRequest.UNKNOWN
+        payment_request.last_error = error[:255]
+        db.session.commit()
+
+    def _retry_or_fail(self, payment_request, error):
+        payment_request.last_error = error[:255]
+        if payment_request.attempts >= self.max_attempts:
+            payment_request.status = PaymentRequest.FAILED
+        else:
+            payment_request.status = PaymentRequest.QUEUED
+            payment_request.next_attempt_at = datetime.utcnow() + self.backoff(payment_request.attempts)
+        db.session.commit()
+        if payment_request.status == PaymentRequest.FAILED:
+            publish_payment_status(payment_request.idempotency_key)
+
+
+_dispatcher_lock = threading.Lock()
+
+
+def get_stk_dispatcher(app=None):
+    app = app or current_app._get_current_object()
+    dispatcher = app.extensions.get('stk_dispatcher')
+    if dispatcher is None:
+        with _dispatcher_lock:
+            dispatcher = app.extensions.get('stk_dispatcher')
+            if dispatcher is None:
+                dispatcher = StkDispatcher.from_config(app)
+                app.extensions['stk_dispatcher'] = dispatcher
+    return dispatcher
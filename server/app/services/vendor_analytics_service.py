@@ -0,0 +1,66 @@
+from app.extensions import db
+from app.models.rollup import DailySalesRollup, VendorSalesSummary
+from app.services.rollup_service import RollupService, ROLLUP_KEY, ROLLUP_MEASURES
+
+
+class VendorAnalyticsService:
+    """
+    Vendor dashboard figures from the materialised tables: lifetime totals
+    from vendor_sales_summary (one primary-key read) and the per-day series
+    from daily_sales_rollup. Both are written by RollupService.record_sales
+    inside the checkout and M-Pesa callback transactions.
+    """
+
+    # Float sums drift in the last digits depending on addition order
+    TOLERANCE = 0.01
+
+    @staticmethod
+    def summary(vendor_id):
+        row = db.session.get(VendorSalesSummary, vendor_id)
+        return {
+            "revenue": float(row.total_amount) if row else 0.0,
+            "order_count": int(row.sale_count) if row else 0,
+            "amount_cash": float(row.amount_cash) if row else 0.0,
+            "amount_mpesa": float(row.amount_mpesa) if row else 0.0
+        }
+
+    @staticmethod
+    def daily_series(vendor_id, start_day=None, end_day=None):
+        """[(day, total)] ordered by day."""
+        return RollupService.daily_series(start_day=start_day, end_day=end_day, vendor_id=vendor_id)
+
+    @staticmethod
+    def _differs(stored, expected):
+        return any(abs((a or 0) - (b or 0)) > VendorAnalyticsService.TOLERANCE for a, b in zip(stored, expected))
+
+    @staticmethod
+    def check():
+        """
+        Compares both tables with a full recompute from COMPLETED sales.
+        Returns [(table, key, stored, expected)] for every row that differs;
+        a missing row is reported with zeros on that side.
+        """
+        expected = RollupService.recompute()
+        zero = [0, 0.0, 0.0, 0.0]
+        mismatches = []
+
+        daily = {
+            tuple(getattr(r, c) for c in ROLLUP_KEY): [getattr(r, m) for m in ROLLUP_MEASURES]
+            for r in DailySalesRollup.query.all()
+        }
+        for key in sorted(set(daily) | set(expected), key=str):
+            stored, wanted = daily.get(key, zero), expected.get(key, zero)
+            if VendorAnalyticsService._differs(stored, wanted):
+                mismatches.append((DailySalesRollup.__tablename__, key, stored, wanted))
+
+        summary = {
+            r.vendor_id: [getattr(r, m) for m in ROLLUP_MEASURES]
+            for r in VendorSalesSummary.query.all()
+        }
+        vendor_expected = RollupService.vendor_totals(expected)
+        for vendor_id in sorted(set(summary) | set(vendor_expected)):
+            stored, wanted = summary.get(vendor_id, zero), vendor_expected.get(vendor_id, zero)
+            if VendorAnalyticsService._differs(stored, wanted):
+                mismatches.append((VendorSalesSummary.__tablename__, (vendor_id,), stored, wanted))
+
+        return mismatches
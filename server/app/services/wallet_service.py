@@ -1,16 +1,192 @@
-from app.models.wallet import Wallet
+import uuid
+from datetime import datetime
+from sqlalchemy import func, insert, update, and_
+from app.models.wallet import Wallet, Settlement
+from app.models.wallet_ledger import WalletLedger, WalletSnapshot
 from app.extensions import db
+from app.utils.upsert import insert_ignore
+
+
+class WalletError(Exception):
+    """Raised when a debit would overdraw the wallet; maps to a 400 response."""
+    pass
+
 
 class WalletService:
+    """
+    Every balance change goes through post(): one guarded
+    `UPDATE wallets SET current_balance = current_balance + :x` (no Python
+    read-modify-write, so concurrent callbacks and payouts cannot lose an
+    update or overdraw) plus a balanced pair of ledger rows, all in the
+    caller's transaction.
+    """
+
+    # Platform accounts on the other side of each wallet movement
+    COLLECTIONS = 'mpesa_collections'
+    PAYOUTS = 'payouts'
+
+    HISTORY_LABELS = {
+        'SALE': "Sale Revenue",
+        'PAYOUT': "Direct Payout",
+        'WITHDRAWAL': "Withdrawal Request",
+        'REFUND': "Refunded (Rejected)",
+        'ADJUSTMENT': "Adjustment",
+    }
+
+    @staticmethod
+    def ensure_wallet(vendor_id):
+        insert_ignore(Wallet, [{"vendor_id": vendor_id, "current_balance": 0.0}], ['vendor_id'])
+
+    @staticmethod
+    def _apply(vendor_id, amount):
+        """Atomically adds `amount` to the wallet. Returns (wallet_id, new_balance) or None if no row matched."""
+        balance = func.coalesce(Wallet.current_balance, 0.0)
+        stmt = update(Wallet).where(Wallet.vendor_id == vendor_id)
+        if amount < 0:
+            stmt = stmt.where(balance >= -amount)
+        stmt = stmt.values(current_balance=balance + amount, last_updated=datetime.utcnow())\
+            .execution_options(synchronize_session=False)
+
+        if db.session.get_bind().dialect.update_returning:
+            row = db.session.execute(stmt.returning(Wallet.id, Wallet.current_balance)).first()
+        else:
+            row = None
+            if db.session.execute(stmt).rowcount:
+                # The UPDATE holds the row lock, so this reads our own write
+                row = db.session.query(Wallet.id, Wallet.current_balance).filter(Wallet.vendor_id == vendor_id).first()
+        if row is None:
+            return None
+
+        # Loaded Wallet objects would otherwise keep the pre-update balance
+        for obj in db.session.identity_map.values():
+            if isinstance(obj, Wallet) and obj.id == row.id:
+                db.session.expire(obj, ['current_balance', 'last_updated'])
+        return row.id, float(row.current_balance)
+
+    @staticmethod
+    def post(vendor_id, amount, entry_type, contra, description=None, settlement_id=None, category=None):
+        """
+        Moves `amount` (credit > 0, debit < 0) between the vendor's wallet and
+        the platform account `contra`. Raises WalletError if a debit exceeds
+        the balance. Does not commit; returns the new balance.
+        """
+        amount = round(float(amount), 2)
+        applied = WalletService._apply(vendor_id, amount)
+        if applied is None and amount >= 0:
+            WalletService.ensure_wallet(vendor_id)
+            applied = WalletService._apply(vendor_id, amount)
+        if applied is None:
+            raise WalletError("Insufficient funds")
+
+        wallet_id, balance = applied
+        entry_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        common = {"entry_id": entry_id, "settlement_id": settlement_id, "type": entry_type,
+                  "category": category, "description": description, "created_at": now}
+        db.session.execute(insert(WalletLedger), [
+            dict(common, account='wallet', wallet_id=wallet_id, amount=amount, balance_after=balance),
+            dict(common, account=contra, wallet_id=None, amount=-amount, balance_after=None),
+        ])
+        return balance
+
     @staticmethod
-    def add_funds(vendor_id, amount):
-        """Adds funds to a vendor's wallet. Creates wallet if missing."""
-        wallet = Wallet.query.filter_by(vendor_id=vendor_id).first()
-        
-        if not wallet:
-            wallet = Wallet(vendor_id=vendor_id, current_balance=0.0)
-            db.session.add(wallet)
-        
-        wallet.current_balance += float(amount)
-        db.session.commit()
-        return wallet
\ No newline at end of file
+    def add_funds(vendor_id, amount, commit=True, entry_type='ADJUSTMENT', settlement_id=None, description=None):
+        """Credits a vendor's wallet, creating it if missing. Returns the new balance."""
+        balance = WalletService.post(vendor_id, amount, entry_type, WalletService.COLLECTIONS,
+                                     description=description, settlement_id=settlement_id)
+        if commit:
+            db.session.commit()
+        return balance
+
+    @staticmethod
+    def debit(vendor_id, amount, entry_type, settlement_id=None, description=None):
+        """Takes a payout or withdrawal out of the wallet. Raises WalletError on insufficient funds."""
+        return WalletService.post(vendor_id, -abs(float(amount)), entry_type, WalletService.PAYOUTS,
+                                  description=description, settlement_id=settlement_id)
+
+    @staticmethod
+    def transition(settlement_id, from_statuses, to_status, **values):
+        """
+        Moves a settlement out of one of `from_statuses` in a single guarded
+        UPDATE. False if another request got there first, so callers never
+        refund or pay out the same settlement twice.
+        """
+        result = db.session.execute(
+            update(Settlement)
+            .where(Settlement.id == settlement_id, Settlement.status.in_(list(from_statuses)))
+            .values(status=to_status, **values)
+            .execution_options(synchronize_session='fetch')
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    def history(vendor_id, limit=20):
+        """The vendor's latest wallet movements, newest first, off the (wallet_id, id) index."""
+        rows = db.session.query(WalletLedger, Settlement.status, Settlement.notes)\
+            .join(Wallet, Wallet.id == WalletLedger.wallet_id)\
+            .outerjoin(Settlement, Settlement.id == WalletLedger.settlement_id)\
+            .filter(Wallet.vendor_id == vendor_id)\
+            .order_by(WalletLedger.id.desc()).limit(limit).all()
+        return [{
+            "id": entry.id,
+            "amount": abs(float(entry.amount)),
+            "balance_after": float(entry.balance_after or 0),
+            "status": status or 'completed',
+            "date": entry.created_at.strftime("%Y-%m-%d %H:%M") if entry.created_at else "N/A",
+            "type": WalletService.HISTORY_LABELS.get(entry.type, "Transaction"),
+            "notes": entry.description or notes or ""
+        } for entry, status, notes in rows]
+
+    # Snapshots
+    @staticmethod
+    def _latest_snapshots():
+        latest = db.session.query(WalletSnapshot.wallet_id, func.max(WalletSnapshot.ledger_id).label('ledger_id'))\
+            .group_by(WalletSnapshot.wallet_id).subquery()
+        return db.session.query(WalletSnapshot).join(latest, and_(
+            WalletSnapshot.wallet_id == latest.c.wallet_id, WalletSnapshot.ledger_id == latest.c.ledger_id
+        ))
+
+    @staticmethod
+    def ledger_balance(wallet_id):
+        """Latest snapshot plus the wallet rows written after it."""
+        snapshot = WalletService._latest_snapshots().filter(WalletSnapshot.wallet_id == wallet_id).first()
+        since = snapshot.ledger_id if snapshot else 0
+        delta = db.session.query(func.sum(WalletLedger.amount))\
+            .filter(WalletLedger.wallet_id == wallet_id, WalletLedger.id > since).scalar() or 0.0
+        return (snapshot.balance if snapshot else 0.0) + delta
+
+    @staticmethod
+    def snapshot_all(tolerance=0.01):
+        """
+        Rolls every wallet's latest snapshot forward over the ledger rows
+        written since, in one grouped query. Returns (snapshots written,
+        [(wallet_id, ledger balance, current_balance)] for wallets whose
+        stored balance disagrees with the ledger). Caller commits.
+        """
+        previous = {s.wallet_id: s for s in WalletService._latest_snapshots().all()}
+        latest = db.session.query(WalletSnapshot.wallet_id, func.max(WalletSnapshot.ledger_id).label('ledger_id'))\
+            .group_by(WalletSnapshot.wallet_id).subquery()
+        rows = db.session.query(
+            WalletLedger.wallet_id, func.max(WalletLedger.id), func.count(WalletLedger.id), func.sum(WalletLedger.amount)
+        ).outerjoin(latest, latest.c.wallet_id == WalletLedger.wallet_id)\
+         .filter(WalletLedger.wallet_id.isnot(None), WalletLedger.id > func.coalesce(latest.c.ledger_id, 0))\
+         .group_by(WalletLedger.wallet_id).all()
+
+        now = datetime.utcnow()
+        for wallet_id, last_id, count, delta in rows:
+            before = previous.get(wallet_id)
+            snapshot = WalletSnapshot(
+                wallet_id=wallet_id, ledger_id=last_id, created_at=now,
+                balance=round((before.balance if before else 0.0) + (delta or 0.0), 2),
+                entry_count=(before.entry_count if before else 0) + count
+            )
+            db.session.add(snapshot)
+            previous[wallet_id] = snapshot
+
+        drift = []
+        for wallet_id, current in db.session.query(Wallet.id, Wallet.current_balance).all():
+            snapshot = previous.get(wallet_id)
+            ledger = snapshot.balance if snapshot else 0.0
+            if abs(ledger - (current or 0.0)) > tolerance:
+                drift.append((wallet_id, ledger, current or 0.0))
+        return len(rows), drift
@@ -0,0 +1,104 @@
+from datetime import datetime
+from sqlalchemy import func, insert, update
+from app.extensions import db
+from app.models.notification import Notification
+from app.models.user import User
+from app.models.wallet import Settlement
+from app.services.payout_dispatcher import PayoutDispatcher
+from app.services.wallet_service import WalletService
+
+
+class WithdrawalError(Exception):
+    """Raised when a review cannot be applied as asked; maps to a 400/409 response."""
+    pass
+
+
+class WithdrawalService:
+    ACTIONS = ('approve', 'reject')
+
+    @staticmethod
+    def payout_phone(vendor):
+        return vendor.withdrawal_mpesa_number or vendor.phone_number
+
+    @staticmethod
+    def review(settlement_ids, action, disburse=False):
+        """
+        Approves or rejects a selection of pending withdrawals in the
+        caller's transaction: one locking read, one guarded status UPDATE,
+        refunds for rejections, one notification insert and, when
+        `disburse` is set, one insert of B2C payouts for the dispatcher.
+        Ids that cannot be reviewed are skipped with a reason; the rest
+        succeed or fail together. Returns {"updated": [ids], "skipped":
+        [{"id", "msg"}], "total": amount, "queued": payouts}.
+        """
+        if action not in WithdrawalService.ACTIONS:
+            raise WithdrawalError(f"action must be one of {', '.join(WithdrawalService.ACTIONS)}")
+        try:
+            ids = list(dict.fromkeys(int(i) for i in settlement_ids))
+        except (TypeError, ValueError):
+            raise WithdrawalError("ids must be a list of withdrawal ids")
+
+        rows = db.session.query(Settlement, User)\
+            .join(User, User.id == Settlement.vendor_id)\
+            .filter(Settlement.id.in_(ids), Settlement.sale_id.is_(None))\
+            .order_by(Settlement.id).with_for_update(of=Settlement).all()
+        found = {settlement.id: (settlement, vendor) for settlement, vendor in rows}
+
+        accepted, skipped = [], []
+        for settlement_id in ids:
+            settlement, vendor = found.get(settlement_id, (None, None))
+            if settlement is None:
+                skipped.append({"id": settlement_id, "msg": "Withdrawal not found"})
+            elif settlement.status != 'pending':
+                skipped.append({"id": settlement_id, "msg": f"Withdrawal is already {settlement.status}"})
+            elif action == 'approve' and disburse and not WithdrawalService.payout_phone(vendor):
+                skipped.append({"id": settlement_id, "msg": "Vendor has no M-Pesa number"})
+            elif action == 'approve' and disburse and float(settlement.amount) != int(settlement.amount):
+                # B2C pays whole shillings; leave fractional amounts for a manual payout
+                skipped.append({"id": settlement_id, "msg": "B2C payouts must be whole shillings"})
+            else:
+                accepted.append((settlement, vendor))
+
+        result = {"updated": [s.id for s, _ in accepted], "skipped": skipped,
+                  "total": sum(float(s.amount) for s, _ in accepted), "queued": 0}
+        if not accepted:
+            return result
+
+        now = datetime.utcnow()
+        if action == 'reject':
+            values = {"status": 'rejected', "notes": func.coalesce(Settlement.notes, '') + " [Rejected by Admin]"}
+        elif disburse:
+            values = {"status": 'processing'}
+        else:
+            values = {"status": 'completed', "processed_at": now}
+
+        updated = db.session.execute(
+            update(Settlement)
+            .where(Settlement.id.in_(result["updated"]), Settlement.status == 'pending')
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated != len(accepted):
+            raise WithdrawalError("Withdrawals changed during review. Please retry.")
+
+        if action == 'reject':
+            for settlement, _ in accepted:
+                WalletService.add_funds(settlement.vendor_id, settlement.amount, commit=False, entry_type='REFUND',
+                                        settlement_id=settlement.id, description="Withdrawal rejected by admin")
+            message, kind = "was Rejected. Funds returned to wallet.", "error"
+        elif disburse:
+            result["queued"] = PayoutDispatcher.enqueue([
+                (settlement, WithdrawalService.payout_phone(vendor)) for settlement, vendor in accepted
+            ])
+            message, kind = "has been Approved and is being sent to M-Pesa.", "success"
+        else:
+            message, kind = "has been Approved and Processed.", "success"
+
+        db.session.execute(insert(Notification), [{
+            "user_id": settlement.vendor_id,
+            "message": f"Your withdrawal of KES {settlement.amount:,.2f} {message}",
+            "type": kind,
+            "is_read": False,
+            "created_at": now
+        } for settlement, _ in accepted])
+        return result
@@ -1,69 +1,196 @@
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
 from functools import wraps
-from flask import request
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask import request, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import insert
 from app.extensions import db
 from app.models.audit import AuditLog
-from app.models.user import User
+from app.utils.auth import current_tenant_id
+
+
+class AuditWriter:
+    """
+    Buffers audit events in memory and bulk-inserts them from a background
+    thread every AUDIT_FLUSH_MS, or sooner once AUDIT_BATCH_SIZE events are
+    waiting, so request handlers never pay for the write. Events carry their
+    own created_at, so late rows still sort by when the action happened.
+    What is left in the buffer is written on shutdown. If the buffer reaches
+    AUDIT_BUFFER_SIZE the recording request writes the backlog itself rather
+    than dropping events. A row that cannot be written is retried on the
+    next flushes and given up after MAX_ATTEMPTS.
+    """
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, app, flush_ms=500, batch_size=200, max_buffer=10000, enabled=True):
+        self.app = app
+        self.flush_interval = flush_ms / 1000.0
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.enabled = enabled
+        self.written = 0
+        self.failed = 0
+        self._buffer = deque()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(
+            app,
+            flush_ms=app.config.get('AUDIT_FLUSH_MS', 500),
+            batch_size=app.config.get('AUDIT_BATCH_SIZE', 200),
+            max_buffer=app.config.get('AUDIT_BUFFER_SIZE', 10000),
+            enabled=app.config.get('AUDIT_BUFFER_ENABLED', True)
+        )
+
+    # Lifecycle
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run_forever, name='audit-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        for _ in range(self.MAX_ATTEMPTS):
+            if not self._buffer:
+                break
+            self.flush()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    # Buffer
+    def record(self, action, user_id, vendor_id=None, details=None, ip_address=None):
+        """Queues one AuditLog row. Never touches the caller's session."""
+        self._buffer.append(({
+            "action": action,
+            "user_id": int(user_id),
+            "vendor_id": vendor_id,
+            "details": details[:255] if details else details,
+            "ip_address": ip_address,
+            "created_at": datetime.utcnow()
+        }, 0))
+        if not self.enabled or len(self._buffer) >= self.max_buffer:
+            self.flush()
+            return
+        self.ensure_started()
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def _take(self, limit):
+        batch = []
+        while self._buffer and len(batch) < min(limit, self.batch_size):
+            batch.append(self._buffer.popleft())
+        return batch
+
+    def flush(self):
+        """
+        Writes what is buffered now in batches of batch_size; rows that fail
+        are put back for the next flush. Returns the rows written.
+        """
+        written = 0
+        with self._flush_lock:
+            pending = len(self._buffer)
+            while pending > 0:
+                batch = self._take(pending)
+                if not batch:
+                    break
+                pending -= len(batch)
+                written += self.write(batch)
+        return written
+
+    def write(self, batch):
+        # A fresh app context gets its own session, so a request's pending work is never committed here
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(AuditLog), [row for row, _ in batch])
+                db.session.commit()
+                self.written += len(batch)
+                return len(batch)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Audit Writer Error: {e}")
+
+            # Retry row by row so one bad row (say, a deleted user) does not cost the rest
+            written = 0
+            for row, attempts in batch:
+                try:
+                    db.session.execute(insert(AuditLog), [row])
+                    db.session.commit()
+                    written += 1
+                except Exception as e:
+                    db.session.rollback()
+                    if attempts + 1 < self.MAX_ATTEMPTS:
+                        self._buffer.append((row, attempts + 1))
+                    else:
+                        self.failed += 1
+                        print(f"Audit Writer Error ({row['action']}): {e}")
+            self.written += written
+            return written
+
+
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer(app=None):
+    app = app or current_app._get_current_object()
+    writer = app.extensions.get('audit_writer')
+    if writer is None:
+        with _writer_lock:
+            writer = app.extensions.get('audit_writer')
+            if writer is None:
+                writer = AuditWriter.from_config(app)
+                app.extensions['audit_writer'] = writer
+    return writer
+
+
+def record_audit(action, user_id, details=None, vendor_id=None):
+    """Queues an audit event for the current request's user and address."""
+    if user_id is None:
+        return
+    get_audit_writer().record(action, user_id, vendor_id=vendor_id, details=details,
+                              ip_address=request.remote_addr)
+
 
 def audit_log(action_name):
     """
     Decorator to log actions automatically.
     Usage: @audit_log("Created Product")
+    Place it below @jwt_required(); only 2xx responses are logged.
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            print(f"🔍 AUDIT DEBUG: Starting audit wrapper for {action_name}")
-            
-            try:
-                response = f(*args, **kwargs)
-            except Exception as e:
-                print(f"❌ AUDIT DEBUG: Route failed with error: {e}")
-                raise e
-            
-            status_code = 200
+            response = f(*args, **kwargs)
+
             if isinstance(response, tuple):
                 status_code = response[1]
-            
-            print(f"🔍 AUDIT DEBUG: Route finished with Status {status_code}")
+            else:
+                status_code = getattr(response, 'status_code', 200)
 
             if 200 <= status_code < 300:
                 try:
-                    print("🔍 AUDIT DEBUG: Attempting to log to DB...")
-                    
-                    verify_jwt_in_request(optional=True)
-                    current_user_id = get_jwt_identity()
-                    print(f"🔍 AUDIT DEBUG: User ID found: {current_user_id}")
-                    
-                    if current_user_id:
-                        user = User.query.get(current_user_id)
-                        
-                        if user:
-                            owner_id = user.id if user.role == 'VENDOR' else user.vendor_id
-                            print(f"🔍 AUDIT DEBUG: User found: {user.name}, Owner ID: {owner_id}")
-                            
-                            log = AuditLog(
-                                action=action_name,
-                                user_id=user.id,
-                                vendor_id=owner_id,
-                                details=f"Path: {request.path}",
-                                ip_address=request.remote_addr
-                            )
-                            db.session.add(log)
-                            db.session.commit()
-                            print(f"✅ AUDIT SUCCESS: Logged '{action_name}' to DB")
-                        else:
-                            print("❌ AUDIT DEBUG: User ID exists in token but User not found in DB")
-                    else:
-                        print("❌ AUDIT DEBUG: No User ID in JWT")
-                        
+                    record_audit(action_name, get_jwt_identity(), details=f"Path: {request.path}",
+                                 vendor_id=current_tenant_id())
                 except Exception as e:
-                    print(f"❌ AUDIT CRASH: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-            else:
-                print("⚠️ AUDIT SKIP: Status code indicates failure, not logging.")
-            
+                    print(f"Audit Error: {e}")
+
             return response
         return decorated_function
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,79 @@
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt, current_user
+from app.extensions import db
+from app.models.user import User
+
+
+def tenant_id_for(user):
+    """The vendor account a user works under: themselves for vendors, their employer for staff."""
+    if not user:
+        return None
+    return user.id if (user.role or '').upper() == 'VENDOR' else user.vendor_id
+
+
+def user_claims(user):
+    """
+    Tenancy claims carried in the access token for clients and logs. Access
+    checks never trust them: see current_role() and current_tenant_id().
+    """
+    return {
+        "role": user.role,
+        "vendor_id": user.vendor_id,
+        "tenant_id": tenant_id_for(user),
+    }
+
+
+def load_user(jwt_header, jwt_data):
+    """
+    user_lookup_loader for flask_jwt_extended. Memoized per request, so the
+    route, its decorators and audit logging all share one User row.
+    """
+    return _request_user(jwt_data["sub"])
+
+
+def _request_user(user_id):
+    cache = g.setdefault('jwt_users', {})
+    key = str(user_id)
+    if key not in cache:
+        cache[key] = db.session.get(User, int(user_id))
+    return cache[key]
+
+
+def user_lookup_error(jwt_header, jwt_data):
+    return jsonify({"msg": "User not found"}), 401
+
+
+def register_user_loader(jwt):
+    jwt.user_lookup_loader(load_user)
+    jwt.user_lookup_error_loader(user_lookup_error)
+
+
+def _check_claim(name, actual):
+    """Logs a token whose claim no longer matches the user row (a demoted or moved user)."""
+    claims = get_jwt()
+    if name in claims and claims[name] != actual:
+        print(f"Stale token claim for user {current_user.id}: {name}={claims[name]!r}, now {actual!r}")
+
+
+def current_role():
+    """
+    Upper-cased role from the user row, which the JWT user loader has already
+    read for this request, so a demoted user loses access at once rather
+    than when their token expires.
+    """
+    role = current_user.role
+    _check_claim("role", role)
+    return (role or '').upper()
+
+
+def current_tenant_id():
+    """The current user's vendor account, from the user row (see current_role)."""
+    tenant_id = tenant_id_for(current_user)
+    _check_claim("tenant_id", tenant_id)
+    return tenant_id
+
+
+def current_tenant():
+    """The vendor row the current user works under, shared with the request's JWT user cache."""
+    tenant_id = current_tenant_id()
+    return _request_user(tenant_id) if tenant_id else None
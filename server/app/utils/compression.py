@@ -0,0 +1,74 @@
+import gzip
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/plain', 'text/csv', 'text/html', 'text/css',
+    'application/javascript', 'image/svg+xml',
+}
+
+
+class Compression:
+    """
+    Negotiated gzip/brotli for buffered text responses above COMPRESS_MIN_SIZE.
+    Streamed responses (CSV exports, SSE) and files (PDF receipts) pass
+    through untouched. Brotli is offered only when the package is installed.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_QUALITY', 5)
+
+        if app.config['COMPRESS_ENABLED']:
+            app.after_request(self._after_request)
+
+    @staticmethod
+    def choose_encoding(accept_encodings):
+        """'br', 'gzip' or None for the request's Accept-Encoding; br wins ties."""
+        options = [('gzip', accept_encodings.quality('gzip'))]
+        if brotli is not None:
+            options.insert(0, ('br', accept_encodings.quality('br')))
+        encoding, quality = max(options, key=lambda o: o[1])
+        return encoding if quality > 0 else None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=current_app.config['COMPRESS_BR_QUALITY'])
+        return gzip.compress(data, compresslevel=current_app.config['COMPRESS_LEVEL'], mtime=0)
+
+    def _after_request(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        response.set_data(self.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+
+        # A strong validator must differ per representation
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+
+compression = Compression()
@@ -29,4 +29,22 @@ def admin_role_required(*allowed_admin_roles):
 
             return fn(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+def role_required(*roles):
+    """
+    Restricts a @jwt_required() route to the given roles, read from the
+    request's user row (already loaded by the JWT user loader, so no extra
+    query) rather than from the token's claims.
+    """
+    allowed = [r.upper() for r in roles]
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            from app.utils.auth import current_role
+            if current_role() not in allowed:
+                return jsonify({"msg": f"Unauthorized. {' / '.join(r.title() for r in allowed)} access only."}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
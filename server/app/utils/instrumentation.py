@@ -0,0 +1,230 @@
+import hmac
+import ipaddress
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import g, request, has_request_context, Response, current_app, jsonify
+from sqlalchemy import event
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_WHITESPACE = re.compile(r'\s+')
+# "IN (?, ?, ?)" / "IN (%(p_1)s, %(p_2)s)" / "(?, ?), (?, ?)" all collapse to one shape
+_PARAM_LIST = re.compile(r'\((?:\s*(?:\?|%\([^)]*\)s|:\w+)\s*,?)+\)')
+_POSTCOMPILE = re.compile(r'__\[POSTCOMPILE_\w+\]')
+
+
+def statement_shape(statement):
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _POSTCOMPILE.sub('?', shape)
+    return _PARAM_LIST.sub('(?)', shape)
+
+
+class RequestStats:
+    __slots__ = ('started', 'query_count', 'db_time', 'shapes', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.slowest = []
+
+    def record(self, statement, duration, keep=3):
+        self.query_count += 1
+        self.db_time += duration
+        self.shapes[statement_shape(statement)] += 1
+        if len(self.slowest) < keep or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement))
+            self.slowest.sort(key=lambda s: s[0], reverse=True)
+            del self.slowest[keep:]
+
+
+class MetricsRegistry:
+    """Per-process counters rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.duration_sum = defaultdict(float)
+        self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.queries = Counter()
+        self.queries_buckets = defaultdict(lambda: [0] * len(QUERY_BUCKETS))
+        self.db_time = defaultdict(float)
+        self.slow_queries = Counter()
+        self.n_plus_one = Counter()
+
+    def observe(self, endpoint, method, status, wall, stats, slow, repeated):
+        with self._lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            self.duration_sum[endpoint] += wall
+            buckets = self.duration_buckets[endpoint]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if wall <= bound:
+                    buckets[i] += 1
+            self.queries[endpoint] += stats.query_count
+            q_buckets = self.queries_buckets[endpoint]
+            for i, bound in enumerate(QUERY_BUCKETS):
+                if stats.query_count <= bound:
+                    q_buckets[i] += 1
+            self.db_time[endpoint] += stats.db_time
+            self.slow_queries[endpoint] += slow
+            self.n_plus_one[endpoint] += repeated
+
+    def render(self):
+        out = []
+
+        def header(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, bounds, buckets, sums):
+            for endpoint in sorted(buckets):
+                count = sum(c for (e, _, _), c in self.requests.items() if e == endpoint)
+                for bound, value in zip(bounds, buckets[endpoint]):
+                    out.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {value}')
+                out.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {count}')
+                out.append(f'{name}_sum{{endpoint="{endpoint}"}} {sums[endpoint]}')
+                out.append(f'{name}_count{{endpoint="{endpoint}"}} {count}')
+
+        with self._lock:
+            header('radapos_http_requests_total', 'counter', 'HTTP requests handled.')
+            for (endpoint, method, status), value in sorted(self.requests.items()):
+                out.append(f'radapos_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {value}')
+
+            header('radapos_http_request_duration_seconds', 'histogram', 'Time to build the response.')
+            histogram('radapos_http_request_duration_seconds', DURATION_BUCKETS,
+                      self.duration_buckets, self.duration_sum)
+
+            header('radapos_db_queries_per_request', 'histogram', 'SQL statements executed per request.')
+            histogram('radapos_db_queries_per_request', QUERY_BUCKETS, self.queries_buckets, self.queries)
+
+            header('radapos_db_query_seconds_total', 'counter', 'Time spent in SQL statements.')
+            for endpoint, value in sorted(self.db_time.items()):
+                out.append(f'radapos_db_query_seconds_total{{endpoint="{endpoint}"}} {value}')
+
+            header('radapos_db_slow_queries_total', 'counter', 'Statements slower than SLOW_QUERY_MS.')
+            for endpoint, value in sorted(self.slow_queries.items()):
+                out.append(f'radapos_db_slow_queries_total{{endpoint="{endpoint}"}} {value}')
+
+            header('radapos_db_n_plus_one_total', 'counter', 'Requests that repeated one statement shape past N_PLUS_ONE_THRESHOLD.')
+            for endpoint, value in sorted(self.n_plus_one.items()):
+                out.append(f'radapos_db_n_plus_one_total{{endpoint="{endpoint}"}} {value}')
+
+        return "\n".join(out) + "\n"
+
+
+class Instrumentation:
+    """
+    Per-request SQL accounting. Engine events time every statement run while
+    a request is active; the request hooks turn that into a Server-Timing
+    header, slow query and N+1 log lines, and the counters behind /metrics.
+    Counters are per process, so each gunicorn worker reports its own.
+    """
+
+    def __init__(self, app=None):
+        self.metrics = MetricsRegistry()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION_ENABLED', True)
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', 10)
+        app.config.setdefault('METRICS_ENABLED', False)
+        app.config.setdefault('METRICS_TOKEN', '')
+        app.config.setdefault('METRICS_ALLOWED_IPS', '')
+
+        if not app.config['INSTRUMENTATION_ENABLED']:
+            return
+
+        from app.extensions import db
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        if app.config['METRICS_ENABLED']:
+            app.add_url_rule('/metrics', 'metrics', self.metrics_view, methods=['GET'])
+
+    # Engine hooks
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_start')
+        if not started:
+            return
+        duration = time.perf_counter() - started.pop()
+        if has_request_context():
+            stats = g.get('sql_stats')
+            if stats is not None:
+                stats.record(statement, duration)
+
+    # Request hooks
+    @staticmethod
+    def _before_request():
+        g.sql_stats = RequestStats()
+
+    def _after_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+
+        from flask import current_app
+        wall = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+
+        slow_ms = current_app.config['SLOW_QUERY_MS']
+        slow = [(d, s) for d, s in stats.slowest if d * 1000 >= slow_ms]
+        for duration, statement in slow:
+            print(f"Slow Query ({endpoint}, {duration * 1000:.1f}ms): {_WHITESPACE.sub(' ', statement)[:300]}")
+
+        threshold = current_app.config['N_PLUS_ONE_THRESHOLD']
+        repeated = [(shape, n) for shape, n in stats.shapes.items() if n > threshold]
+        for shape, n in repeated:
+            print(f"N+1 Warning ({endpoint}): {n}x {shape[:300]}")
+
+        if endpoint != 'metrics':
+            self.metrics.observe(endpoint, request.method, response.status_code, wall,
+                                 stats, len(slow), 1 if repeated else 0)
+
+        response.headers.add('Server-Timing', ", ".join([
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.query_count} queries"',
+            f'app;dur={(wall - stats.db_time) * 1000:.2f}',
+            f'total;dur={wall * 1000:.2f}',
+        ]))
+        return response
+
+    @staticmethod
+    def _metrics_allowed():
+        """Bearer METRICS_TOKEN or a client inside METRICS_ALLOWED_IPS; with neither configured, nobody."""
+        token = current_app.config['METRICS_TOKEN']
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            if hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+                return True
+
+        allowed = [n.strip() for n in current_app.config['METRICS_ALLOWED_IPS'].split(',') if n.strip()]
+        if allowed and request.remote_addr:
+            try:
+                addr = ipaddress.ip_address(request.remote_addr)
+            except ValueError:
+                return False
+            return any(addr in ipaddress.ip_network(n, strict=False) for n in allowed)
+        return False
+
+    def metrics_view(self):
+        if not self._metrics_allowed():
+            return jsonify({"msg": "Forbidden"}), 403
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+instrumentation = Instrumentation()
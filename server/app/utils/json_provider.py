@@ -0,0 +1,38 @@
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Dates still go through Flask's encoder so the wire format is unchanged
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Compact, unsorted JSON for every jsonify() response, encoded with orjson
+    when it is installed and the stdlib json module otherwise.
+    """
+    compact = True
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS), mimetype=self.mimetype
+        )
@@ -2,18 +2,13 @@ import requests
 import base64
 from datetime import datetime
 from flask import current_app
+from app.services.daraja_client import get_daraja_client
 
 class MpesaClient:
     @staticmethod
     def get_access_token():
-        consumer_key = current_app.config.get('MPESA_CONSUMER_KEY')
-        consumer_secret = current_app.config.get('MPESA_CONSUMER_SECRET')
-        api_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-        
         try:
-            r = requests.get(api_url, auth=(consumer_key, consumer_secret))
-            r.raise_for_status()
-            return r.json()['access_token']
+            return get_daraja_client().get_access_token()
         except Exception:
             return None
 
@@ -49,13 +44,8 @@ class MpesaClient:
             "TransactionDesc": "POS Payment"
         }
 
-        headers = { "Authorization": f"Bearer {token}" }
-        
         try:
-            response = requests.post(
-                'https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest',
-                json=payload, headers=headers
-            )
+            response = get_daraja_client().stk_push(payload)
             return response.json()
         except requests.exceptions.RequestException as e:
             if e.response is not None:
@@ -0,0 +1,30 @@
+import base64
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def get_page_size(raw_limit, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamps a ?limit= query value to the server-side bounds."""
+    try:
+        limit = int(raw_limit) if raw_limit not in (None, '') else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque keyset cursor for (created_at, id) ordered listings."""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode('utf-8')
+
+
+def decode_cursor(token):
+    """Returns (created_at, id) or raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode('utf-8')
+        ts, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
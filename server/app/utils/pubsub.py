@@ -0,0 +1,109 @@
+import select
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from sqlalchemy import text
+from app.extensions import db
+
+PAYMENT_STATUS_CHANNEL = 'payment_status'
+
+
+class PubSubHub:
+    """
+    Minimal in-process wake-up hub. Subscribers wait on a key; publishers
+    only say "something changed for this key" and the subscriber re-reads
+    the database, so no payloads are held here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, key):
+        event = threading.Event()
+        with self._lock:
+            self._waiters[key].add(event)
+        try:
+            yield event
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def notify_local(self, key):
+        with self._lock:
+            waiters = list(self._waiters.get(key, ()))
+        for event in waiters:
+            event.set()
+
+
+payment_events = PubSubHub()
+
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def publish_payment_status(*keys):
+    """
+    Wakes every till waiting on one of `keys` (a checkout handle or Daraja
+    CheckoutRequestID). Call after the status change is committed. On
+    Postgres the keys also go out through NOTIFY, so waiters in other
+    gunicorn workers wake too.
+    """
+    keys = [k for k in keys if k]
+    for key in keys:
+        payment_events.notify_local(key)
+
+    if keys and _is_postgres():
+        try:
+            for key in keys:
+                db.session.execute(text("SELECT pg_notify(:channel, :key)"),
+                                   {"channel": PAYMENT_STATUS_CHANNEL, "key": key})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Payment NOTIFY Error: {e}")
+
+
+def ensure_payment_listener(app):
+    """Starts (once per process) the LISTEN thread that relays Postgres NOTIFYs locally."""
+    global _listener_started
+    if _listener_started or not _is_postgres():
+        return
+    with _listener_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+        threading.Thread(target=_listen_forever, args=(app,), name='payment-listener', daemon=True).start()
+
+
+def _listen_forever(app):
+    while True:
+        try:
+            with app.app_context():
+                raw = db.engine.raw_connection()
+            try:
+                conn = raw.driver_connection
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {PAYMENT_STATUS_CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        payment_events.notify_local(conn.notifies.pop(0).payload)
+            finally:
+                raw.invalidate()
+        except Exception as e:
+            print(f"Payment Listener Error: {e}")
+            time.sleep(5)
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from app.extensions import db
+from app.models.transaction import Sale, SaleItem, MpesaPayment
+from app.models.product import Product
+from app.models.catalog import ProductTombstone
+from app.models.notification import Notification
+from app.models.audit import AuditLog
+from app.models.wallet import Settlement
+from app.models.wallet_ledger import WalletLedger
+from app.models.user import User
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN wrapper so bind parameters go through the dialect as usual."""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = "EXPLAIN QUERY PLAN " if compiler.dialect.name == 'sqlite' else "EXPLAIN "
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def hot_queries():
+    """(name, query) pairs mirroring the predicates the dashboards and lists use."""
+    since = datetime.utcnow() - timedelta(days=7)
+    return [
+        ("cashier completed sales", db.session.query(func.sum(Sale.total_amount))
+            .filter(Sale.cashier_id == 1, Sale.status == 'COMPLETED', Sale.created_at >= since)),
+        ("completed sales by date", db.session.query(Sale.id)
+            .filter(Sale.status == 'COMPLETED', Sale.created_at >= since)),
+        ("transactions page", db.session.query(Sale.id)
+            .order_by(Sale.created_at.desc(), Sale.id.desc()).limit(50)),
+        ("sale items", db.session.query(SaleItem.id).filter(SaleItem.sale_id.in_([1, 2, 3]))),
+        ("vendor sales", db.session.query(Sale.id).join(SaleItem).join(Product)
+            .filter(Product.vendor_id == 2, Sale.status == 'COMPLETED')),
+        ("event sales", db.session.query(func.sum(Sale.total_amount))
+            .filter(Sale.event_id == 1, Sale.status == 'COMPLETED', Sale.created_at >= since)),
+        ("vendor event sales", db.session.query(Sale.event_id, func.sum(Sale.total_amount))
+            .filter(Sale.vendor_id == 2, Sale.status == 'COMPLETED').group_by(Sale.event_id)),
+        ("event sale items", db.session.query(SaleItem.product_id).filter(SaleItem.event_id == 1)),
+        ("vendor products", db.session.query(Product.id).filter(Product.vendor_id == 2)),
+        ("low stock", db.session.query(Product.id)
+            .filter(Product.vendor_id == 2, Product.stock_quantity <= 5)),
+        ("catalog delta", db.session.query(Product.id)
+            .filter(Product.vendor_id == 2, Product.catalog_version > 10)),
+        ("catalog tombstones", db.session.query(ProductTombstone.product_id)
+            .filter(ProductTombstone.vendor_id == 2, ProductTombstone.version > 10)),
+        ("notifications", db.session.query(Notification.id).filter(Notification.user_id == 2)
+            .order_by(Notification.created_at.desc()).limit(50)),
+        ("unread notifications", db.session.query(Notification.id)
+            .filter(Notification.user_id == 2, Notification.is_read.is_(False))),
+        ("audit log", db.session.query(AuditLog.id).order_by(AuditLog.created_at.desc()).limit(100)),
+        ("vendor audit log", db.session.query(AuditLog.id).filter(AuditLog.vendor_id == 2)
+            .order_by(AuditLog.created_at.desc())),
+        ("pending withdrawals", db.session.query(func.count(Settlement.id))
+            .filter(Settlement.sale_id.is_(None), Settlement.status.in_(['processing', 'pending']))),
+        ("vendor settlements", db.session.query(Settlement.id)
+            .filter(Settlement.vendor_id == 2, Settlement.status == 'pending')),
+        ("wallet history", db.session.query(WalletLedger.id).filter(WalletLedger.wallet_id == 2)
+            .order_by(WalletLedger.id.desc()).limit(20)),
+        ("wallet ledger since snapshot", db.session.query(func.sum(WalletLedger.amount))
+            .filter(WalletLedger.wallet_id == 2, WalletLedger.id > 100)),
+        ("vendor staff", db.session.query(User.id).filter(User.role == 'CASHIER', User.vendor_id == 2)),
+        ("vendors", db.session.query(User.id).filter(User.role == 'VENDOR')),
+        ("sale M-Pesa payment", db.session.query(MpesaPayment.id)
+            .filter(MpesaPayment.sale_id == 1, MpesaPayment.result_code == 0)),
+    ]
+
+
+def full_scans(plan_lines, dialect_name):
+    """Tables the plan reads end to end without an index."""
+    tables = set(db.metadata.tables)
+    scanned = set()
+    for line in plan_lines:
+        if dialect_name == 'sqlite':
+            parts = line.split()
+            if len(parts) >= 2 and parts[0] == 'SCAN' and 'USING' not in parts and parts[1] in tables:
+                scanned.add(parts[1])
+        elif 'Seq Scan on ' in line:
+            table = line.split('Seq Scan on ', 1)[1].split()[0]
+            if table in tables:
+                scanned.add(table)
+    return sorted(scanned)
+
+
+def explain(query):
+    dialect_name = db.engine.dialect.name
+    if dialect_name == 'postgresql':
+        # Seeded databases are small enough for the planner to prefer a seq
+        # scan anyway; this asks whether an index *can* serve the query.
+        db.session.execute(text("SET LOCAL enable_seqscan = off"))
+    rows = db.session.execute(Explain(query.statement)).all()
+    plan = [row[-1] for row in rows] if dialect_name == 'sqlite' else [row[0] for row in rows]
+    return plan, full_scans(plan, dialect_name)
+
+
+def check_query_plans():
+    """[(name, plan_lines, fully_scanned_tables)] for every hot query."""
+    results = []
+    try:
+        for name, query in hot_queries():
+            plan, scans = explain(query)
+            results.append((name, plan, scans))
+    finally:
+        db.session.rollback()
+    return results
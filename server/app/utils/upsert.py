@@ -0,0 +1,94 @@
+from sqlalchemy import insert, update, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+
+_DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def dialect_insert(model):
+    """ON CONFLICT-capable insert for Postgres/SQLite, or None on other backends."""
+    insert_fn = _DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+    return insert_fn(model) if insert_fn else None
+
+
+def insert_ignore(model, rows, conflict_cols):
+    """
+    Inserts `rows` (list of dicts) in one statement, silently skipping any
+    that collide on the unique `conflict_cols`. Falls back to a single
+    existence query plus an insert of the missing rows elsewhere.
+    """
+    if not rows:
+        return
+
+    stmt = dialect_insert(model)
+    if stmt is not None:
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=conflict_cols), rows)
+        return
+
+    columns = [getattr(model, c) for c in conflict_cols]
+    keys = {tuple(r[c] for c in conflict_cols) for r in rows}
+    existing = set(
+        db.session.query(*columns)
+        .filter(tuple_(*columns).in_(list(keys)))
+        .all()
+    )
+    missing = [r for r in rows if tuple(r[c] for c in conflict_cols) not in existing]
+    if missing:
+        db.session.execute(insert(model), missing)
+
+
+def upsert_increment(model, row, conflict_cols, increment_cols):
+    """
+    Inserts `row`, or adds its `increment_cols` onto the existing row that
+    shares the unique `conflict_cols`, in a single statement where supported.
+    """
+    stmt = dialect_insert(model)
+    if stmt is not None:
+        stmt = stmt.values(**row)
+        table = model.__table__
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=conflict_cols,
+            set_={c: table.c[c] + stmt.excluded[c] for c in increment_cols}
+        ))
+        return
+
+    existing = model.query.filter_by(**{c: row[c] for c in conflict_cols}).with_for_update().first()
+    if existing:
+        for c in increment_cols:
+            setattr(existing, c, getattr(existing, c) + row[c])
+    else:
+        db.session.add(model(**row))
+
+
+def upsert_rows(model, rows, conflict_cols, update_cols):
+    """
+    Inserts `rows`, overwriting `update_cols` on any row that collides on the
+    unique `conflict_cols`. One executemany where supported; elsewhere a
+    single existence query splits the batch into inserts and updates.
+    """
+    if not rows:
+        return
+
+    stmt = dialect_insert(model)
+    if stmt is not None:
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=conflict_cols,
+            set_={c: stmt.excluded[c] for c in update_cols}
+        ), rows)
+        return
+
+    columns = [getattr(model, c) for c in conflict_cols]
+    keys = [tuple(r[c] for c in conflict_cols) for r in rows]
+    existing = {
+        tuple(row[:-1]): row[-1] for row in
+        db.session.query(*columns, model.id).filter(tuple_(*columns).in_(keys)).all()
+    }
+    updates = [dict({c: r[c] for c in update_cols}, id=existing[k]) for r, k in zip(rows, keys) if k in existing]
+    inserts = [r for r, k in zip(rows, keys) if k not in existing]
+    if updates:
+        db.session.execute(update(model), updates)
+    if inserts:
+        db.session.execute(insert(model), inserts)
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the Safaricom Daraja API so STK/B2C paths can be
+benchmarked without the sandbox. Answers the OAuth, STK push and B2C calls
+with well-formed success bodies after an optional artificial latency.
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class DarajaStub:
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.calls = {"token": 0, "stk": 0, "b2c": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+            return next(self._ids)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                n = stub._count('token')
+                self._reply({"access_token": f"stub-token-{n}", "expires_in": "3599"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if 'stkpush' in self.path:
+                    n = stub._count('stk')
+                    self._reply({
+                        "MerchantRequestID": f"stub-mr-{n}",
+                        "CheckoutRequestID": f"ws_CO_stub_{n}",
+                        "ResponseCode": "0",
+                        "ResponseDescription": "Success. Request accepted for processing",
+                        "CustomerMessage": "Success. Request accepted for processing"
+                    })
+                else:
+                    n = stub._count('b2c')
+                    self._reply({
+                        "ConversationID": f"AG_stub_{n}",
+                        "OriginatorConversationID": f"stub-oc-{n}",
+                        "ResponseCode": "0",
+                        "ResponseDescription": "Accept the service request successfully."
+                    })
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='daraja-stub', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
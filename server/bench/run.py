@@ -0,0 +1,320 @@
+"""
+RadaPOS API benchmark.
+
+Seeds a database (once), then drives the hot endpoints and reports latency
+percentiles, throughput and SQL queries per request. Results are written as
+JSON so runs can be compared across commits.
+
+    cd server
+    python -m bench.run --vendors 1000 --sales 1000000        # seed + run everything
+    python -m bench.run --skip-seed --scenarios checkout,receipt_pdf -n 500
+    python -m bench.run --db postgresql://... --target http://127.0.0.1:8000
+
+By default requests go through Flask's test client in this process, which
+also lets us count queries. With --target they go over HTTP to a running
+server (e.g. `gunicorn --worker-class gthread --threads 8 run:app`) that
+must point at the same database; queries per request are not available then.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import event
+
+from config import Config
+from app import create_app
+from app.extensions import db
+from bench.daraja_stub import DarajaStub
+from bench.seed import seed, fixtures
+
+DEFAULT_DB = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'radapos_bench.db')}"
+SCENARIOS = [
+    'checkout', 'transactions_list', 'vendor_stats', 'admin_stats',
+    'receipt_pdf', 'receipt_text', 'mpesa_callback_storm', 'stk_push'
+]
+
+
+class QueryCounter:
+    """Counts SQL statements per thread, so each request can read its own tally."""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    def read(self):
+        return getattr(self._local, 'count', 0)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Runner:
+    def __init__(self, app, fx, target=None, concurrency=1, rng_seed=7):
+        self.app = app
+        self.fx = fx
+        self.target = target.rstrip('/') if target else None
+        self.concurrency = concurrency
+        self.rng = random.Random(rng_seed)
+        self._local = threading.local()
+
+        with app.app_context():
+            self.counter = QueryCounter(db.engine) if not target else None
+            from flask_jwt_extended import create_access_token
+            from app.models.user import User
+            users = {u.id: u.role for u in User.query.filter(
+                User.id.in_([fx['admin']] + fx['vendors'] + [c for ids in fx['cashiers'].values() for c in ids])
+            ).all()}
+            self.tokens = {uid: create_access_token(identity=str(uid), additional_claims={"role": role})
+                           for uid, role in users.items()}
+
+    # Transport
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            if self.target:
+                import requests
+                client = requests.Session()
+            else:
+                client = self.app.test_client()
+            self._local.client = client
+        return client
+
+    def request(self, method, path, user_id=None, json_body=None):
+        headers = {"Authorization": f"Bearer {self.tokens[user_id]}"} if user_id else {}
+        client = self._client()
+        if self.counter:
+            self.counter.reset()
+
+        start = time.perf_counter()
+        if self.target:
+            resp = client.request(method, f"{self.target}{path}", json=json_body, headers=headers)
+            status, size = resp.status_code, len(resp.content)
+        else:
+            resp = client.open(path, method=method, json=json_body, headers=headers)
+            status, size = resp.status_code, len(resp.get_data())
+        elapsed = time.perf_counter() - start
+
+        queries = self.counter.read() if self.counter else None
+        return elapsed, status, size, queries
+
+    # Request builders: each returns (method, path, user_id, json_body)
+    def _cashier(self):
+        vendor_id = self.rng.choice(self.fx['vendors'])
+        return vendor_id, self.rng.choice(self.fx['cashiers'][vendor_id])
+
+    def build_checkout(self, i):
+        vendor_id, cashier_id = self._cashier()
+        lines = self.rng.sample(self.fx['products'][vendor_id], self.rng.randint(1, 4))
+        items = [{"id": pid, "quantity": self.rng.randint(1, 3)} for pid, _ in lines]
+        return 'POST', '/api/transactions/', cashier_id, {"items": items, "payment_method": 'CASH'}
+
+    def build_transactions_list(self, i):
+        return 'GET', '/api/transactions/?limit=50', self.rng.choice(self.fx['vendors']), None
+
+    def build_vendor_stats(self, i):
+        return 'GET', '/api/vendor/stats', self.rng.choice(self.fx['vendors']), None
+
+    def build_admin_stats(self, i):
+        return 'GET', '/api/admin/stats', self.fx['admin'], None
+
+    def _sale_id(self):
+        lo, hi = self.fx['sale_range']
+        return self.rng.randint(lo, hi)
+
+    def build_receipt_pdf(self, i):
+        return 'GET', f"/api/mpesa/receipt/{self._sale_id()}", None, None
+
+    def build_receipt_text(self, i):
+        return 'GET', f"/api/mpesa/receipt/{self._sale_id()}?format=text", None, None
+
+    def build_mpesa_callback_storm(self, i):
+        # Every callback is delivered twice, as Safaricom does on slow acks
+        pending = self.fx['pending_checkouts']
+        checkout_id = pending[(i // 2) % len(pending)]
+        return 'POST', '/api/mpesa/callback', None, {"Body": {"stkCallback": {
+            "MerchantRequestID": f"mr_{checkout_id}",
+            "CheckoutRequestID": checkout_id,
+            "ResultCode": 0,
+            "ResultDesc": "The service request is processed successfully.",
+            "CallbackMetadata": {"Item": [
+                {"Name": "Amount", "Value": 1},
+                {"Name": "MpesaReceiptNumber", "Value": f"RB{i:08d}"},
+                {"Name": "PhoneNumber", "Value": 254700000000}
+            ]}
+        }}}
+
+    def build_stk_push(self, i):
+        _, cashier_id = self._cashier()
+        return 'POST', '/api/mpesa/pay', cashier_id, {
+            "sale_id": self._sale_id(), "amount": 1, "phone_number": "254700000000",
+            "idempotency_key": f"bench-{os.getpid()}-{time.time_ns()}-{i}"
+        }
+
+    # Driving
+    def run(self, name, count):
+        build = getattr(self, f"build_{name}")
+        plans = [build(i) for i in range(count)]
+
+        def one(plan):
+            method, path, user_id, body = plan
+            return self.request(method, path, user_id, body)
+
+        with self.app.app_context():
+            one(plans[0])  # warm-up: imports, pools, token caches
+
+        start = time.perf_counter()
+        if self.concurrency > 1:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                samples = list(pool.map(one, plans))
+        else:
+            samples = [one(plan) for plan in plans]
+        wall = time.perf_counter() - start
+
+        latencies = sorted(s[0] * 1000 for s in samples)
+        queries = [s[3] for s in samples if s[3] is not None]
+        errors = sum(1 for s in samples if s[1] >= 400)
+        return {
+            "requests": count,
+            "concurrency": self.concurrency,
+            "errors": errors,
+            "status_codes": sorted({s[1] for s in samples}),
+            "throughput_rps": round(count / wall, 2) if wall else None,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 3),
+                "p50": round(percentile(latencies, 50), 3),
+                "p90": round(percentile(latencies, 90), 3),
+                "p99": round(percentile(latencies, 99), 3),
+                "max": round(latencies[-1], 3),
+            },
+            "queries_per_request": {
+                "mean": round(sum(queries) / len(queries), 2),
+                "max": max(queries),
+            } if queries else None,
+            "bytes_per_response": round(sum(s[2] for s in samples) / len(samples), 1),
+        }
+
+
+def make_config(db_uri, stub_url):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = db_uri
+        MPESA_BASE_URL = stub_url
+        MPESA_CONSUMER_KEY = 'bench-key'
+        MPESA_CONSUMER_SECRET = 'bench-secret'
+        MPESA_SHORTCODE = '174379'
+        MPESA_PASSKEY = 'bench-passkey'
+        MPESA_CALLBACK_URL = 'http://127.0.0.1/api/mpesa/callback'
+    return BenchConfig
+
+
+def print_table(results):
+    header = f"{'scenario':<22}{'req':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'q/req':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        q = r['queries_per_request']['mean'] if r['queries_per_request'] else '-'
+        print(f"{name:<22}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>10}"
+              f"{r['latency_ms']['p50']:>10}{r['latency_ms']['p99']:>10}{q:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RadaPOS API")
+    parser.add_argument('--db', default=os.environ.get('BENCH_DATABASE_URL', DEFAULT_DB))
+    parser.add_argument('--target', help="Base URL of a running server; default is in-process")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('-n', '--requests', type=int, default=200, help="Requests per scenario")
+    parser.add_argument('-c', '--concurrency', type=int, default=1)
+    parser.add_argument('--vendors', type=int, default=50)
+    parser.add_argument('--cashiers-per-vendor', type=int, default=3)
+    parser.add_argument('--products-per-vendor', type=int, default=40)
+    parser.add_argument('--sales', type=int, default=20000)
+    parser.add_argument('--pending-mpesa', type=int, default=2000)
+    parser.add_argument('--skip-seed', action='store_true', help="Reuse an already seeded database")
+    parser.add_argument('--daraja-latency', type=float, default=0.0, help="Seconds the Daraja stub waits per call")
+    parser.add_argument('--output', help="JSON results path (default bench/results/<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+
+    names = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    stub = DarajaStub(latency=args.daraja_latency).start()
+    app = create_app(make_config(args.db, stub.url))
+
+    with app.app_context():
+        fx = fixtures() if args.skip_seed else None
+        if fx is None:
+            db.create_all()
+            if fixtures() is not None:
+                parser.error("Database is already seeded; pass --skip-seed or point --db elsewhere")
+            started = time.perf_counter()
+            fx = seed(vendors=args.vendors, cashiers_per_vendor=args.cashiers_per_vendor,
+                      products_per_vendor=args.products_per_vendor, sales=args.sales,
+                      pending_mpesa=args.pending_mpesa)
+            print(f"Seeded in {time.perf_counter() - started:.1f}s")
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    runner = Runner(app, fx, target=args.target, concurrency=args.concurrency)
+    results = {}
+    for name in names:
+        print(f"Running {name} ...")
+        results[name] = runner.run(name, args.requests)
+    if 'stk_push' in results:
+        results['stk_push']['daraja_calls'] = dict(stub.calls)
+    stub.stop()
+
+    print_table(results)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + 'Z',
+            "python": platform.python_version(),
+            "database": dialect,
+            "target": args.target or 'in-process',
+            "seed": {
+                "vendors": len(fx['vendors']),
+                "sales_id_range": list(fx['sale_range']),
+            },
+        },
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), 'results',
+        f"{report['meta']['commit'] or 'local'}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Bulk seeding for benchmarks. Rows go in through core executemany batches,
+one password hash is shared by every seeded user, and the daily rollup is
+rebuilt at the end, so a million-sale database takes minutes, not hours.
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from app.extensions import db
+from app.models import User, Product, Sale, SaleItem, MpesaPayment
+from app.services.rollup_service import RollupService
+
+BENCH_PASSWORD = 'bench-pass'
+BATCH = 5000
+
+
+def _chunks(rows, size=BATCH):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _insert(model, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(insert(model), chunk)
+
+
+def seed(vendors=50, cashiers_per_vendor=3, products_per_vendor=40, sales=20000,
+         max_items=4, days=90, pending_mpesa=2000, rng_seed=42, log=print):
+    """
+    Fills an empty database and returns the fixture ids the scenarios need:
+    {"admin": id, "vendors": [...], "cashiers": {vendor_id: [...]},
+     "products": {vendor_id: [(id, price), ...]}, "pending_checkouts": [...]}.
+    """
+    rng = random.Random(rng_seed)
+    probe = User()
+    probe.set_password(BENCH_PASSWORD)
+    hashed = probe.password
+
+    admin = User(email='admin@bench.local', role='ADMIN', name='Bench Admin', password=hashed)
+    db.session.add(admin)
+    db.session.flush()
+
+    log(f"Seeding {vendors} vendors ...")
+    _insert(User, [{
+        "email": f"vendor{v}@bench.local", "password": hashed, "role": 'VENDOR',
+        "name": f"Vendor {v}", "business_name": f"Bench Shop {v}", "phone_number": f"2547{v:08d}"
+    } for v in range(vendors)])
+    vendor_ids = [row.id for row in db.session.query(User.id).filter(User.role == 'VENDOR')
+                  .order_by(User.id).all()]
+
+    _insert(User, [{
+        "email": f"cashier{v}-{c}@bench.local", "password": hashed, "role": 'CASHIER',
+        "name": f"Cashier {v}-{c}", "vendor_id": vendor_id
+    } for v, vendor_id in enumerate(vendor_ids) for c in range(cashiers_per_vendor)])
+    cashiers = {}
+    for row in db.session.query(User.id, User.vendor_id).filter(User.role == 'CASHIER').all():
+        cashiers.setdefault(row.vendor_id, []).append(row.id)
+
+    log(f"Seeding {vendors * products_per_vendor} products ...")
+    _insert(Product, [{
+        "name": f"Item {v}-{p}", "price": float(rng.randint(1, 200) * 10),
+        "stock_quantity": 1000000, "category": 'General', "vendor_id": vendor_id
+    } for v, vendor_id in enumerate(vendor_ids) for p in range(products_per_vendor)])
+    products = {}
+    for row in db.session.query(Product.id, Product.price, Product.vendor_id).all():
+        products.setdefault(row.vendor_id, []).append((row.id, row.price))
+    db.session.commit()
+
+    log(f"Seeding {sales} sales ...")
+    base_id = (db.session.query(func.max(Sale.id)).scalar() or 0) + 1
+    now = datetime.utcnow()
+    all_cashiers = [(vendor_id, cid) for vendor_id, ids in cashiers.items() for cid in ids]
+    methods = ['CASH', 'CASH', 'MPESA', 'MPESA', 'SPLIT']
+
+    sale_rows, item_rows = [], []
+    for n in range(sales):
+        sale_id = base_id + n
+        vendor_id, cashier_id = rng.choice(all_cashiers)
+        total = 0.0
+        for product_id, price in rng.sample(products[vendor_id], rng.randint(1, max_items)):
+            qty = rng.randint(1, 3)
+            total += price * qty
+            item_rows.append({"sale_id": sale_id, "product_id": product_id, "vendor_id": vendor_id,
+                              "product_name": f"Item {product_id}", "quantity": qty, "price": price})
+        method = rng.choice(methods)
+        cash = total if method == 'CASH' else (round(total / 2, 2) if method == 'SPLIT' else 0.0)
+        sale_rows.append({
+            "id": sale_id, "total_amount": total, "amount_cash": cash, "amount_mpesa": total - cash,
+            "discount_amount": 0.0, "payment_method": method, "status": 'COMPLETED', "cashier_id": cashier_id,
+            "vendor_id": vendor_id, "created_at": now - timedelta(seconds=rng.randint(0, days * 86400))
+        })
+
+        if len(sale_rows) >= BATCH:
+            _insert(Sale, sale_rows)
+            _insert(SaleItem, item_rows)
+            db.session.commit()
+            sale_rows, item_rows = [], []
+            if (n + 1) % (BATCH * 20) == 0:
+                log(f"  {n + 1} sales")
+    _insert(Sale, sale_rows)
+    _insert(SaleItem, item_rows)
+    db.session.commit()
+
+    log(f"Seeding {pending_mpesa} pending M-Pesa sales for the callback storm ...")
+    base_id = (db.session.query(func.max(Sale.id)).scalar() or 0) + 1
+    checkouts = [f"ws_CO_bench_{n}" for n in range(pending_mpesa)]
+    pending_sales, pending_items, payments = [], [], []
+    for n, checkout_id in enumerate(checkouts):
+        vendor_id, cashier_id = rng.choice(all_cashiers)
+        product_id, price = rng.choice(products[vendor_id])
+        pending_items.append({"sale_id": base_id + n, "product_id": product_id, "vendor_id": vendor_id,
+                              "product_name": f"Item {product_id}", "quantity": 1, "price": price})
+        pending_sales.append({
+            "id": base_id + n, "total_amount": price, "amount_cash": 0.0, "amount_mpesa": price,
+            "discount_amount": 0.0, "payment_method": 'MPESA', "status": 'PENDING', "cashier_id": cashier_id,
+            "vendor_id": vendor_id, "created_at": now
+        })
+        payments.append({
+            "sale_id": base_id + n, "checkout_request_id": checkout_id, "merchant_request_id": f"mr_bench_{n}",
+            "phone_number": "254700000000", "amount": price, "result_desc": "Pending"
+        })
+    _insert(Sale, pending_sales)
+    _insert(SaleItem, pending_items)
+    _insert(MpesaPayment, payments)
+    db.session.commit()
+
+    log("Rebuilding daily sales rollup ...")
+    RollupService.rebuild()
+
+    return fixtures()
+
+
+def fixtures():
+    """Reads the fixture ids back from an already seeded database."""
+    admin = db.session.query(User.id).filter(User.email == 'admin@bench.local').scalar()
+    if admin is None:
+        return None
+
+    cashiers, products = {}, {}
+    for row in db.session.query(User.id, User.vendor_id).filter(User.role == 'CASHIER').all():
+        cashiers.setdefault(row.vendor_id, []).append(row.id)
+    for row in db.session.query(Product.id, Product.price, Product.vendor_id).all():
+        products.setdefault(row.vendor_id, []).append((row.id, row.price))
+
+    pending = [row.checkout_request_id for row in db.session.query(MpesaPayment.checkout_request_id)
+               .filter(MpesaPayment.checkout_request_id.like('ws_CO_bench_%'), MpesaPayment.result_code.is_(None))
+               .all()]
+    sale_range = db.session.query(func.min(Sale.id), func.max(Sale.id)).filter(Sale.status == 'COMPLETED').one()
+
+    return {
+        "admin": admin,
+        "vendors": sorted(cashiers),
+        "cashiers": cashiers,
+        "products": products,
+        "pending_checkouts": pending,
+        "sale_range": tuple(sale_range),
+    }
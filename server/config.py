@@ -34,4 +34,63 @@ class Config:
     MPESA_CONSUMER_SECRET = os.environ.get('MPESA_CONSUMER_SECRET')
     MPESA_SHORTCODE = os.environ.get('MPESA_SHORTCODE')
     MPESA_PASSKEY = os.environ.get('MPESA_PASSKEY')
-    MPESA_CALLBACK_URL = os.environ.get('MPESA_CALLBACK_URL')
\ No newline at end of file
+    MPESA_CALLBACK_URL = os.environ.get('MPESA_CALLBACK_URL')
+    MPESA_BASE_URL = os.environ.get('MPESA_BASE_URL') or 'https://sandbox.safaricom.co.ke'
+    MPESA_CONNECT_TIMEOUT = float(os.environ.get('MPESA_CONNECT_TIMEOUT', 3.05))
+    MPESA_READ_TIMEOUT = float(os.environ.get('MPESA_READ_TIMEOUT', 15))
+    # 'thread' sends queued STK pushes from each web process; 'worker' leaves it to `flask run-stk-dispatcher`
+    MPESA_DISPATCH_MODE = os.environ.get('MPESA_DISPATCH_MODE', 'thread')
+    MPESA_DISPATCH_WORKERS = int(os.environ.get('MPESA_DISPATCH_WORKERS', 4))
+
+    # B2C withdrawal payouts; sent by the payout dispatcher (same MPESA_DISPATCH_MODE),
+    # at most MPESA_B2C_WORKERS calls to Daraja in flight per process
+    MPESA_B2C_INITIATOR = os.environ.get('MPESA_B2C_INITIATOR')
+    MPESA_B2C_SECURITY_CREDENTIAL = os.environ.get('MPESA_B2C_SECURITY_CREDENTIAL')
+    MPESA_B2C_SHORTCODE = os.environ.get('MPESA_B2C_SHORTCODE')
+    MPESA_B2C_COMMAND_ID = os.environ.get('MPESA_B2C_COMMAND_ID', 'BusinessPayment')
+    MPESA_B2C_RESULT_URL = os.environ.get('MPESA_B2C_RESULT_URL')
+    MPESA_B2C_TIMEOUT_URL = os.environ.get('MPESA_B2C_TIMEOUT_URL')
+    MPESA_B2C_WORKERS = int(os.environ.get('MPESA_B2C_WORKERS', 4))
+    MPESA_B2C_MAX_ATTEMPTS = int(os.environ.get('MPESA_B2C_MAX_ATTEMPTS', 5))
+    RECEIPT_CACHE_SIZE = int(os.environ.get('RECEIPT_CACHE_SIZE', 256))
+    # Optional directory to keep rendered receipt PDFs across restarts
+    RECEIPT_CACHE_DIR = os.environ.get('RECEIPT_CACHE_DIR')
+
+    # Vendor catalog records (names, prices) for the product grid; checkout prices from SQL.
+    # Per-process by default; set a redis:// URL (needs the redis package) to share
+    # one copy across workers.
+    CATALOG_CACHE_URL = os.environ.get('CATALOG_CACHE_URL')
+    CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 256))
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+
+    # PDF report jobs: rendered in a process pool, kept on local disk
+    REPORT_DIR = os.environ.get('REPORT_DIR')
+    REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))
+    REPORT_TIMEOUT_SECONDS = int(os.environ.get('REPORT_TIMEOUT_SECONDS', 300))
+    REPORT_RETENTION_HOURS = int(os.environ.get('REPORT_RETENTION_HOURS', 24))
+    # How long the legacy /reports/export-pdf waits before answering 202
+    REPORT_SYNC_WAIT_SECONDS = float(os.environ.get('REPORT_SYNC_WAIT_SECONDS', 10))
+
+    # Audit events are buffered and bulk-inserted off the request path every
+    # AUDIT_FLUSH_MS or AUDIT_BATCH_SIZE events; disable to write each one inline
+    AUDIT_BUFFER_ENABLED = os.environ.get('AUDIT_BUFFER_ENABLED', 'true').lower() == 'true'
+    AUDIT_FLUSH_MS = int(os.environ.get('AUDIT_FLUSH_MS', 500))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+    AUDIT_BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE', 10000))
+
+    # Per-request SQL accounting (Server-Timing header, /metrics, slow query and N+1 logs)
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+    # GET /metrics is off by default. When enabled it answers only a bearer
+    # METRICS_TOKEN or a client in METRICS_ALLOWED_IPS (comma-separated IPs or
+    # CIDRs, e.g. "127.0.0.1,10.0.0.0/8"); with neither set every scrape gets 403
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '')
+
+    # gzip (and brotli, when installed) for JSON/text responses above the threshold
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', 5))
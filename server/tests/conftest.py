@@ -0,0 +1,151 @@
+"""
+Shared fixtures: a fresh SQLite-backed app per test with an admin, a vendor
+and their cashier, plus a local stand-in for Daraja whose behaviour a test
+can switch (answer, or drop the connection once the request is read).
+"""
+import itertools
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from config import Config
+from app import create_app
+from app.extensions import db
+from app.models.user import User
+
+
+class TestConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'test-secret-key'
+    JWT_SECRET_KEY = 'test-jwt-secret-key-at-least-32-bytes'
+    MPESA_DISPATCH_MODE = 'worker'
+    MPESA_CONSUMER_KEY = 'key'
+    MPESA_CONSUMER_SECRET = 'secret'
+    MPESA_SHORTCODE = '174379'
+    MPESA_PASSKEY = 'passkey'
+    MPESA_CALLBACK_URL = 'http://localhost/api/mpesa/callback'
+    MPESA_READ_TIMEOUT = 2
+    AUDIT_BUFFER_ENABLED = False
+    BCRYPT_LOG_ROUNDS = 4
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """make_app(name, **config) -> an app on its own SQLite file; the caller pushes its context and builds the schema."""
+    def make(name='test', **overrides):
+        # A file rather than :memory: so dispatcher and writer threads see the same tables
+        overrides['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / name}.db"
+        config = type('Config', (TestConfig,), overrides)
+        return create_app(config)
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def users(app):
+    admin = User(email='admin@test', role='ADMIN', name='Admin')
+    vendor = User(email='vendor@test', role='VENDOR', name='Vendor', business_name='Shop',
+                  phone_number='0712345678')
+    for user in (admin, vendor):
+        user.set_password('pw')
+    db.session.add_all([admin, vendor])
+    db.session.flush()
+    cashier = User(email='cashier@test', role='CASHIER', name='Cashier', vendor_id=vendor.id)
+    cashier.set_password('pw')
+    db.session.add(cashier)
+    db.session.commit()
+    return {'admin': admin, 'vendor': vendor, 'cashier': cashier}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth(client):
+    """auth(user) -> Authorization header for that user, via the real login route."""
+    def headers(user):
+        res = client.post('/api/auth/login', json={'email': user.email, 'password': 'pw'})
+        return {'Authorization': f"Bearer {res.get_json()['access_token']}"}
+    return headers
+
+
+class DarajaStub:
+    """
+    mode 'ok' answers every call with a success body; 'drop' reads the POST
+    and closes the connection without replying, as when a proxy or Daraja
+    resets it after the request went out.
+    """
+
+    def __init__(self):
+        self.mode = 'ok'
+        self.calls = {'token': 0, 'stk': 0, 'b2c': 0}
+        self._ids = itertools.count(1)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.handle_error = lambda *args: None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                stub.calls['token'] += 1
+                self._reply({'access_token': 'token', 'expires_in': '3599'})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                kind = 'stk' if 'stkpush' in self.path else 'b2c'
+                stub.calls[kind] += 1
+                n = next(stub._ids)
+                if stub.mode == 'drop':
+                    self.close_connection = True
+                    return
+                if kind == 'stk':
+                    self._reply({'ResponseCode': '0', 'CheckoutRequestID': f"ws_CO_{n}",
+                                 'MerchantRequestID': f"mr_{n}"})
+                else:
+                    self._reply({'ResponseCode': '0', 'ConversationID': f"AG_{n}",
+                                 'ResponseDescription': 'Accept the service request successfully.'})
+
+        return Handler
+
+
+@pytest.fixture
+def daraja(app):
+    stub = DarajaStub()
+    app.config['MPESA_BASE_URL'] = stub.url
+    app.extensions.pop('daraja_client', None)
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
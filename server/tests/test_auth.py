@@ -0,0 +1,30 @@
+from flask_jwt_extended import verify_jwt_in_request
+
+from app.extensions import db
+from app.models.user import User
+from app.utils.auth import current_role, current_tenant_id
+
+
+def test_demoted_admin_loses_access_with_an_old_token(client, auth, users):
+    headers = auth(users['admin'])
+    assert client.get('/api/admin/wallet/payouts', headers=headers).status_code == 200
+
+    users['admin'].role = 'VENDOR'
+    db.session.commit()
+
+    assert client.get('/api/admin/wallet/payouts', headers=headers).status_code == 403
+
+
+def test_moved_cashier_works_under_the_new_vendor(app, auth, users):
+    headers = auth(users['cashier'])
+    other = User(email='other@test', role='VENDOR', name='Other', business_name='Other Shop')
+    other.set_password('pw')
+    db.session.add(other)
+    db.session.flush()
+    users['cashier'].vendor_id = other.id
+    db.session.commit()
+
+    with app.test_request_context(headers=headers):
+        verify_jwt_in_request()
+        assert current_role() == 'CASHIER'
+        assert current_tenant_id() == other.id
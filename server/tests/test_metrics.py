@@ -0,0 +1,32 @@
+import pytest
+
+
+@pytest.fixture
+def scrape(make_app):
+    """scrape(headers=None, ip='127.0.0.1', **config) -> status of GET /metrics on an app built with that config."""
+    def get(headers=None, ip='127.0.0.1', **config):
+        client = make_app('metrics', **config).test_client()
+        return client.get('/metrics', headers=headers, environ_base={'REMOTE_ADDR': ip}).status_code
+    return get
+
+
+def test_metrics_are_off_by_default(scrape):
+    assert scrape() == 404
+
+
+def test_enabled_metrics_without_a_guard_are_refused(scrape):
+    assert scrape(METRICS_ENABLED=True) == 403
+
+
+def test_metrics_token(scrape):
+    config = {'METRICS_ENABLED': True, 'METRICS_TOKEN': 's3cret'}
+    assert scrape({'Authorization': 'Bearer s3cret'}, **config) == 200
+    assert scrape({'Authorization': 'Bearer wrong'}, **config) == 403
+    assert scrape(**config) == 403
+
+
+def test_metrics_ip_allow_list(scrape):
+    config = {'METRICS_ENABLED': True, 'METRICS_ALLOWED_IPS': '127.0.0.1, 10.0.0.0/8'}
+    assert scrape(ip='10.1.2.3', **config) == 200
+    assert scrape(ip='127.0.0.1', **config) == 200
+    assert scrape(ip='192.168.1.5', **config) == 403
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models.payout_request import PayoutRequest
+from app.models.wallet import Settlement, Wallet
+from app.models.wallet_ledger import WalletLedger
+from app.services.daraja_client import get_daraja_client
+from app.services.payout_dispatcher import PayoutDispatcher, get_payout_dispatcher
+from app.services.wallet_service import WalletService
+
+
+@pytest.fixture
+def payout(app, client, auth, users, daraja):
+    """Funds the vendor's wallet and returns queue(amount) -> an approved, queued payout."""
+    WalletService.add_funds(users['vendor'].id, 1000)
+    vendor, admin = auth(users['vendor']), auth(users['admin'])
+
+    def queue(amount):
+        client.post('/api/vendor/wallet/request-withdrawal', json={'amount': amount}, headers=vendor)
+        settlement_id = db.session.query(db.func.max(Settlement.id)).scalar()
+        res = client.post('/api/admin/wallet/withdrawals/bulk', headers=admin,
+                          json={'ids': [settlement_id], 'action': 'approve', 'disburse': True})
+        assert res.get_json()['payouts_queued'] == 1
+        return PayoutRequest.query.filter_by(settlement_id=settlement_id).one()
+    return queue
+
+
+def reload(payout):
+    db.session.expire_all()
+    payout = db.session.get(PayoutRequest, payout.id)
+    return payout, db.session.get(Settlement, payout.settlement_id)
+
+
+def balance():
+    db.session.expire_all()
+    return Wallet.query.one().current_balance
+
+
+def test_payout_dropped_mid_request_is_unknown_never_resent_or_refunded(app, daraja, payout):
+    dispatcher = get_payout_dispatcher(app)
+    queued = payout(100)
+    daraja.mode = 'drop'
+
+    dispatcher.dispatch_due()
+    sent, settlement = reload(queued)
+    assert (sent.status, settlement.status) == (PayoutRequest.UNKNOWN, 'processing')
+    assert daraja.calls['b2c'] == 1
+
+    daraja.mode = 'ok'
+    dispatcher.dispatch_due()
+    assert daraja.calls['b2c'] == 1
+    assert balance() == 900
+
+
+def test_refused_connection_is_requeued(app, daraja, payout):
+    dispatcher = get_payout_dispatcher(app)
+    queued = payout(100)
+    get_daraja_client().base_url = 'http://127.0.0.1:1'
+
+    dispatcher.dispatch_due()
+
+    assert reload(queued)[0].status == PayoutRequest.QUEUED
+    assert daraja.calls['b2c'] == 0
+
+
+def test_expired_lease_is_unknown_not_resent(app, daraja, payout):
+    dispatcher = get_payout_dispatcher(app)
+    queued = payout(100)
+    queued.status = PayoutRequest.SENDING
+    queued.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    dispatcher.dispatch_due()
+
+    assert reload(queued)[0].status == PayoutRequest.UNKNOWN
+    assert daraja.calls['b2c'] == 0
+
+
+def test_unknown_payout_is_settled_by_its_result(app, client, daraja, payout):
+    dispatcher = get_payout_dispatcher(app)
+    queued = payout(100)
+    dispatcher.dispatch_due()
+    assert reload(queued)[0].status == PayoutRequest.SENT
+
+    timeout = {'Result': {'OriginatorConversationID': queued.originator_conversation_id}}
+    client.post('/api/mpesa/b2c/timeout', json=timeout)
+    assert reload(queued)[0].status == PayoutRequest.UNKNOWN
+    dispatcher.dispatch_due()
+    assert daraja.calls['b2c'] == 1
+
+    result = {'Result': {'ResultCode': 0, 'TransactionID': 'TX1',
+                         'OriginatorConversationID': queued.originator_conversation_id}}
+    client.post('/api/mpesa/b2c/result', json=result)
+    completed, settlement = reload(queued)
+    assert (completed.status, settlement.status, settlement.mpesa_receipt) == (PayoutRequest.COMPLETED, 'completed', 'TX1')
+    assert balance() == 900
+
+
+def test_replayed_failure_refunds_once(app, client, daraja, payout):
+    dispatcher = get_payout_dispatcher(app)
+    queued = payout(100)
+    dispatcher.dispatch_due()
+    assert balance() == 900
+
+    failure = {'Result': {'ResultCode': 2001, 'ResultDesc': 'The initiator information is invalid.',
+                          'OriginatorConversationID': queued.originator_conversation_id}}
+    for _ in range(2):
+        assert client.post('/api/mpesa/b2c/result', json=failure).get_json()['ResultCode'] == 0
+
+    failed, settlement = reload(queued)
+    assert (failed.status, settlement.status) == (PayoutRequest.FAILED, 'failed')
+    assert balance() == 1000
+
+    # Two deliveries racing past the status check still refund once
+    PayoutDispatcher.fail(failed, 'replayed')
+    db.session.commit()
+    assert balance() == 1000
+    assert WalletLedger.query.filter_by(account='wallet', type='REFUND').count() == 1
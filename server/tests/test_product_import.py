@@ -0,0 +1,45 @@
+import pytest
+
+from app.extensions import db
+from app.models.product import Product
+
+
+@pytest.fixture
+def vendor(auth, users):
+    return auth(users['vendor'])
+
+
+def import_csv(client, headers, body):
+    res = client.post('/api/products/bulk', data=body, content_type='text/csv', headers=headers)
+    return res.get_json()
+
+
+def test_sku_partial_reimport_keeps_untouched_fields(client, vendor):
+    full = [{'sku': 'A1', 'name': 'Soda', 'price': 50, 'stock_quantity': 40, 'description': 'Cold',
+             'category': 'Drinks', 'image_url': 'https://img/soda.png'}]
+    assert client.post('/api/products/bulk', json=full, headers=vendor).get_json()['inserted'] == 1
+
+    report = import_csv(client, vendor, 'sku,stock_quantity\nA1,12\n')
+
+    assert (report['updated'], report['inserted'], report['failed']) == (1, 0, 0)
+    db.session.expire_all()
+    product = Product.query.filter_by(sku='A1').one()
+    assert product.stock_quantity == 12
+    assert (product.name, product.price, product.description, product.category, product.image_url) == \
+        ('Soda', 50, 'Cold', 'Drinks', 'https://img/soda.png')
+
+
+def test_new_sku_still_needs_name_and_price(client, vendor):
+    report = import_csv(client, vendor, 'sku,stock_quantity\nNEW,5\n')
+
+    assert (report['inserted'], report['failed']) == (0, 1)
+    assert report['errors'] == [{'row': 1, 'errors': ['name is required', 'price is required']}]
+    assert Product.query.count() == 0
+
+
+def test_non_finite_prices_are_rejected(client, vendor):
+    report = import_csv(client, vendor, 'name,price\nA,nan\nB,inf\nC,5\n')
+
+    assert (report['inserted'], report['failed']) == (1, 2)
+    assert {e['row'] for e in report['errors']} == {1, 2}
+    assert all(e['errors'] == ['price must be a finite number'] for e in report['errors'])
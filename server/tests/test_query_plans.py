@@ -0,0 +1,67 @@
+"""
+EXPLAIN regression test for the hot dashboard and list queries (the same
+check as `flask check-query-plans`). The schema is built both from the
+models and by running the migrations, so an index missing from either
+shows up as a full table scan.
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from flask_migrate import upgrade
+
+from app.extensions import db
+from app.models.product import Product
+from app.models.transaction import Sale, SaleItem
+from app.models.notification import Notification
+from app.models.user import User
+from app.utils.query_plans import check_query_plans
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / 'migrations'
+
+
+def seed():
+    vendor = User(email='vendor@test', role='VENDOR', name='Vendor', business_name='Shop')
+    vendor.set_password('pw')
+    db.session.add(vendor)
+    db.session.flush()
+    cashier = User(email='cashier@test', role='CASHIER', name='Cashier', vendor_id=vendor.id)
+    cashier.set_password('pw')
+    db.session.add(cashier)
+    db.session.flush()
+
+    products = [Product(name=f"P{i}", price=10 * i, stock_quantity=i, vendor_id=vendor.id) for i in range(1, 6)]
+    db.session.add_all(products)
+    db.session.flush()
+    for day in range(5):
+        sale = Sale(total_amount=10, payment_method='CASH', status='COMPLETED', cashier_id=cashier.id,
+                    vendor_id=vendor.id, created_at=datetime.utcnow() - timedelta(days=day))
+        db.session.add(sale)
+        db.session.flush()
+        db.session.add(SaleItem(sale_id=sale.id, product_id=products[day].id, vendor_id=vendor.id,
+                                product_name=products[day].name, quantity=1, price=10))
+    db.session.add(Notification(user_id=vendor.id, message='hello', type='info'))
+    # No ANALYZE: on rows this few the stats would favour scans; the check asks whether an index can serve
+    db.session.commit()
+
+
+@pytest.fixture(params=['models', 'migrations'])
+def database(request, make_app):
+    app = make_app('plans')
+    with app.app_context():
+        if request.param == 'migrations':
+            upgrade(directory=str(MIGRATIONS))
+        else:
+            db.create_all()
+        seed()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_hot_queries_use_indexes(database):
+    results = check_query_plans()
+
+    assert results
+    scans = {name: tables for name, _, tables in results if tables}
+    assert scans == {}
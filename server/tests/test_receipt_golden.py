@@ -0,0 +1,54 @@
+"""
+Golden-file tests for the counter-printer receipts. Each fixtures/receipts/<name>.json
+is a fixed ReceiptService.load() result; render_text and render_escpos must
+reproduce <name>.txt and <name>.bin byte for byte.
+
+After an intentional layout change, regenerate with
+    UPDATE_GOLDEN=1 python -m pytest tests/test_receipt_golden.py
+and review the diff of the .txt files before committing.
+"""
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from app.services.receipt_service import ReceiptService
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'receipts'
+CASES = sorted(p.stem for p in FIXTURES.glob('*.json'))
+UPDATE = os.environ.get('UPDATE_GOLDEN') == '1'
+
+
+def load_case(name):
+    return json.loads((FIXTURES / f"{name}.json").read_text(encoding='utf-8'))
+
+
+def check_golden(path, actual):
+    if UPDATE:
+        path.write_bytes(actual)
+    assert path.exists(), f"missing golden file {path.name}; run with UPDATE_GOLDEN=1"
+    assert actual == path.read_bytes()
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_render_text(name):
+    text = ReceiptService.render_text(load_case(name))
+    check_golden(FIXTURES / f"{name}.txt", text.encode('utf-8'))
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_render_escpos(name):
+    check_golden(FIXTURES / f"{name}.bin", ReceiptService.render_escpos(load_case(name)))
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_text_fits_paper_width(name):
+    text = ReceiptService.render_text(load_case(name))
+    assert max(len(line) for line in text.splitlines()) <= 42
+
+
+def test_escpos_frames_receipt():
+    out = ReceiptService.render_escpos(load_case('cash_sale'))
+    assert out.startswith(b'\x1b@')
+    assert out.endswith(b'\x1dVB\x03')
@@ -0,0 +1,51 @@
+from app.extensions import db
+from app.models.payment_request import PaymentRequest
+from app.services.daraja_client import get_daraja_client
+from app.services.stk_dispatcher import get_stk_dispatcher, StkDispatcher
+
+
+def queue_push(phone='0700000001', amount=10):
+    payment_request = StkDispatcher.enqueue(None, phone, amount)
+    db.session.commit()
+    return payment_request.id
+
+
+def send(dispatcher, request_id):
+    assert dispatcher.claim(request_id)
+    dispatcher.send(request_id)
+    db.session.expire_all()
+    return db.session.get(PaymentRequest, request_id)
+
+
+def test_push_dropped_mid_request_is_unknown_and_not_resent(app, daraja):
+    dispatcher = get_stk_dispatcher(app)
+    daraja.mode = 'drop'
+
+    payment_request = send(dispatcher, queue_push())
+
+    assert payment_request.status == PaymentRequest.UNKNOWN
+    assert daraja.calls['stk'] == 1
+    dispatcher.dispatch_due()
+    assert daraja.calls['stk'] == 1
+
+
+def test_refused_connection_is_requeued(app, daraja):
+    dispatcher = get_stk_dispatcher(app)
+    get_daraja_client().base_url = 'http://127.0.0.1:1'
+
+    payment_request = send(dispatcher, queue_push())
+
+    assert payment_request.status == PaymentRequest.QUEUED
+    assert daraja.calls['stk'] == 0
+
+
+def test_accepted_push_is_sent(app, daraja):
+    payment_request = send(get_stk_dispatcher(app), queue_push())
+
+    assert payment_request.status == PaymentRequest.SENT
+    assert payment_request.checkout_request_id == 'ws_CO_1'
+
+
+def test_lease_outlasts_the_slowest_daraja_call(app):
+    dispatcher = get_stk_dispatcher(app)
+    assert dispatcher.lease_seconds() > get_daraja_client().max_post_seconds()
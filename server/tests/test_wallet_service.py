@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import func, update
+
+from app.extensions import db
+from app.models.wallet import Wallet
+from app.models.wallet_ledger import WalletLedger
+from app.services.wallet_service import WalletService, WalletError
+
+
+@pytest.fixture
+def vendor(users):
+    return users['vendor'].id
+
+
+def test_debit_never_overdraws(vendor):
+    WalletService.add_funds(vendor, 100)
+    wallet = Wallet.query.one()
+
+    assert WalletService.debit(vendor, 60, 'WITHDRAWAL') == 40
+    db.session.commit()
+    with pytest.raises(WalletError):
+        WalletService.debit(vendor, 60, 'WITHDRAWAL')
+    db.session.rollback()
+
+    # The loaded object was expired by the guarded UPDATE, not left at 100
+    assert wallet.current_balance == 40
+    assert WalletLedger.query.filter_by(type='WITHDRAWAL').count() == 2
+
+
+def test_debit_without_a_wallet_does_not_create_one(vendor):
+    with pytest.raises(WalletError):
+        WalletService.debit(vendor, 1, 'PAYOUT')
+    assert Wallet.query.count() == 0
+    assert WalletLedger.query.count() == 0
+
+
+def test_every_movement_is_a_balanced_pair(vendor):
+    WalletService.add_funds(vendor, 250.5)
+    WalletService.debit(vendor, 100.25, 'PAYOUT')
+    WalletService.post(vendor, 20, 'REFUND', WalletService.PAYOUTS)
+    db.session.commit()
+
+    pairs = db.session.query(WalletLedger.entry_id, func.count(), func.sum(WalletLedger.amount))\
+        .group_by(WalletLedger.entry_id).all()
+    assert len(pairs) == 3
+    assert all(count == 2 and total == 0 for _, count, total in pairs)
+
+    wallet = Wallet.query.one()
+    assert WalletService.ledger_balance(wallet.id) == wallet.current_balance == 170.25
+    last = WalletLedger.query.filter_by(account='wallet').order_by(WalletLedger.id.desc()).first()
+    assert last.balance_after == 170.25
+
+
+def test_snapshot_rolls_forward_and_reports_drift(vendor):
+    WalletService.add_funds(vendor, 100)
+    assert WalletService.snapshot_all() == (1, [])
+    db.session.commit()
+
+    WalletService.debit(vendor, 30, 'PAYOUT')
+    db.session.commit()
+    assert WalletService.snapshot_all() == (1, [])
+    db.session.commit()
+    assert WalletService.snapshot_all() == (0, [])
+
+    # A balance written around post() leaves the ledger behind
+    db.session.execute(update(Wallet).values(current_balance=500))
+    db.session.commit()
+    wallet = Wallet.query.one()
+    assert WalletService.snapshot_all() == (0, [(wallet.id, 70, 500)])
+    assert WalletService.ledger_balance(wallet.id) == 70
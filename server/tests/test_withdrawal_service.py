@@ -0,0 +1,61 @@
+from app.extensions import db
+from app.models.notification import Notification
+from app.models.wallet import Settlement, Wallet
+from app.models.wallet_ledger import WalletLedger
+from app.services.wallet_service import WalletService
+from app.services.withdrawal_service import WithdrawalService
+
+
+def request_withdrawals(client, auth, vendor, *amounts):
+    headers = auth(vendor)
+    for amount in amounts:
+        res = client.post('/api/vendor/wallet/request-withdrawal', json={'amount': amount}, headers=headers)
+        assert res.status_code in (200, 201)
+    return [s.id for s in Settlement.query.order_by(Settlement.id).all()]
+
+
+def balance():
+    db.session.expire_all()
+    return Wallet.query.one().current_balance
+
+
+def test_bulk_review_skips_already_processed_ids(client, auth, users):
+    WalletService.add_funds(users['vendor'].id, 1000)
+    approved, rejected, pending = request_withdrawals(client, auth, users['vendor'], 100, 200, 300)
+    assert balance() == 400
+
+    WithdrawalService.review([approved], 'approve')
+    WithdrawalService.review([rejected], 'reject')
+    db.session.commit()
+    assert balance() == 600
+    notified = Notification.query.count()
+
+    result = WithdrawalService.review([approved, rejected, pending, pending, 999], 'reject')
+    db.session.commit()
+
+    assert result['updated'] == [pending]
+    assert result['total'] == 300
+    assert result['skipped'] == [
+        {'id': approved, 'msg': 'Withdrawal is already completed'},
+        {'id': rejected, 'msg': 'Withdrawal is already rejected'},
+        {'id': 999, 'msg': 'Withdrawal not found'},
+    ]
+    db.session.expire_all()
+    assert [s.status for s in Settlement.query.order_by(Settlement.id)] == ['completed', 'rejected', 'rejected']
+    # Only the two rejections were refunded, each once
+    assert balance() == 900
+    assert WalletLedger.query.filter_by(account='wallet', type='REFUND').count() == 2
+    assert Notification.query.count() == notified + 1
+
+
+def test_review_with_nothing_pending_changes_nothing(client, auth, users):
+    WalletService.add_funds(users['vendor'].id, 1000)
+    (withdrawal,) = request_withdrawals(client, auth, users['vendor'], 100)
+    WithdrawalService.review([withdrawal], 'reject')
+    db.session.commit()
+
+    result = WithdrawalService.review([withdrawal], 'reject')
+    db.session.commit()
+
+    assert (result['updated'], result['total']) == ([], 0)
+    assert balance() == 1000